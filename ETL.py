@@ -2,24 +2,35 @@ import logging
 logger = logging.getLogger(__name__)
 
 from db.repository_stg import insert_dim_fact, engine
+from monitor.trace import span
 import module.data_transformation as transform
 import pandas as pd
 import json
 
 import base64
+from io import BytesIO
 
 TEST_BASE_YEAR = '2020'
 
-def extract_tables(content: dict) -> dict[str, pd.DataFrame]:
+def decode_table_data(content: dict) -> bytes:
+    # xlsx file uploaded as base64 string.
+    return base64.b64decode(content.pop('table_data'))
+
+
+def extract_tables(content: dict, tables_xlsx: bytes = None) -> dict[str, pd.DataFrame]:
     
-    tables_xlsx = base64.b64decode(content.pop('table_data'))
+    if tables_xlsx is None:
+        tables_xlsx = decode_table_data(content)
 
     tables: dict = {}
-    tables['df_financial_data'] = pd.read_excel(tables_xlsx, sheet_name='tbl_quantitative')
-    tables['df_solution_filter'] = pd.read_excel(tables_xlsx, sheet_name='tbl_solution_filter')
-    tables['df_form_weight'] = pd.read_excel(tables_xlsx, sheet_name='tbl_interviewee_weight')
-    tables['df_competitor'] = transform_df_competitor(pd.read_excel(tables_xlsx, sheet_name='tbl_competitor'))
-    tables['df_form_data'], tables['df_company_data'] = extract_form_data(content)
+    # workbook opened once for all sheets, closed (parsed xml released) as soon as they are read.
+    with span('etl.read_excel'), pd.ExcelFile(BytesIO(tables_xlsx)) as workbook:
+        tables['df_financial_data'] = workbook.parse('tbl_quantitative')
+        tables['df_solution_filter'] = workbook.parse('tbl_solution_filter')
+        tables['df_form_weight'] = workbook.parse('tbl_interviewee_weight')
+        tables['df_competitor'] = transform_df_competitor(workbook.parse('tbl_competitor'))
+    with span('etl.form_data'):
+        tables['df_form_data'], tables['df_company_data'] = extract_form_data(content)
 
     logger.debug(tables['df_competitor'])
     logger.debug(tables['df_financial_data'])
@@ -30,24 +41,33 @@ def extract_tables(content: dict) -> dict[str, pd.DataFrame]:
     return tables
 
 
+FORM_KEY_COLUMNS: list = ['job_title', 'interviewee', 'question_id', 'attribute']
+
 def extract_form_data(raw_json: dict) -> pd.DataFrame:
     # 功能: 分離問卷資料與公司基本資料
-    df_raw: pd.DataFrame = pd.DataFrame(raw_json.items()) # use key & value as two columns.
-    df_raw.columns = ['description', 'value']             # rename column.
+    # each key is split once, straight from the dict into column lists.
+    form_keys: list = []
+    form_values: list = []
+    company_rows: list = []
 
-    mask = df_raw['description'].str.split('.').apply(len) == 4
-    
-    # 問卷資料 董事長.王小明.SERV-1.[現況]
-    df_form_data = df_raw.loc[mask].copy(deep=True)
-    df_form_data[['job_title', 'interviewee', 'question_id', 'attribute']] = df_form_data['description'].str.split('.', expand=True)
+    for description, value in raw_json.items():
+        keys = description.split('.')
+        if len(keys) == 4:
+            # 問卷資料 董事長.王小明.SERV-1.[現況]
+            form_keys.append(keys)
+            form_values.append(value)
+        elif keys[0] != "FIN":
+            # 公司基本資料 company_text.: 三發地產
+            company_rows.append((keys[0], keys[1] if len(keys) > 1 else None, value))
+
+    # repeated key parts as categorical: one code per row instead of one string object.
+    columns = zip(*form_keys) if form_keys else [[]] * len(FORM_KEY_COLUMNS)
+    df_form_data = pd.DataFrame({name: pd.Categorical(column) for name, column in zip(FORM_KEY_COLUMNS, columns)})
+    df_form_data['value'] = pd.Series(form_values, dtype=object)
 
-    # 公司基本資料 company_text.: 三發地產
-    df_company_data = df_raw.loc[~mask].copy(deep=True)
-    df_company_data['id'] = df_raw['description'].str.split('.', expand=True)[0]
-    df_company_data['description'] = df_raw['description'].str.split('.', expand=True)[1]
-    df_company_data = df_company_data.loc[(df_company_data["id"] != "FIN")] 
+    df_company_data = pd.DataFrame(company_rows, columns=['id', 'description', 'value'])
 
-    return df_form_data[['job_title', 'interviewee', 'question_id', 'attribute', 'value']], df_company_data[['id', 'description', 'value']] # reorder column.
+    return df_form_data, df_company_data
 
 
 def transform_df_competitor(df_competitor: pd.DataFrame) -> pd.DataFrame:
@@ -75,7 +95,8 @@ def load_raw_data(conn: engine, df_form_data: pd.DataFrame, df_company_data: pd.
     company_id = transform.get_form_value(df_company_data, "company_id")
     fact_project_id = str(company_id) + "_" + TEST_BASE_YEAR
     
-    insert_dim_fact(conn, "dim_fact_qualitative", fact_project_id, json_form_data)
-    insert_dim_fact(conn, "dim_fact_quantitative", fact_project_id, json_financial_data)
+    with span('etl.load_raw_data'):
+        insert_dim_fact(conn, "dim_fact_qualitative", fact_project_id, json_form_data)
+        insert_dim_fact(conn, "dim_fact_quantitative", fact_project_id, json_financial_data)
     
     return df_form_data, df_financial_data
\ No newline at end of file
@@ -4,32 +4,42 @@ import time
 
 TIME_ZONE = timezone(timedelta(hours=+8))
 
-# logging
-import logging
-logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(message)s')
-logging.getLogger("matplotlib").setLevel(logging.WARNING)
-logging.getLogger("PIL").setLevel(logging.WARNING)
-
-LOG_TIME = datetime.now(TIME_ZONE).strftime('%Y%m%d-%H%M%S')
-file_handler = logging.FileHandler(f'LOG\\log-{LOG_TIME}.txt')
-logging.getLogger().addHandler(file_handler)
-
-# Type decoration
-from io import BytesIO
-
 # parameter read.
+import os
 import json
 def load_config(f_name: str):
     with open(f_name, mode='r', encoding='utf-8') as f:
         config = json.load(f)
     return config
+
+# deployment environment: dev, test_server, prod
+APP_ENV = os.environ.get('APP_ENV', 'dev')
+
+# logging
+#   records are queued on the request thread and written by a background listener (rotating file).
+#   log level is configured per environment, prod runs at INFO so DataFrame dumps are never rendered.
+import logging
+from monitor.log import setup_logging
+LOG_CONFIG = load_config('log_config.json')[APP_ENV]
+setup_logging(LOG_CONFIG)
+
+# Type decoration
+from io import BytesIO
 # ----------------------------------------------------------------------------------------------------------------------------
 # database
 from db.repository_stg import connect, get_user
 
+# monitoring
+import monitor.metrics as metrics
+import monitor.trace as trace
+import monitor.profiler as profiler
+
 # module and reporting service
-from module.model import apply_model
-from reporting.report import generate_report
+from module.model import apply_model, strategy_weights, sweep_strategy_weights
+from reporting.report import generate_report, report_version, TEST_PRESENTATION_TEMPLATE_NAME, REPORT_INPUT_TABLES
+import module.simulation as simulation
+import cache.result_cache as result_cache
+import cache.store as cache_store
 import ETL
 
 # web server.
@@ -50,8 +60,19 @@ VALID_TOKENS = ('pwcgpscrpt985')
 FIN_DATA_KEY = 'FIN. 請按照填報模板，上傳貴公司的財務資料。'
 
 # change database environment.
-DB_INFO = load_config('db\\connection_info.json')['admin']
+DB_INFO = load_config(os.path.join('db', 'connection_info.json'))['admin']
 DB_CONNECTION, DB_META = connect(DB_INFO['host'], DB_INFO['database'], DB_INFO['port'], DB_INFO['user'], DB_INFO['password'])
+metrics.instrument_engine(DB_CONNECTION)
+
+# disk caches (result, chart images) and opt-in profiling of slow / flagged requests, stored next to the logs.
+cache_store.configure(LOG_CONFIG.get('cache'), LOG_CONFIG.get('filename'))
+profiler.configure(LOG_CONFIG.get('profile'), LOG_CONFIG.get('filename'))
+
+# endpoints that skip user authentication.
+PUBLIC_ENDPOINTS = ('metrics_endpoint',)
+LOCAL_NETWORKS = (ip_network('127.0.0.0/8'), ip_network('::1/128'))
+# reverse proxies allowed to forward the client ip (X-Real-IP), the header of any other peer is ignored.
+TRUSTED_PROXIES = (ip_network('127.0.0.1/32'), ip_network('::1/128'))
 
 
 def authenticate_user(user_email: str, password: str):
@@ -72,18 +93,62 @@ def authenticate_user(user_email: str, password: str):
     logging.info(f'Login Successful: {user_email}')
 
 
+def client_address() -> str:
+    # X-Real-IP is only honoured when the request comes from a trusted reverse proxy, anyone else could set it.
+    remote_addr = flask.request.remote_addr
+    try:
+        from_proxy = any(ip_address(remote_addr) in network for network in TRUSTED_PROXIES)
+    except ValueError:
+        from_proxy = False
+    return flask.request.headers.get('X-Real-IP', remote_addr) if from_proxy else remote_addr
+
+
+def request_route() -> str:
+    # use url rule instead of raw path, to keep label cardinality bounded.
+    return flask.request.url_rule.rule if flask.request.url_rule else 'unmatched'
+
+
 @app.before_request
-def authentication():
-    timestamp = datetime.now(TIME_ZONE).isoformat()
-    logging.info('========REQUEST START========')
-    logging.info(f'start time: {timestamp}')
+def start_request():
+    # request id: reuse the one assigned by reverse proxy / client, so logs can be joined across services.
+    flask.g.request_id = trace.start_request(flask.request.headers.get('X-Request-ID'))
+    flask.g.metrics_route = request_route()
+    flask.g.metrics_start = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.labels(flask.g.metrics_route).inc()
+
+    if flask.request.endpoint in PUBLIC_ENDPOINTS:
+        return
 
     # log ip
-    if not dev_mode:
-        client_ip = str(flask.request.headers['X-Real-IP'])
-        client_uri = str(flask.request.headers['X-Request-URI'])
-        logging.info(f'from_ip: {client_ip}, request_resource: {client_uri}')
-    
+    client_ip = client_address()
+    logging.info(f'request start: {flask.request.method} {flask.request.path}, from_ip: {client_ip}')
+
+
+@app.after_request
+def record_request_metrics(response: flask.Response):
+    if 'metrics_start' in flask.g:
+        route = flask.g.metrics_route
+        metrics.HTTP_LATENCY.labels(route).observe(time.perf_counter() - flask.g.metrics_start)
+        metrics.HTTP_REQUESTS.labels(route, flask.request.method, str(response.status_code)).inc()
+        response.headers['X-Request-ID'] = flask.g.request_id
+    return response
+
+
+@app.teardown_request
+def finish_request(exception: BaseException = None):
+    if 'metrics_start' not in flask.g:
+        return
+    if exception is not None:
+        metrics.HTTP_EXCEPTIONS.labels(flask.g.metrics_route, type(exception).__name__).inc()
+    metrics.HTTP_IN_FLIGHT.labels(flask.g.metrics_route).dec()
+    trace.end_request()
+
+
+@app.before_request
+def authentication():
+    if flask.request.endpoint in PUBLIC_ENDPOINTS:
+        return
+
     # login
     user_email = flask.request.json.get('user_email')
     password = flask.request.json.get('password')
@@ -99,11 +164,22 @@ def excel_client_login():
     return 'OK', 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # only expose to local scraper, the real client ip is forwarded by a trusted reverse proxy.
+    try:
+        client_ip = ip_address(client_address())
+    except ValueError:
+        flask.abort(403)
+    if not any(client_ip in network for network in LOCAL_NETWORKS):
+        flask.abort(403)
+
+    return flask.Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+
 @app.route('/api/task', methods=['POST'])
 def task():
 
-    logging.info('========TASK START========')
-    
     # accept only application/json
     try:
         content: dict = flask.request.get_json()
@@ -113,28 +189,104 @@ def task():
 
     # check start time
     timestamp = datetime.now(TIME_ZONE).isoformat()
-    logging.info(f'start time: {timestamp}')
+    logging.info(f'task start time: {timestamp}')
+
+    forced_profile = profiler.requested(flask.request.headers.get(profiler.PROFILE_HEADER), content.get('user_email'))
+    with trace.span('task'), profiler.profile(flask.g.request_id, forced=forced_profile):
+        tables_xlsx: bytes = ETL.decode_table_data(content)
+        cache_key = result_cache.request_key(DB_CONNECTION, tables_xlsx, content, TEST_PRESENTATION_TEMPLATE_NAME, report_version())
+
+        # 資料讀取與備份 (每次送出都備份, 包含結果快取命中的重複送出)
+        with trace.span('etl'):
+            input_tables: dict = ETL.extract_tables(content, tables_xlsx)
+            ETL.load_raw_data(DB_CONNECTION, input_tables['df_form_data'], input_tables['df_company_data'], input_tables['df_financial_data'])
+        del tables_xlsx
+
+        # 相同輸入 (問卷、財務資料、主檔版本、簡報模板) 直接回傳已產出的報表, 跳過模型運算與報表產出
+        #   client can force recomputation by sending "Cache-Control: no-cache".
+        if 'no-cache' not in flask.request.headers.get('Cache-Control', ''):
+            cached_report = result_cache.get_report(cache_key)
+            if cached_report is not None:
+                logging.info(f'result cache hit: {cache_key}')
+                return flask.send_file(BytesIO(cached_report), download_name='result.pptx', as_attachment=True)
+
+        # 模型運算
+        logging.info(f'process: model calculation...')
+        with trace.span('model'):
+            calculated_tables: dict = apply_model(conn=DB_CONNECTION, input_tables=input_tables)
+        # 報表只用到部分輸入資料, 其餘先釋放 (peak memory 限制每個 worker 可同時處理的 request 數)
+        input_tables = {name: input_tables[name] for name in REPORT_INPUT_TABLES}
+
+        # 產出報表
+        logging.info(f'process: report generation...')
+        with trace.span('report'):
+            ppt_buffer: BytesIO = generate_report(conn=DB_CONNECTION, input_tables=input_tables, calculated_tables=calculated_tables)
+        metrics.PPTX_SIZE.observe(ppt_buffer.getbuffer().nbytes)
+        result_cache.put_report(cache_key, ppt_buffer.getvalue())
 
-    # 資料讀取與備份
-    input_tables: dict = ETL.extract_tables(content)
-    ETL.load_raw_data(DB_CONNECTION, input_tables['df_form_data'], input_tables['df_company_data'], input_tables['df_financial_data'])
+    return flask.send_file(ppt_buffer, download_name='result.pptx', as_attachment=True)
 
-    # 模型運算
-    tic = time.perf_counter()
-    logging.info(f'process: model calculation...')
-    calculated_tables: dict = apply_model(conn=DB_CONNECTION, input_tables=input_tables)
-    
-    # 產出報表
-    tac = time.perf_counter()
-    logging.info(f'process: report generation...')
-    ppt_buffer: BytesIO = generate_report(conn=DB_CONNECTION, input_tables=input_tables, calculated_tables=calculated_tables)
 
-    toc = time.perf_counter()
-    logging.info(f"process: model calculation complete in {tac - tic:0.4f} seconds.")
-    logging.info(F"process: report generation complete in {toc - tac:0.4f} seconds.")
-    logging.info('=========TASK END=========')
+@app.route('/api/sweep', methods=['POST'])
+def sweep():
+    # what-if: top 10 solutions per strategy weighting, from the same payload as /api/task (no slides, nothing stored).
+    #   "strategy_weights" (optional): {"name": {"aspect_ux": 0.4, "aspect_mfg": 0.2, "aspect_ppl": 0.2, "aspect_tech": 0.2}}
+    #   every STRAT-* strategy of dim_strategy_weight is always included.
+    try:
+        content: dict = flask.request.get_json()
+    except:
+        logging.error('400: unsupported content type.')
+        flask.abort(400, 'unsupported content type.')
 
-    return flask.send_file(ppt_buffer, download_name='result.pptx', as_attachment=True)
+    with trace.span('sweep'):
+        try:
+            df_weights = strategy_weights(DB_CONNECTION, content.pop('strategy_weights', None))
+        except ValueError as e:
+            logging.error(f'400: {e}')
+            flask.abort(400, str(e))
+
+        with trace.span('etl'):
+            input_tables: dict = ETL.extract_tables(content)
+
+        with trace.span('model'):
+            rankings: dict = sweep_strategy_weights(DB_CONNECTION, input_tables, df_weights)
+
+    scenarios: dict = {}
+    for name, df_result in rankings.items():
+        scenarios[name] = {
+            'weights': df_weights.loc[name].to_dict(),
+            'solutions': df_result.astype(object).where(df_result.notna(), None).to_dict(orient='records'),
+        }
+    return flask.jsonify({'scenarios': scenarios})
+
+
+@app.route('/api/simulate', methods=['POST'])
+def simulate():
+    # Monte Carlo uncertainty of the top 10 / ROI, from the same payload as /api/task (no slides, nothing stored).
+    #   "simulation" (optional): {"scenarios": 2000, "weight_sd": 0.1, "financial_sd": 0.1, "sensitivity_sd": 0.1, "seed": 0}
+    try:
+        content: dict = flask.request.get_json()
+    except:
+        logging.error('400: unsupported content type.')
+        flask.abort(400, 'unsupported content type.')
+
+    with trace.span('simulate'):
+        try:
+            options: dict = simulation.simulation_options(content.pop('simulation', None))
+        except ValueError as e:
+            logging.error(f'400: {e}')
+            flask.abort(400, str(e))
+
+        with trace.span('etl'):
+            input_tables: dict = ETL.extract_tables(content)
+
+        with trace.span('model'):
+            df_result = simulation.run_simulation(DB_CONNECTION, input_tables, options)
+
+    return flask.jsonify({
+        'options': options,
+        'solutions': df_result.astype(object).where(df_result.notna(), None).to_dict(orient='records'),
+    })
 
 
 def print_dict(dit: dict):
@@ -0,0 +1,82 @@
+# stress test: report charts rendered from parallel threads (reporting/plot_utils.py)
+#   python -m benchmark.chart_threads [--charts 100] [--workers 8]
+# every chart is rendered once serially as reference, then all of them concurrently in shuffled order:
+# the PNG bytes must be identical (no chart style leaks into another through shared matplotlib state).
+# the chart image cache is bypassed (__wrapped__), every call draws.
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import reporting.plot_utils as plot
+
+ASPECTS = ["數位人才", "顧客體驗", "數位營運", "新科技"]
+
+
+def synthetic_charts(count: int, seed: int = 0) -> list[tuple]:
+    # (chart function, args) of each kind in turn, data varies per chart.
+    rng = np.random.default_rng(seed)
+    indicators = list(plot.FIN_PERFORMANCE_CHART_COLORS)
+    charts = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            df = pd.DataFrame({'year': ['2020', '2021', '2022'], 'value': rng.uniform(-0.5, 0.9, 3).round(3)})
+            charts.append((plot.fin_performance, (indicators[i % len(indicators)], df)))
+        elif kind == 1:
+            df = pd.DataFrame({'fin_indicator_text_en': [f'{name}_sensitivity' for name in indicators], 'value': rng.uniform(0, 5, len(indicators)).round(2)})
+            charts.append((plot.fin_sensitivity, (df,)))
+        elif kind == 2:
+            df = pd.DataFrame({'solution_id': [f'S{n}' for n in range(10)], 'sq_score': rng.uniform(0, 1, 10),
+                               'sf_score': rng.uniform(0, 1, 10), 'final_score': rng.uniform(0, 1, 10)})
+            charts.append((plot.solution_priority_matrix, (df,)))
+        elif kind == 3:
+            index = pd.MultiIndex.from_tuples([(aspect, f'{aspect}-模組{m}') for aspect in ASPECTS for m in range(4)], names=['aspect', 'module'])
+            target = rng.uniform(2, 5, len(index)).round(2)
+            df = pd.DataFrame({'gap': target - 1, 'target': target, 'actual': target - rng.uniform(0, 2, len(index)).round(2)}, index=index)
+            aspect_idx = i % len(ASPECTS)
+            charts.append((plot.qualitative_detail, (df, ASPECTS[aspect_idx], aspect_idx)))
+        else:
+            df = pd.DataFrame({'module': ['模組'] * 3, 'weight_key': ['經理_A', '經理_B', '協理_C'], 'gap': rng.uniform(0, 2, 3).round(2)})
+            charts.append((plot.interviewee_plots, (df,)))
+    return charts
+
+
+def render(chart: tuple) -> bytes:
+    func, args = chart
+    args = tuple(arg.copy() if isinstance(arg, pd.DataFrame) else arg for arg in args)     # charts edit their input
+    return func.__wrapped__(*args).getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='charts rendered from parallel threads')
+    parser.add_argument('--charts', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    charts = synthetic_charts(args.charts)
+
+    start = time.perf_counter()
+    expected = [render(chart) for chart in charts]
+    serial_time = time.perf_counter() - start
+
+    order = list(range(len(charts)))
+    random.Random(0).shuffle(order)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        images = dict(zip(order, pool.map(render, [charts[i] for i in order])))
+    parallel_time = time.perf_counter() - start
+
+    mismatches = [i for i in range(len(charts)) if images[i] != expected[i]]
+    print(f'{len(charts)} charts, {args.workers} threads')
+    print(f'serial  : {serial_time * 1000:10.1f} ms')
+    print(f'threads : {parallel_time * 1000:10.1f} ms')
+    print(f'identical to the serial render: {len(charts) - len(mismatches)} / {len(charts)}')
+    assert not mismatches, f'charts {mismatches} differ when rendered concurrently'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# micro benchmark: evaluation model steps (ETL / module/data_transformation.py / module/model.py) on synthetic input
+#   python -m benchmark.evaluation_model [--scale interviewees=30,questions=300,solutions=1000,years=5] [--repeat 7]
+#                                        [--save baseline.json] [--compare baseline.json] [--threshold 0.2]
+# every step is timed on its own, from the inputs the model would hand it (prepared untimed, fresh copy per run),
+# warm: dimension tables already read and encoded once, as in a running service. median / min over --repeat runs.
+# --save writes the timings as json baseline, --compare reads one and flags steps slower than baseline * (1 + threshold),
+# exit code 1 when any step regressed. compare on the same machine: timings are absolute seconds.
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import ETL
+import module.data_transformation as transform
+import module.keys as keys
+import module.model as model
+import module.scoring as scoring
+import db.repository_stg as repo
+from cache.versions import refresh_dim_versions
+import benchmark.synthetic as synthetic
+from benchmark.timing import copied
+
+SCALES = [
+    {'interviewees': 3, 'questions': 100, 'solutions': 65, 'years': 3},         # sample workbook
+    {'interviewees': 30, 'questions': 300, 'solutions': 1000, 'years': 5},
+    {'interviewees': 100, 'questions': 1000, 'solutions': 10000, 'years': 10},
+]
+
+
+def scale_name(scale: dict) -> str:
+    return ','.join(f'{name}={value}' for name, value in scale.items())
+
+
+def parse_scale(text: str) -> dict:
+    # 'interviewees=30,questions=300' -> missing values from the first (sample) scale.
+    scale = dict(SCALES[0])
+    for item in text.split(','):
+        name, _, value = item.partition('=')
+        if name not in scale:
+            raise argparse.ArgumentTypeError(f'unknown scale {name}, expected {list(scale)}')
+        scale[name] = int(value)
+    return scale
+
+
+def prepare(scale: dict, seed: int = 0) -> dict:
+    # {step name: (function, args)} on one synthetic input, with the intermediate results the model passes along.
+    dims = synthetic.dim_tables(scale['questions'], scale['solutions'], seed)
+    conn = synthetic.sqlite_engine(dims)
+    refresh_dim_versions()
+    payload = synthetic.form_payload(dims, scale['interviewees'], seed=seed)
+    tables = synthetic.input_tables(dims, scale['interviewees'], scale['years'], seed)
+
+    # run_quantitative_analysis, step by step.
+    dim_fin_indicator = keys.load(repo.get_dim_quantative_index, conn)
+    dim_financial_trend_index = keys.load(repo.get_dim_financial_trend_index, conn)
+    keys.align(dim_fin_indicator, dim_financial_trend_index)
+    df_year_data, formulas, select_methods, variables = transform.quantitative_data_cleansing(tables['df_financial_data'].copy(), dim_fin_indicator)
+    for name, value in variables.items():
+        df_year_data[name] = value
+    for indicator, formula in formulas.items():
+        df_year_data[indicator] = df_year_data.eval(formula)
+    df_CAGR = model.calculate_CAGR(dim_fin_indicator, df_year_data)
+
+    df_summarized_form_data = transform.summarized_form_data(tables['df_form_data'].copy(), tables['df_form_weight'])
+    df_qualitative_result = model.run_qualitative_analysis(conn, df_summarized_form_data.copy(), tables['df_company_data'])
+    _, df_trend = model.run_quantitative_analysis(conn, tables['df_financial_data'].copy())
+    df_solution_filter = transform.solution_filter(tables['df_solution_filter'])
+    df_result = scoring.rank(df_solution_filter, df_qualitative_result, df_trend, scoring.sq_matrix(conn), scoring.sf_matrix(conn), k=10)
+
+    return {
+        'extract_form_data': (ETL.extract_form_data, (payload,)),
+        'summarized_form_data': (transform.summarized_form_data, (tables['df_form_data'], tables['df_form_weight'])),
+        'quantitative_data_cleansing': (transform.quantitative_data_cleansing, (tables['df_financial_data'], dim_fin_indicator)),
+        'calculate_CAGR': (model.calculate_CAGR, (dim_fin_indicator, df_year_data)),
+        'calculate_trend': (model.calculate_trend, (dim_financial_trend_index, df_CAGR)),
+        'calculate_performance_gap_impact_cashflow': (model.calculate_performance_gap_impact_cashflow, (df_year_data, select_methods)),
+        'run_qualitative_analysis': (model.run_qualitative_analysis, (conn, df_summarized_form_data, tables['df_company_data'])),
+        'calculate_solution_roi': (model.calculate_solution_roi, (conn, df_result, df_trend)),
+    }
+
+
+def measure(func, args: tuple, repeat: int) -> dict:
+    func(*copied(args))                                    # warm up
+    timings = []
+    for _ in range(repeat):
+        run_args = copied(args)
+        start = time.perf_counter()
+        func(*run_args)
+        timings.append(time.perf_counter() - start)
+    return {'median': float(np.median(timings)), 'min': float(np.min(timings)), 'repeat': repeat}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # steps slower than the baseline median by more than threshold, printed as ratio table.
+    regressions = []
+    print(f'\ncompared with baseline ({baseline.get("created", "?")}), threshold +{threshold:.0%}')
+    for name, steps in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            print(f'  {name}: not in baseline')
+            continue
+        print(f'  {name}')
+        for step, timing in steps.items():
+            if step not in previous:
+                continue
+            ratio = timing['median'] / previous[step]['median']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions.append(f'{name} {step}')
+            print(f'    {step:45s} {previous[step]["median"] * 1000:10.2f} -> {timing["median"] * 1000:10.2f} ms  x{ratio:5.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='evaluation model micro benchmark')
+    parser.add_argument('--scale', type=parse_scale, action='append', help='interviewees=..,questions=..,solutions=..,years=.. (repeatable)')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--step', action='append', help='only these steps (repeatable)')
+    parser.add_argument('--save', help='write the timings to this json baseline')
+    parser.add_argument('--compare', help='json baseline to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline median')
+    args = parser.parse_args()
+
+    results: dict = {}
+    for scale in args.scale or SCALES:
+        name = scale_name(scale)
+        print(name)
+        steps = prepare(scale)
+        results[name] = {}
+        for step, (func, func_args) in steps.items():
+            if args.step and step not in args.step:
+                continue
+            timing = measure(func, func_args, args.repeat)
+            results[name][step] = timing
+            print(f'  {step:45s} median {timing["median"] * 1000:10.2f} ms   min {timing["min"] * 1000:10.2f} ms')
+
+    if args.save:
+        with open(args.save, mode='w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f'\nbaseline saved to {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmark: 受訪者差異分析 (top_5_module_by_interviewee)
+#   python -m benchmark.interviewee_gap [--interviewees 50] [--repeat 20]
+# compares the per-aspect row-parity implementation (kept below as reference) with
+# data_transformation.interviewee_gap_by_aspect, and checks both give the same slides data.
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import module.data_transformation as transform
+from benchmark.timing import timeit
+
+ASPECTS = ["數位人才", "顧客體驗", "數位營運", "新科技"]
+MODULES_PER_ASPECT = 8
+QUESTIONS_PER_MODULE = 4
+
+
+def synthetic_data(interviewees: int, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # df_qualitative_result_question, df_interviewee as generate_report builds them.
+    rng = np.random.default_rng(seed)
+
+    questions = pd.DataFrame([
+        {'question_id': f'Q{a}{m}{q}', 'aspect': aspect, 'module': f'{aspect}-模組{m}', 'question': f'{aspect} 模組{m} 題目{q}'}
+        for a, aspect in enumerate(ASPECTS)
+        for m in range(MODULES_PER_ASPECT)
+        for q in range(QUESTIONS_PER_MODULE)])
+
+    rows = []
+    for i in range(interviewees):
+        actual = rng.integers(1, 4, len(questions))
+        target = actual + rng.integers(0, 3, len(questions))
+        for question_id, a, t in zip(questions['question_id'], actual, target):
+            rows.append(('經理', f'受訪者{i:02d}', question_id, '[現況]', str(a)))
+            rows.append(('經理', f'受訪者{i:02d}', question_id, '[目標]', str(t)))
+    df_form_data = pd.DataFrame(rows, columns=['job_title', 'interviewee', 'question_id', 'attribute', 'value'])
+    df_form_data['value'] = pd.to_numeric(df_form_data['value'])
+    df_form_data['weight_key'] = df_form_data['job_title'] + "_" + df_form_data['interviewee']
+
+    df_result = questions.copy()
+    df_result['gap'] = rng.uniform(0, 2, len(questions)).round(2)
+    df_result['ql_score'] = df_result['gap'] * rng.uniform(0, 1, len(questions))
+
+    df_interviewee = pd.merge(df_form_data, questions[['question_id', 'aspect', 'module']], on='question_id', how='left')
+    df_interviewee = pd.merge(df_interviewee, questions[['question_id', 'question']], on='question_id', how='left')
+    return df_result, df_interviewee
+
+
+def legacy_top_5_module_by_interviewee(df_qualitative_result_question: pd.DataFrame, df_interviewee: pd.DataFrame, aspect: str):
+    top_5_modules = df_qualitative_result_question[df_qualitative_result_question['aspect'] == aspect].reset_index(drop=True)
+    top_5_modules = top_5_modules.groupby(['module']).mean(numeric_only=True).reset_index()
+    top_5_modules = list(top_5_modules.nlargest(5, ['gap', 'ql_score']).astype(str)["module"])
+
+    df_interviewee = df_interviewee[df_interviewee['aspect'] == aspect].reset_index(drop=True)
+    df_interviewee.drop('attribute', axis=1, inplace=True)
+    df_temp = df_interviewee['value']
+    df_temp = df_temp[1::2].reset_index(drop=True) - df_temp.iloc[::2].reset_index(drop=True)
+    df_interviewee = df_interviewee.iloc[::2].reset_index(drop=True)
+    df_interviewee['gap'] = df_temp
+    df_interviewee.drop('value', axis=1, inplace=True)
+
+    module_questions = df_interviewee.groupby('module').apply(lambda x: x.nlargest(3, 'gap')).reset_index(drop=True)[['module', 'question']]
+    module_questions = module_questions.groupby('module')['question'].apply(lambda x: '\n'.join(set(x))).reset_index()
+    df_interviewee = df_interviewee.groupby(['module', "weight_key"]).mean(numeric_only=True).reset_index()
+    grouped_diff = df_interviewee.groupby(['module']).agg({'gap': lambda x: x.max() - x.min()}).reset_index()
+    grouped_diff = grouped_diff.rename(columns={'gap': 'diff'})
+    grouped_diff['diff'] = round(grouped_diff['diff'], 2)
+    df_interviewee['gap'] = round(df_interviewee['gap'], 2)
+    df_interviewee = pd.merge(df_interviewee, module_questions, on=['module'], how='left')
+    df_interviewee = pd.merge(df_interviewee, grouped_diff, on=['module'], how='left')
+    df_interviewee = df_interviewee[df_interviewee['module'].isin(top_5_modules)]
+
+    df_text_diff = df_interviewee[["question", "diff"]].drop_duplicates().reset_index().to_dict(orient='index')
+    return df_interviewee, df_text_diff
+
+
+def check(legacy: dict, current: dict) -> None:
+    # question sets were joined from a python set (random order), compare them as sets.
+    for aspect in ASPECTS:
+        old, new = legacy[aspect][0], current[aspect][0]
+        pd.testing.assert_frame_equal(
+            old.drop(columns='question').reset_index(drop=True), new.drop(columns='question').reset_index(drop=True),
+            check_dtype=False)
+        assert [set(q.split('\n')) for q in old['question']] == [set(q.split('\n')) for q in new['question']], aspect
+
+
+def main():
+    parser = argparse.ArgumentParser(description='受訪者差異分析 benchmark')
+    parser.add_argument('--interviewees', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    df_result, df_interviewee = synthetic_data(args.interviewees)
+    print(f'{args.interviewees} interviewees, {len(df_interviewee)} answer rows')
+
+    def legacy():
+        return {aspect: legacy_top_5_module_by_interviewee(df_result, df_interviewee, aspect) for aspect in ASPECTS}
+
+    def current():
+        return transform.interviewee_gap_by_aspect(df_result, df_interviewee, ASPECTS)
+
+    check(legacy(), current())
+
+    legacy_time = timeit(legacy, args.repeat)
+    current_time = timeit(current, args.repeat)
+    print(f'legacy  (4 x per aspect): {legacy_time * 1000:8.2f} ms')
+    print(f'current (one pass):       {current_time * 1000:8.2f} ms')
+    print(f'speedup: {legacy_time / current_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# load test: /api/task (or /api/sweep, /api/simulate) end to end, without the production database
+#   python -m benchmark.load_test [--requests 20] [--concurrency 4] [--endpoint task] [--payloads 4]
+#                                 [--interviewees 3] [--questions 100] [--solutions 65] [--years 3] [--cache]
+# run from the repository root (app.py reads its config files relative to it).
+# the app runs in this process on a threaded werkzeug server, its database engine is a SQLite file seeded with
+# synthetic stg tables (benchmark/synthetic.py) instead of db/connection_info.json. --payloads distinct requests
+# (different interviewees' answers / financial data) are sent round robin by --concurrency client threads.
+# requests carry "Cache-Control: no-cache" (every request is computed) unless --cache.
+# logging as in production (APP_ENV=prod: INFO, LOG/log.txt) unless APP_ENV is set, dev renders DataFrames at DEBUG.
+# reports requests/s, latency percentiles, status codes and peak RSS of the process (server + client).
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sqlalchemy import MetaData
+from werkzeug.serving import make_server
+
+import db.repository_stg as repo
+import benchmark.synthetic as synthetic
+from monitor.memory import peak_rss
+
+TEMPLATE_PATH = os.path.join('reporting', '數位轉型服務_Final Report_Template_0303_v1.1.pptx')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def start_server(args) -> tuple:
+    # seed the SQLite stand-in, import the app on it, serve on a free local port. returns (server, base url, dims).
+    dims = synthetic.dim_tables(args.questions, args.solutions)
+    tables = {**dims, **synthetic.reference_tables(template_path=TEMPLATE_PATH)}
+    conn = synthetic.sqlite_engine(tables, os.path.join(args.workdir, 'stg.sqlite'))
+
+    # app.py connects at import time with db/connection_info.json, hand it the fixture engine instead.
+    repo.connect = lambda *connection_info: (conn, MetaData(bind=conn))
+    os.environ.setdefault('APP_ENV', 'prod')
+    import app
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}', dims
+
+
+def send(url: str, body: bytes, cache: bool) -> tuple:
+    # (status, seconds, response bytes)
+    headers = {'Content-Type': 'application/json'}
+    if not cache:
+        headers['Cache-Control'] = 'no-cache'
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            content = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        content = e.read()
+        status = e.code
+    except OSError as e:
+        content = str(e).encode()
+        status = 0
+    return status, time.perf_counter() - start, len(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api end to end load test on a SQLite stand-in database')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--endpoint', choices=['task', 'sweep', 'simulate'], default='task')
+    parser.add_argument('--payloads', type=int, default=4, help='distinct request bodies, sent round robin')
+    parser.add_argument('--interviewees', type=int, default=3)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--solutions', type=int, default=65)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--cache', action='store_true', help='allow result cache hits (no Cache-Control: no-cache)')
+    parser.add_argument('--workdir', help='directory of the SQLite files (default: temporary)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.workdir = args.workdir or tmp
+        server, base_url, dims = start_server(args)
+        url = f'{base_url}/api/{args.endpoint}'
+
+        bodies = [json.dumps(synthetic.task_payload(dims, args.interviewees, args.years, seed=seed)).encode('utf-8')
+                  for seed in range(args.payloads)]
+        print(f'{url}: {args.requests} requests, concurrency {args.concurrency}, '
+              f'{args.payloads} payloads of {np.mean([len(body) for body in bodies]) / 1024:.0f} KiB')
+        rss_before = peak_rss()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda i: send(url, bodies[i % len(bodies)], args.cache), range(args.requests)))
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+    statuses = [status for status, _, _ in results]
+    latencies = np.array([seconds for status, seconds, _ in results if status == 200])
+    print(f'elapsed  : {elapsed:10.2f} s')
+    print(f'req/s    : {len(results) / elapsed:10.2f}')
+    print(f'status   : {dict(sorted((status, statuses.count(status)) for status in set(statuses)))}')
+    if len(latencies):
+        print('latency  : ' + '   '.join(f'p{p} {np.percentile(latencies, p) * 1000:.0f} ms' for p in PERCENTILES)
+              + f'   max {latencies.max() * 1000:.0f} ms')
+        print(f'response : {np.mean([size for status, _, size in results if status == 200]) / 1024:10.0f} KiB')
+    rss = peak_rss()
+    if rss is not None:
+        print(f'peak RSS : {rss / 2 ** 20:10.1f} MiB (after setup {rss_before / 2 ** 20:.1f} MiB)')
+
+
+if __name__ == '__main__':
+    main()
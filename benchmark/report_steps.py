@@ -0,0 +1,196 @@
+# benchmark: report generation (reporting/report.py) step by step, on the real 0303_v1.1 template
+#   python -m benchmark.report_steps [--repeat 5] [--backend native --backend image] [--chart-cache]
+#                                    [--interviewees 3] [--questions 100] [--solutions 65] [--years 3]
+#                                    [--profile report.collapsed]
+# calculated_tables come from apply_model on synthetic input (benchmark/synthetic.py, SQLite stand-in database).
+# generate_report runs unchanged, timings come from
+#   spans: template load (report.template), data preparation, each chart task, slide assembly, presentation.save
+#   wrappers around every pptx_utils slide filler, native_charts chart and plot_utils chart it calls.
+# every plot_utils chart is also timed on its own (uncached) with the arguments of the report run.
+# the chart image cache is bypassed (every chart drawn) unless --chart-cache.
+# --profile: one more report under the sampling profiler (monitor/sampling.py, all threads), collapsed stacks for
+# flamegraph.pl / speedscope.
+import argparse
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+import cache.chart_cache as chart_cache
+import module.model as model
+import reporting.native_charts as native_charts
+import reporting.plot_utils as plot
+import reporting.pptx_utils as pptx_utils
+import reporting.report as report
+import benchmark.synthetic as synthetic
+from benchmark.timing import copied
+from cache.store import LRUCache, TieredCache
+from cache.versions import refresh_dim_versions
+from monitor.sampling import StackSampler
+
+SLIDE_FILLERS = ['cover_slide', 'company_slide', 'strategy_slide', 'fin_indicator_slide', 'competitor_slide',
+                 'qualitative_gap_slide', 'solution_description_slide', 'solution_priority_matrix_slide',
+                 'solution_roi_slide', 'solution_roadmap_slide', 'interviewee_gap_slide', 'interviewee_images',
+                 'picture_placeholder_size']
+NATIVE_CHARTS = ['fin_sensitivity_chart', 'qualitative_detail_chart', 'interviewee_chart']
+PLOT_CHARTS = ['fin_performance', 'fin_sensitivity', 'solution_priority_matrix', 'qualitative_detail', 'interviewee_plots']
+INSTRUMENTED = [(pptx_utils, 'pptx_utils', SLIDE_FILLERS), (native_charts, 'native_charts', NATIVE_CHARTS), (plot, 'plot', PLOT_CHARTS)]
+
+
+def prepare(args) -> tuple:
+    # (conn, input_tables, calculated_tables) of one synthetic request.
+    dims = synthetic.dim_tables(args.questions, args.solutions)
+    conn = synthetic.sqlite_engine({**dims, **synthetic.reference_tables(template_path=report.TEST_PRESENTATION_TEMPLATE_NAME)})
+    refresh_dim_versions()
+    input_tables = synthetic.input_tables(dims, args.interviewees, args.years)
+    calculated_tables = model.apply_model(conn, input_tables)          # adds columns to input_tables the report reads (as in /api/task)
+    return conn, input_tables, calculated_tables
+
+
+def timed(step: str, func, timings: dict, calls: dict):
+    # func timed into timings[step], the arguments of its first call kept (copied, callees edit them) in calls[step].
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if step not in calls:
+            calls[step] = (copied(args), copied(kwargs))
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[step].append(time.perf_counter() - start)
+    return wrapper
+
+
+class SpanCollector(logging.Handler):
+    # span durations (monitor.trace) into timings['span <name>'].
+
+    def __init__(self, timings: dict):
+        super().__init__(logging.INFO)
+        self.timings = timings
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if getattr(record, 'event', None) == 'span':
+            self.timings[f'span {record.span}'].append(record.duration)
+
+
+@contextmanager
+def instrumented(timings: dict, calls: dict):
+    originals = [(module, name, getattr(module, name)) for module, _, names in INSTRUMENTED for name in names]
+    for module, prefix, names in INSTRUMENTED:
+        for name in names:
+            setattr(module, name, timed(f'{prefix}.{name}', getattr(module, name), timings, calls))
+
+    trace_logger = logging.getLogger('monitor.trace')
+    handler, level, propagate = SpanCollector(timings), trace_logger.level, trace_logger.propagate
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+    try:
+        yield
+    finally:
+        trace_logger.removeHandler(handler)
+        trace_logger.setLevel(level)
+        trace_logger.propagate = propagate
+        for module, name, func in originals:
+            setattr(module, name, func)
+
+
+def run_reports(conn, input_tables: dict, calculated_tables: dict, repeat: int, calls: dict) -> list[dict]:
+    # [{step: [seconds per call]}] of each report run, after one warm up run (template / font / import caches).
+    runs = []
+    for run in range(repeat + 1):
+        timings: dict = defaultdict(list)
+        with instrumented(timings, calls):
+            start = time.perf_counter()
+            ppt_buffer = report.generate_report(conn, copied(input_tables), copied(calculated_tables))
+            timings['generate_report'].append(time.perf_counter() - start)
+        timings['pptx size (MiB)'] = [ppt_buffer.getbuffer().nbytes / 2 ** 20]
+        if run:
+            runs.append(timings)
+    return runs
+
+
+def chart_arguments(calls: dict) -> dict:
+    # {chart name: (args, kwargs)} as called in the report, fin_performance (not in the current slides) per indicator.
+    charts = {name: calls[f'plot.{name}'] for name in PLOT_CHARTS if f'plot.{name}' in calls}
+    if 'pptx_utils.fin_indicator_slide' in calls:
+        df_fin_performance = calls['pptx_utils.fin_indicator_slide'][0][1]
+        name, df = next(iter(df_fin_performance.groupby('fin_indicator_text_en', observed=True)))
+        charts['fin_performance'] = ((str(name), df.reset_index(drop=True)), {})
+    return charts
+
+
+def time_charts(charts: dict, repeat: int) -> dict:
+    # {chart name: [seconds]} of the chart functions alone, chart cache bypassed.
+    timings = {}
+    for name, (args, kwargs) in charts.items():
+        func = getattr(plot, name).__wrapped__
+        func(*copied(args), **copied(kwargs))                   # warm up
+        timings[name] = []
+        for _ in range(repeat):
+            run_args, run_kwargs = copied(args), copied(kwargs)
+            start = time.perf_counter()
+            func(*run_args, **run_kwargs)
+            timings[name].append(time.perf_counter() - start)
+    return timings
+
+
+def print_breakdown(runs: list[dict]) -> None:
+    # median over runs of the per report total of each step, share of generate_report.
+    # steps of parallel tasks overlap (task graph threads), their shares add up to more than 100%.
+    steps = sorted({step for timings in runs for step in timings}, key=lambda step: (not step.startswith('span'), step))
+    total = float(np.median([sum(timings['generate_report']) for timings in runs]))
+    print(f'  {"step":58s} {"calls":>5s} {"median ms":>10s} {"share":>6s}')
+    for step in steps:
+        if step == 'pptx size (MiB)':
+            continue
+        per_run = [sum(timings.get(step, [])) for timings in runs]
+        calls = int(np.median([len(timings.get(step, [])) for timings in runs]))
+        median = float(np.median(per_run))
+        print(f'  {step:58s} {calls:5d} {median * 1000:10.1f} {median / total:6.1%}')
+    print(f'  pptx size: {np.median([timings["pptx size (MiB)"][0] for timings in runs]):.2f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='report generation, per step')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', action='append', choices=['native', 'image'], help='report.CHART_BACKEND (repeatable, default both)')
+    parser.add_argument('--chart-cache', action='store_true', help='keep the chart image cache (default: every chart drawn)')
+    parser.add_argument('--interviewees', type=int, default=3)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--solutions', type=int, default=65)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--profile', help='write a collapsed stack profile of one more report to this file')
+    args = parser.parse_args()
+
+    if not args.chart_cache:
+        chart_cache._cache = TieredCache(LRUCache(0, name='chart_memory'))     # nothing fits: every lookup misses
+
+    conn, input_tables, calculated_tables = prepare(args)
+    calls: dict = {}
+    default_backend = report.CHART_BACKEND
+    for backend in args.backend or ['native', 'image']:
+        report.CHART_BACKEND = backend
+        runs = run_reports(conn, input_tables, calculated_tables, args.repeat, calls)
+        print(f'\ngenerate_report, CHART_BACKEND = {backend!r}, {args.repeat} runs')
+        print_breakdown(runs)
+    report.CHART_BACKEND = default_backend
+
+    print(f'\nplot_utils charts alone (uncached), {args.repeat} runs')
+    for name, timings in time_charts(chart_arguments(calls), args.repeat).items():
+        print(f'  {name:30s} median {np.median(timings) * 1000:8.1f} ms   min {np.min(timings) * 1000:8.1f} ms')
+
+    if args.profile:
+        with StackSampler() as sampler:
+            report.generate_report(conn, copied(input_tables), copied(calculated_tables))
+        sampler.write(args.profile)
+        print(f'\n{sampler.total()} thread samples written to {args.profile}, most sampled innermost frames:')
+        for label, count in sampler.top(15):
+            print(f'  {count / sampler.total():7.1%}  {label}')
+
+
+if __name__ == '__main__':
+    main()
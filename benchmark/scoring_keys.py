@@ -0,0 +1,83 @@
+# benchmark: scoring joins on string keys vs shared categorical codes (module/keys.py)
+#   python -m benchmark.scoring_keys [--solutions 20000] [--questions 300] [--repeat 5]
+# sq_score = dim_sq_relation ⋈ weighted gap (question_id) -> sum by solution_id
+# sf_score = dim_sf_relation ⋈ trend score (fin_indicator_id) -> sum by solution_id
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import module.keys as keys
+from benchmark.timing import timeit
+
+QUESTIONS_PER_SOLUTION = 30
+INDICATORS = 8
+
+
+def synthetic_tables(solutions: int, questions: int, seed: int = 0) -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    solution_ids = np.array([f'SOL-{i:06d}' for i in range(solutions)], dtype=object)
+    question_ids = np.array([f'SERV-{i:04d}' for i in range(questions)], dtype=object)
+    indicator_ids = np.array([f'FIN-{i:02d}' for i in range(INDICATORS)], dtype=object)
+
+    return {
+        'dim_sq_relation': pd.DataFrame({
+            'solution_id': np.repeat(solution_ids, QUESTIONS_PER_SOLUTION),
+            'question_id': rng.choice(question_ids, solutions * QUESTIONS_PER_SOLUTION),
+            'correlation_score': rng.integers(1, 4, solutions * QUESTIONS_PER_SOLUTION).astype(float)}),
+        'df_calculate': pd.DataFrame({
+            'question_id': question_ids,
+            'ql_score': rng.uniform(0, 1, questions)}),
+        'dim_sf_relation': pd.DataFrame({
+            'solution_id': np.repeat(solution_ids, INDICATORS),
+            'fin_indicator_id': np.tile(indicator_ids, solutions),
+            'correlation_score': rng.integers(0, 4, solutions * INDICATORS).astype(float)}),
+        'df_trend': pd.DataFrame({
+            'fin_indicator_id': indicator_ids,
+            'trend_score': rng.integers(-2, 3, INDICATORS).astype(float)}),
+    }
+
+
+def score(tables: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    df_sq = tables['dim_sq_relation'].merge(tables['df_calculate'], on='question_id', how='left')
+    df_sq['sq_score'] = df_sq.ql_score * df_sq.correlation_score
+    df_sq = df_sq.groupby(['solution_id'], observed=True)['sq_score'].sum()
+
+    df_sf = tables['dim_sf_relation'].merge(tables['df_trend'], on='fin_indicator_id', how='left')
+    df_sf['sf_score'] = df_sf.correlation_score * df_sf.trend_score
+    df_sf = df_sf.groupby(['solution_id'], observed=True)['sf_score'].sum()
+
+    return df_sq.reset_index().merge(df_sf.reset_index(), on='solution_id', how='outer')
+
+
+def memory(tables: dict[str, pd.DataFrame]) -> int:
+    return sum(int(df.memory_usage(deep=True).sum()) for df in tables.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='scoring joins: string keys vs categorical codes')
+    parser.add_argument('--solutions', type=int, default=20000)
+    parser.add_argument('--questions', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    strings = synthetic_tables(args.solutions, args.questions)
+    encoded = {name: df.copy() for name, df in strings.items()}
+    start = time.perf_counter()
+    keys.align(*encoded.values(), extend_keys=True)         # stand-ins for dimension tables
+    encode_time = time.perf_counter() - start
+
+    # same scores either way
+    expected = score(strings).sort_values('solution_id').reset_index(drop=True)
+    result = keys.decode(score(encoded)).sort_values('solution_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected, result)
+
+    print(f'{args.solutions} solutions, {args.questions} questions, {len(strings["dim_sq_relation"])} sq relations')
+    print(f'memory   string keys: {memory(strings) / 2**20:8.1f} MB   encoded: {memory(encoded) / 2**20:8.1f} MB')
+    print(f'scoring  string keys: {timeit(lambda: score(strings), args.repeat) * 1000:8.1f} ms   '
+          f'encoded: {timeit(lambda: score(encoded), args.repeat) * 1000:8.1f} ms   (one-off encode at load: {encode_time * 1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# benchmark: Monte Carlo ranking (module/simulation.py), batched scenarios vs one scoring.rank per scenario
+#   python -m benchmark.simulation [--solutions 20000] [--interviewees 20] [--scenarios 2000] [--loop 50]
+# first checks run_simulation on a cold process (python -m benchmark.simulation --cold-start, in a subprocess):
+# dimension tables read from a SQLite stand-in database, none encoded beforehand, as the first /api/simulate
+# after a restart. the ranking must match apply_model and the same call repeated.
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import module.keys as keys
+import module.model as model
+import module.scoring as scoring
+import module.simulation as simulation
+import benchmark.synthetic as synthetic
+from benchmark.scoring_keys import synthetic_tables
+from cache.versions import refresh_dim_versions
+
+
+def cold_start_check(scenarios: int = 200) -> None:
+    dims = synthetic.dim_tables(100, 65)
+    conn = synthetic.sqlite_engine(dims)
+    refresh_dim_versions()
+    options = {'scenarios': scenarios}
+
+    first = simulation.run_simulation(conn, synthetic.input_tables(dims, 3, 3), options)
+    again = simulation.run_simulation(conn, synthetic.input_tables(dims, 3, 3), options)
+    expected = model.apply_model(conn, synthetic.input_tables(dims, 3, 3))['解決方案前十名與ROI']
+
+    pd.testing.assert_frame_equal(first, again)
+    ranked = first[first['rank'].notna()].sort_values('rank')
+    assert list(ranked['solution_id']) == list(expected['solution_id']), (list(ranked['solution_id']), list(expected['solution_id']))
+    np.testing.assert_allclose(ranked['ROI'].to_numpy(), expected['ROI'].to_numpy())
+    print(f'cold start: run_simulation ranks the {len(ranked)} solutions of apply_model, {len(first)} reach the top 10')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo ranking: batched vs loop')
+    parser.add_argument('--solutions', type=int, default=20000)
+    parser.add_argument('--questions', type=int, default=300)
+    parser.add_argument('--interviewees', type=int, default=20)
+    parser.add_argument('--scenarios', type=int, default=2000)
+    parser.add_argument('--loop', type=int, default=50, help='scenarios timed with the per scenario loop (extrapolated)')
+    parser.add_argument('--cold-start', action='store_true', help='only the cold process check (run in a fresh process)')
+    args = parser.parse_args()
+
+    if args.cold_start:
+        cold_start_check()
+        return
+    subprocess.run([sys.executable, '-m', 'benchmark.simulation', '--cold-start'], check=True)
+
+    rng = np.random.default_rng(0)
+    tables = {name: keys.encode(df, extend_keys=True) for name, df in synthetic_tables(args.solutions, args.questions).items()}     # stand-ins for dimension tables
+    df_solution_filter = tables['dim_sf_relation'][['solution_id']].drop_duplicates().sample(frac=0.5, random_state=0)
+    sq_matrix = scoring.RelationMatrix(tables['dim_sq_relation'], 'question_id')
+    sf_matrix = scoring.RelationMatrix(tables['dim_sf_relation'], 'fin_indicator_id')
+
+    # gap = basis @ interviewee weights, question weight 1.
+    df_calculate = tables['df_calculate']
+    basis = rng.integers(-1, 3, (len(df_calculate), args.interviewees)).astype(float)
+    weights = np.full(args.interviewees, 1 / args.interviewees)
+    options = {**simulation.DEFAULT_OPTIONS, 'scenarios': args.scenarios}
+
+    def batched():
+        df_included, solutions = scoring.included(df_solution_filter, sq_matrix, sf_matrix, df_calculate, tables['df_trend'])
+        sq_basis = sq_matrix.scores(df_calculate, basis, solutions)
+        sf_score = sf_matrix.scores(tables['df_trend'], 'trend_score', solutions)
+        return simulation.simulate_ranking(sq_basis, sf_score, weights, options, np.random.default_rng(0), 10)
+
+    def loop(scenarios: int):
+        draws = simulation.perturb(np.random.default_rng(0), weights, options['weight_sd'], scenarios)
+        for i in range(scenarios):
+            df_calculate['ql_score'] = basis @ draws[:, i]
+            scoring.rank(df_solution_filter, df_calculate, tables['df_trend'], sq_matrix, sf_matrix, 10)
+
+    start = time.perf_counter()
+    positions, ranked = batched()
+    batched_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop(args.loop)
+    loop_time = (time.perf_counter() - start) / args.loop * args.scenarios
+
+    print(f'{args.solutions} solutions ({len(df_solution_filter)} included), {args.interviewees} interviewees, {args.scenarios} scenarios')
+    print(f'loop (one rank per scenario, extrapolated): {loop_time * 1000:10.1f} ms')
+    print(f'batched (chunks of {simulation.CHUNK_SCENARIOS})            : {batched_time * 1000:10.1f} ms')
+    print(f'solutions reaching the top 10: {len(np.unique(positions[ranked]))}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# benchmark: solution ranking, merge / groupby / nlargest vs sparse scoring engine (module/scoring.py)
+#   python -m benchmark.solution_ranking [--solutions 50000] [--questions 300] [--included 0.5] [--repeat 20]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import module.keys as keys
+import module.scoring as scoring
+from benchmark.scoring_keys import synthetic_tables, timeit
+
+
+def merge_ranking(tables: dict[str, pd.DataFrame], df_solution_filter: pd.DataFrame) -> pd.DataFrame:
+    # apply_model before the scoring engine.
+    df_sq = tables['dim_sq_relation'].merge(tables['df_calculate'], on='question_id', how='left')
+    df_sq['sq_score'] = df_sq.ql_score * df_sq.correlation_score
+    df_sq = df_sq.groupby(['solution_id'])['sq_score'].sum().reset_index()
+
+    df_sf = tables['dim_sf_relation'].merge(tables['df_trend'], on='fin_indicator_id', how='left')
+    df_sf['sf_score'] = df_sf.correlation_score * df_sf.trend_score
+    df_sf = df_sf.groupby(['solution_id'])['sf_score'].sum().reset_index()
+
+    df_result = df_sq.merge(df_sf, on='solution_id', how='outer').fillna(0)
+    df_result['final_score'] = df_result.sq_score + df_result.sf_score
+    df_result = df_solution_filter.merge(df_result, on='solution_id', how='left')
+    return df_result.nlargest(10, 'final_score')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='solution ranking: merges vs sparse matrices')
+    parser.add_argument('--solutions', type=int, default=50000)
+    parser.add_argument('--questions', type=int, default=300)
+    parser.add_argument('--included', type=float, default=0.5, help='share of solutions marked 納入評估')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tables = synthetic_tables(args.solutions, args.questions)
+    df_solution_filter = tables['dim_sf_relation'][['solution_id']].drop_duplicates().sample(frac=args.included, random_state=0)
+
+    encoded = {name: keys.encode(df.copy(), extend_keys=True) for name, df in tables.items()}       # stand-ins for dimension tables
+    encoded_filter = keys.encode(df_solution_filter.copy())
+    keys.align(*encoded.values(), encoded_filter)
+
+    start = time.perf_counter()
+    sq_matrix = scoring.RelationMatrix(encoded['dim_sq_relation'], 'question_id')
+    sf_matrix = scoring.RelationMatrix(encoded['dim_sf_relation'], 'fin_indicator_id')
+    build_time = time.perf_counter() - start
+
+    def engine_ranking():
+        return scoring.rank(encoded_filter, encoded['df_calculate'], encoded['df_trend'], sq_matrix, sf_matrix, k=10)
+
+    # the per request part: vectors + products over the included rows only + top 10.
+    size = len(keys.dtype('solution_id').categories)
+    codes = keys.codes(encoded_filter, 'solution_id')
+
+    def engine_core():
+        final = np.nan_to_num(sq_matrix.scores(encoded['df_calculate'], 'ql_score', codes)) \
+            + sf_matrix.scores(encoded['df_trend'], 'trend_score', codes)
+        return scoring.top_k(final, 10)
+
+    expected = merge_ranking(tables, df_solution_filter)
+    result = keys.decode(engine_ranking())
+    np.testing.assert_allclose(expected['final_score'].to_numpy(), result['final_score'].to_numpy())
+    assert list(expected['solution_id']) == list(result['solution_id'])
+
+    print(f'{args.solutions} solutions ({size} codes), {len(df_solution_filter)} included, {len(tables["dim_sq_relation"])} sq relations')
+    print(f'merge / groupby / nlargest : {timeit(lambda: merge_ranking(tables, df_solution_filter), args.repeat) * 1000:8.2f} ms')
+    print(f'engine (frames in / out)   : {timeit(engine_ranking, args.repeat) * 1000:8.2f} ms')
+    print(f'engine core (mat-vec, top) : {timeit(engine_core, args.repeat) * 1000:8.2f} ms')
+    print(f'matrix build (per dimension version): {build_time * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+# synthetic input for benchmarks / load tests: stg tables and the workbook sheets / form payload of /api/task,
+# shaped like 企業數位進程評估服務-多位受訪者.xlsm (excel 用戶端) and db/model_stg.py, scaled by
+#   questions, solutions (dimension tables), interviewees, years (workbook).
+# same arguments + seed -> same tables.
+import base64
+import hashlib
+import warnings
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as database
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.dialects.postgresql import BYTEA
+from sqlalchemy.ext.compiler import compiles
+from PIL import Image
+
+import ETL
+from db.model_stg import meta
+
+ASPECTS = ["數位人才", "顧客體驗", "數位營運", "新科技"]
+MODULES_PER_ASPECT = 6
+UPDATED_DATE = '2023-03-01'
+
+STRATEGIES = {
+    'STRAT-1': ('採用新科技進行創新', 0.2, 0.2, 0.2, 0.4),       # strategy_text, aspect_ux, aspect_mfg, aspect_ppl, aspect_tech
+    'STRAT-2': ('用資料驅動每一個決策', 0.2, 0.3, 0.2, 0.3),
+    'STRAT-3': ('設計好的體驗讓改變被廣泛接納', 0.4, 0.2, 0.2, 0.2),
+    'STRAT-4': ('改變企業速度與營運活動', 0.2, 0.4, 0.2, 0.2),
+}
+
+# (fin_indicator_text_en, fin_indicator_text_ch, formula, sensitivity formula, sensitivity_performance_select_method, use_percentage)
+FIN_INDICATORS = [
+    ('fixed_assets_turnover_ratio', '固定資產周轉率', 'sales_revenue / avg_fixed_assets',
+     '(ppe_net_value*0.01) * ( 1 + depreciation_expense / ppe_net_value)', 'max()', False),
+    ('days_sales_outstanding', '應收帳款周轉天數', 'avg_accounts_receivable / sales_revenue * 365',
+     'sales_revenue / 365 * avg_unsecured_loan_interest_rate', 'min()', False),
+    ('days_payable_outstanding', '應付帳款周轉天數', 'avg_accounts_payable / cost_of_goods_sold * 365',
+     'cost_of_goods_sold / 365 * avg_unsecured_loan_interest_rate', 'max()', False),
+    ('cost_of_goods_sold_rate', '銷貨成本率', 'cost_of_goods_sold / sales_revenue',
+     'sales_revenue * 0.01', 'min()', True),
+    ('inventory_days', '存貨周轉天數', 'avg_inventory / cost_of_goods_sold * 365',
+     'cost_of_goods_sold / 365 * inventory_cost_rate', 'min()', False),
+    ('revenue_growth_rate', '銷貨收入成長率', '(sales_revenue - previous_sales_revenue) / previous_sales_revenue',
+     'sales_revenue * 0.01', 'max()', True),
+    ('operating_expense_rate', '營業費用率', 'operating_expense / sales_revenue',
+     'sales_revenue * 0.01', 'min()', True),
+    ('employee_productivity', '員工生產力', 'sales_revenue / employee_count',
+     'employee_count * 1000', 'max()', False),
+]
+
+# tbl_quantitative: (name_en, multiplier, 資料來源, 名稱, 單位, first year value), sample workbook scale
+FINANCIALS = [
+    ('accounts_receivable', 1000, '資產負債表', '應收帳款及票據', '新台幣仟元', 341825.0),
+    ('accounts_payable', 1000, '資產負債表', '應付帳款及票據', '新台幣仟元', 620594.0),
+    ('inventory_value', 1000, '資產負債表', '存貨', '新台幣仟元', 10125781.0),
+    ('ppe_net_value', 1000, '資產負債表', '固定資產', '新台幣仟元', 80069.0),
+    ('sales_revenue', 1000, '損益表', '營業收入淨額', '新台幣仟元', 1571713.0),
+    ('cost_of_goods_sold', 1000, '損益表', '營業成本（支出）', '新台幣仟元', 996542.0),
+    ('operating_expense', 1000, '損益表', '營業費用', '新台幣仟元', 195113.0),
+    ('depreciation_expense', 1000, '年報:  合併現金流量表', '折舊金額', '新台幣仟元', 2097.0),
+    ('employee_count', 1, '年報:  成本指標', '員工人數', '人', 64.0),
+]
+# (name_en, 資料來源, 名稱, 單位, 常數)
+CONSTANTS = [
+    ('industry_cost_of_goods_sold_rate', '客戶所屬產業 - 財務指標', '銷貨成本率', '百分比', 0.01),
+    ('industry_days_sales_outstanding', '客戶所屬產業 - 財務指標', '應收帳款周轉天數', '天', 2),
+    ('industry_inventory_days', '客戶所屬產業 - 財務指標', '存貨周轉天數', '天', 2),
+    ('industry_revenue_growth_rate', '客戶所屬產業 - 財務指標', '營收成長率', '百分比', 0.03),
+    ('industry_operating_expense_rate', '客戶所屬產業 - 財務指標', '營業費用率', '百分比', 0.16),
+    ('inventory_cost_rate', '公司內部', '管理存貨附加成本百分比', '百分比', 0.0059),
+    ('avg_unsecured_loan_interest_rate', '公司內部', '公司無擔保借貸平均利率', '百分比', 0.023),
+]
+# derived rows: (name_en, 名稱, source row, 'previous' | 'average')
+DERIVED = [
+    ('previous_sales_revenue', '前期營業收入', 'sales_revenue', 'previous'),
+    ('avg_accounts_receivable', '平均應收帳款', 'accounts_receivable', 'average'),
+    ('avg_accounts_payable', '平均應付帳款', 'accounts_payable', 'average'),
+    ('avg_inventory', '存貨平均餘額', 'inventory_value', 'average'),
+    ('avg_fixed_assets', '固定資產平均淨值', 'ppe_net_value', 'average'),
+]
+JOB_TITLES = ['董事長', '總經理', '副總經理', '協理', '經理', '資訊長']
+COMPANY_ID = '84466749'
+INDUSTRY_L_ID = 'F'                 # report.TEST_DATA
+INDUSTRIES = 4
+CASES_PER_INDUSTRY = 3
+USER_EMAIL = 'loadtest@example.com'
+USER_PASSWORD = 'loadtest'
+
+
+def dim_tables(questions: int = 100, solutions: int = 65, seed: int = 0) -> dict[str, pd.DataFrame]:
+    # {table name (db/model_stg.py): rows}
+    rng = np.random.default_rng(seed)
+    tables: dict = {}
+
+    question_ids = [f'Q-{i + 1}' for i in range(questions)]
+    aspects = [ASPECTS[i % len(ASPECTS)] for i in range(questions)]
+    tables['dim_qualitative_question'] = pd.DataFrame({
+        'question_id': question_ids,
+        'aspect': aspects,
+        'module': [f'{aspect}-模組{(i // len(ASPECTS)) % MODULES_PER_ASPECT + 1}' for i, aspect in enumerate(aspects)],
+        'question': [f'{aspect} 題目 {i + 1}' for i, aspect in enumerate(aspects)],
+        'updated_date': UPDATED_DATE})
+
+    indicator_rows, trend_rows = [], []
+    for i, (text_en, text_ch, formula, sensitivity, select_method, use_percentage) in enumerate(FIN_INDICATORS, start=1):
+        indicator_rows.append((f'FI-{i}', text_en, text_ch, 'module-main', None, formula, None, None))
+        indicator_rows.append((f'FS-{i}', f'{text_en}_sensitivity', f'{text_ch}敏感度', 'sensitivity', '1%', sensitivity, select_method, use_percentage))
+        trend_rows.append((f'FI-{i}', '成長', 'CAGR >= (industry_CAGR + 3)', '1'))
+        trend_rows.append((f'FI-{i}', '持平', '(CAGR < (industry_CAGR + 3)) and (CAGR > (industry_CAGR - 3))', '0'))
+        trend_rows.append((f'FI-{i}', '衰退', 'CAGR <= (industry_CAGR - 3)', '-1'))
+    tables['dim_quantative_index'] = pd.DataFrame(indicator_rows, columns=[
+        'fin_indicator_id', 'fin_indicator_text_en', 'fin_indicator_text_ch', 'fin_indicator_purpose',
+        'sensitive_variable_proportion', 'fin_indicator_formula', 'sensitivity_performance_select_method', 'use_percentage'])
+    tables['dim_quantative_index']['updated_date'] = UPDATED_DATE
+    tables['dim_financial_trend_index'] = pd.DataFrame(trend_rows, columns=['fin_indicator_id', 'trend_name', 'trend_formula', 'trend_score'])
+    tables['dim_financial_trend_index']['updated_date'] = UPDATED_DATE
+
+    solution_ids = [f'S-{i + 1}' for i in range(solutions)]
+    tables['dim_solution'] = pd.DataFrame({
+        'solution_id': solution_ids,
+        'industry_category': '通用',
+        'level1': [f'解決方案類別{i % 5 + 1}' for i in range(solutions)],
+        'level2': [f'解決方案子類別{i % 12 + 1}' for i in range(solutions)],
+        'level3': [f'解決方案 {i + 1}' for i in range(solutions)],
+        'solution_description': [f'解決方案 {i + 1} 說明' for i in range(solutions)],
+        'average_price': rng.integers(50, 5000, solutions) * 1000.0,
+        'updated_date': UPDATED_DATE})
+
+    # each solution relates to ~10 questions and to every main indicator.
+    related = min(10, questions)
+    tables['dim_sq_relation_score'] = pd.DataFrame({
+        'solution_id': np.repeat(solution_ids, related),
+        'question_id': np.concatenate([rng.choice(question_ids, related, replace=False) for _ in solution_ids]),
+        'correlation_score': rng.integers(1, 4, solutions * related)})
+    indicator_ids = [f'FI-{i}' for i in range(1, len(FIN_INDICATORS) + 1)]
+    tables['dim_sf_relation_score'] = pd.DataFrame({
+        'solution_id': np.repeat(solution_ids, len(indicator_ids)),
+        'fin_indicator_id': np.tile(indicator_ids, solutions),
+        'correlation_score': rng.integers(0, 4, solutions * len(indicator_ids)),
+        'updated_date': UPDATED_DATE})
+
+    tables['dim_strategy_weight'] = pd.DataFrame([
+        (strategy_id, text, f'{text} 訪談方向 1', f'{text} 訪談方向 2', f'{text} 訪談方向 3', ux, mfg, ppl, tech, UPDATED_DATE)
+        for strategy_id, (text, ux, mfg, ppl, tech) in STRATEGIES.items()],
+        columns=['strategy_id', 'strategy_text', 'interview_approach_01', 'interview_approach_02', 'interview_approach_03',
+                 'aspect_ux', 'aspect_mfg', 'aspect_ppl', 'aspect_tech', 'updated_date'])
+    return tables
+
+
+def case_image(case_number: int) -> bytes:
+    # small PNG as dim_case.case_img_blob.
+    buffer = BytesIO()
+    Image.new('RGB', (320, 180), color=(40 * case_number % 256, 120, 200)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def reference_tables(company_id: str = COMPANY_ID, user_email: str = USER_EMAIL, password: str = USER_PASSWORD,
+                     template_path: str = None) -> dict[str, pd.DataFrame]:
+    # the other stg tables: company, industries / cases, legacy relation tables, version, report template, login user.
+    #   dim_fact_* stay empty, they are written by /api/task.
+    tables: dict = {}
+    tables['dim_company'] = pd.DataFrame([{
+        'company_id': company_id, 'company_text': f'公司{company_id}', 'client_text': '受訪者001', 'client_title': '負責人',
+        'capital_max': 3265541500, 'capital_min': 1000000000, 'registered_area': '臺灣', 'registered_country': '臺北市',
+        'company_description': '不動產開發、租售', 'company_year': '1993', 'employee_max': 100, 'employee_min': 50,
+        'industry_type_l': '金融、保險及不動產業', 'industry_type_m': '不動產業', 'industry_type_s': '不動產開發業',
+        'updated_date': UPDATED_DATE}])
+
+    industry_ids = [f'{INDUSTRY_L_ID}{i + 1:02d}' for i in range(INDUSTRIES)]
+    tables['dim_industry'] = pd.DataFrame({
+        'version': '1', 'industry_id': industry_ids, 'industry_l_id': INDUSTRY_L_ID, 'industry_l_text': '營建工程業',
+        'industry_m_id': industry_ids, 'industry_m_text': [f'產業 {i + 1}' for i in range(INDUSTRIES)],
+        'industry_description': '產業說明', 'industry_transformation_keypoint': '數位轉型重點',
+        'industry_transformation_advice': '數位轉型建議', 'updated_date': UPDATED_DATE})
+    case_ids = [f'C-{i + 1}' for i in range(INDUSTRIES * CASES_PER_INDUSTRY)]
+    tables['dim_case'] = pd.DataFrame({
+        'case_id': case_ids, 'case_text': [f'案例 {i + 1}' for i in range(len(case_ids))], 'case_description': '案例說明',
+        'case_img': None, 'case_link1': 'https://example.com', 'case_link2': None, 'case_link3': None,
+        'updated_date': UPDATED_DATE, 'case_img_blob': [case_image(i) for i in range(len(case_ids))], 'case_source': '公開資料'})
+    tables['dim_industries_cases'] = pd.DataFrame({'industry_id': np.repeat(industry_ids, CASES_PER_INDUSTRY), 'case_id': case_ids})
+
+    tables['financial_trend_index'] = pd.DataFrame([
+        (f'FI-{i}', f'G-{rank}', name, formula, rank, UPDATED_DATE)
+        for i in range(1, len(FIN_INDICATORS) + 1)
+        for rank, (name, formula) in enumerate([('成長', 'CAGR >= 3'), ('持平', 'CAGR > -3'), ('衰退', 'CAGR <= -3')])],
+        columns=['financial_id', 'growth_id', 'growth_text', 'formula', 'rank', 'updated_date'])
+    tables['quantative_relation_Score'] = pd.DataFrame(columns=['quan_relation_id', 'financial_id', 'version_solution', 'solution_id', 'Score'])
+    tables['dim_version'] = pd.DataFrame([{
+        'version_id': '1', 'qualitative_question_form': '1', 'fin_question_form': '1', 'model_fin_question': '1',
+        'profile_question': '1', 'include_solution': '1', 'file_template': '0303_v1.1', 'update_date': UPDATED_DATE}])
+
+    if template_path is not None:
+        with open(template_path, mode='rb') as f:
+            tables['dim_report_template'] = pd.DataFrame([{'report_id': 1, 'report_data': f.read()}])
+
+    # app.authenticate_user: sha256(salt + password)
+    salt = hashlib.sha256(user_email.encode()).digest()[:16]
+    tables['dim_user'] = pd.DataFrame([{
+        'user_email': user_email, 'salt': salt.hex(), 'password': hashlib.sha256(salt + password.encode()).hexdigest()}])
+    return tables
+
+
+def financial_data(years: int = 3, seed: int = 0) -> pd.DataFrame:
+    # tbl_quantitative: one row per input / constant, year columns '2018', ... (years + 1: the first year only feeds
+    # the previous / average rows, as in the sample workbook).
+    rng = np.random.default_rng(seed)
+    year_columns = [str(2023 - years + i) for i in range(years + 1)]
+    values: dict = {}
+    rows = []
+    for name_en, multiplier, source, name, unit, start in FINANCIALS:
+        values[name_en] = start * np.cumprod(np.r_[1, rng.uniform(0.7, 1.4, years)])
+        rows.append([name_en, multiplier, source, name, unit, np.nan, *values[name_en]])
+    for name_en, source, name, unit, constant in CONSTANTS:
+        rows.append([name_en, 1, source, name, unit, constant, *[np.nan] * len(year_columns)])
+    for name_en, name, source_row, kind in DERIVED:
+        previous = values[source_row][:-1]
+        derived = previous if kind == 'previous' else (previous + values[source_row][1:]) / 2
+        multiplier = next(row[1] for row in FINANCIALS if row[0] == source_row)
+        rows.append([name_en, multiplier, None, name, '新台幣仟元', np.nan, np.nan, *derived])
+    return pd.DataFrame(rows, columns=['name_en', 'multiplier', '資料來源', '名稱', '單位', '常數', *year_columns])
+
+
+def competitor_data(competitors: int = 4, seed: int = 0) -> pd.DataFrame:
+    # tbl_competitor: one row per indicator, one column per competitor.
+    rng = np.random.default_rng(seed)
+    columns = [f'競爭者{i + 1}' for i in range(competitors)]
+    rows = [['competitor_name', np.nan, '公司名稱', '-----------', *[f'競爭公司{i + 1}' for i in range(competitors)]]]
+    for text_en, text_ch, *_, use_percentage in FIN_INDICATORS:
+        multiplier = 1000 if text_en == 'employee_productivity' else 1
+        scale = 1 if use_percentage else 100
+        rows.append([text_en, multiplier, text_ch, '百分比' if use_percentage else '天', *(rng.uniform(0, 1, competitors) * scale).round(4)])
+    return pd.DataFrame(rows, columns=['name_en', 'multiplier', '名稱', '單位', *columns])
+
+
+def interviewee_names(interviewees: int) -> list[str]:
+    # '職稱_姓名' as tbl_interviewee_weight['問卷'] and the form keys.
+    return [f'{JOB_TITLES[i % len(JOB_TITLES)]}_受訪者{i + 1:03d}' for i in range(interviewees)]
+
+
+def workbook_tables(dims: dict, interviewees: int = 3, years: int = 3, seed: int = 0) -> dict[str, pd.DataFrame]:
+    # {sheet name: table} of the uploaded xlsx (ETL.extract_tables).
+    rng = np.random.default_rng(seed)
+    solutions = dims['dim_solution']
+    weights = rng.uniform(0.5, 1.5, interviewees)
+    return {
+        'tbl_quantitative': financial_data(years, seed),
+        'tbl_solution_filter': pd.DataFrame({
+            '納入評估': np.where(rng.uniform(0, 1, len(solutions)) < 0.7, 'v', None),
+            'solution_id': solutions['solution_id'],
+            '適用產業': solutions['industry_category'],
+            '解決方案': solutions['level3']}),
+        'tbl_interviewee_weight': pd.DataFrame({'問卷': interviewee_names(interviewees), '權重': (weights / weights.sum()).round(4)}),
+        'tbl_competitor': competitor_data(seed=seed),
+    }
+
+
+def workbook_bytes(sheets: dict[str, pd.DataFrame]) -> bytes:
+    # xlsx file as uploaded in table_data (base64 in the payload).
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+def form_payload(dims: dict, interviewees: int = 3, company_id: str = COMPANY_ID, strategy_id: str = 'STRAT-4', seed: int = 0) -> dict:
+    # /api/task json without table_data: 問卷 keys '職稱.姓名.題號.[現況]' + 公司基本資料 keys 'id.'.
+    rng = np.random.default_rng(seed)
+    question_ids = dims['dim_qualitative_question']['question_id']
+    payload: dict = {
+        'company_id.': company_id,
+        'company_text.': f'公司{company_id}',
+        'client_text.': '受訪者001',
+        'client_title.': '負責人',
+        'capital_max.': '3265541500',
+        'registered_country.': '臺北市',
+        'company_year.': '1993',
+        'industry_type_l.': '金融、保險及不動產業',
+        'STRAT.': f'{strategy_id}. {STRATEGIES[strategy_id][0]}',
+    }
+    for interviewee in interviewee_names(interviewees):
+        job_title, name = interviewee.split('_')
+        actual = rng.uniform(0, 4, len(question_ids)).round(6)
+        target = np.minimum(actual + rng.uniform(0, 2, len(question_ids)), 5).round(6)
+        for question_id, a, t in zip(question_ids, actual, target):
+            payload[f'{job_title}.{name}.{question_id}.[現況]'] = a
+            payload[f'{job_title}.{name}.{question_id}.[目標]'] = t
+    return payload
+
+
+def task_payload(dims: dict, interviewees: int = 3, years: int = 3, seed: int = 0,
+                 user_email: str = USER_EMAIL, password: str = USER_PASSWORD) -> dict:
+    # full /api/task (/api/sweep, /api/simulate) json: login, form, base64 workbook.
+    payload = {'user_email': user_email, 'password': password}
+    payload.update(form_payload(dims, interviewees, seed=seed))
+    payload['table_data'] = base64.b64encode(workbook_bytes(workbook_tables(dims, interviewees, years, seed))).decode('ascii')
+    return payload
+
+
+def input_tables(dims: dict, interviewees: int = 3, years: int = 3, seed: int = 0) -> dict[str, pd.DataFrame]:
+    # ETL.extract_tables output (sheets taken as read, no xlsx round trip).
+    sheets = workbook_tables(dims, interviewees, years, seed)
+    tables: dict = {
+        'df_financial_data': sheets['tbl_quantitative'],
+        'df_solution_filter': sheets['tbl_solution_filter'],
+        'df_form_weight': sheets['tbl_interviewee_weight'],
+        'df_competitor': ETL.transform_df_competitor(sheets['tbl_competitor']),
+    }
+    tables['df_form_data'], tables['df_company_data'] = ETL.extract_form_data(form_payload(dims, interviewees, seed=seed))
+    return tables
+
+
+# NUMERIC columns are read back as float on SQLite.
+warnings.filterwarnings('ignore', message=r'Dialect sqlite\+pysqlite does \*not\* support Decimal')
+
+
+@compiles(BYTEA, 'sqlite')
+def _bytea_as_blob(type_, compiler, **kw):
+    return 'BLOB'
+
+
+def sqlite_engine(tables: dict, path: str = None) -> database.engine:
+    # SQLite stand-in for the stg schema (all db/model_stg.py tables), seeded with tables.
+    #   path: database file, one connection per thread (concurrent requests), None -> in memory, one shared connection.
+    if path is None:
+        conn = database.create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        stg = "ATTACH DATABASE ':memory:' AS stg"
+    else:
+        conn = database.create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False, 'timeout': 60})
+        stg = f"ATTACH DATABASE '{path}.stg' AS stg"
+
+    @event.listens_for(conn, 'connect')
+    def attach_stg(dbapi_connection, connection_record):
+        dbapi_connection.execute(stg)
+
+    meta.drop_all(conn)
+    meta.create_all(conn)
+    with conn.begin() as connection:
+        for name, df in tables.items():
+            if df.empty:
+                continue
+            table = meta.tables[f'stg.{name}']
+            rows = df[[column for column in df.columns if column in table.c]].astype(object).where(df.notna(), None)
+            connection.execute(table.insert(), rows.to_dict(orient='records'))
+    return conn
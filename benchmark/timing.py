@@ -0,0 +1,27 @@
+# helpers shared by the benchmarks.
+#   timeit: median seconds of repeated calls.
+#   copied: fresh copy of call arguments, the timed functions add / edit columns of their input frames.
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def timeit(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def copied(value):
+    # frames / series copied, dicts / lists / tuples copied item by item, anything else shared.
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {key: copied(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(copied(item) for item in value)
+    return value
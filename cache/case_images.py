@@ -0,0 +1,49 @@
+# case study images (dim_case.case_img_blob), read lazily by case_id.
+# images are shared by every industry a case belongs to: each one is read from the database once
+# and kept in a byte-size-bounded LRU, keyed by case_id + dim_case version (administrator edits invalidate it).
+import logging
+
+import sqlalchemy as database
+
+import db.repository_stg as repo
+from cache.fingerprint import hash_values
+from cache.store import LRUCache
+from cache.versions import dim_versions
+
+logger = logging.getLogger(__name__)
+
+CASE_IMAGE_BYTES = 64 * 1024 * 1024
+NO_IMAGE = b''                  # cached marker for cases without image, so they are not read again.
+
+_cache = LRUCache(CASE_IMAGE_BYTES, name='case_image')
+
+
+def image_key(case_id: str, version: str) -> str:
+    return hash_values('case_image', case_id, version)
+
+
+def get_images(conn: database.engine, case_ids) -> dict:
+    # {case_id: image bytes or None}, duplicated ids are read once, cache misses in a single query.
+    version: str = dim_versions(conn).get('dim_case', '')
+    images: dict = {}
+    missing: list = []
+    for case_id in dict.fromkeys(case_ids):
+        image = _cache.get(image_key(case_id, version))
+        if image is None:
+            missing.append(case_id)
+        else:
+            images[case_id] = image or None
+
+    if missing:
+        logger.debug(f'case images read: {missing}')
+        fetched: dict = repo.get_case_images(conn, missing)
+        for case_id in missing:
+            image = fetched.get(case_id)
+            _cache.put(image_key(case_id, version), image or NO_IMAGE)
+            images[case_id] = image or None
+    return images
+
+
+def clear() -> None:
+    global _cache
+    _cache = LRUCache(CASE_IMAGE_BYTES, name='case_image')
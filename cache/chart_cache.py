@@ -0,0 +1,69 @@
+# rendered chart images (PNG bytes), keyed by chart function + normalized input data + style version.
+# identical inputs (resubmissions, interviewee modules with the same gaps ...) are served without matplotlib.
+import logging
+import threading
+from functools import wraps
+from io import BytesIO
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+import monitor.metrics as metrics
+from cache.fingerprint import hash_values
+from cache.store import LRUCache, DiskCache, TieredCache, cache_directory
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BYTES = 64 * 1024 * 1024
+DISK_BYTES = 512 * 1024 * 1024
+
+_cache: TieredCache = None
+_lock = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = TieredCache(
+                LRUCache(MEMORY_BYTES, name='chart_memory'),
+                DiskCache(cache_directory('chart'), DISK_BYTES, name='chart_disk'))
+    return _cache
+
+
+def normalize(value):
+    # same drawing data -> same key: categorical key columns hashed as their labels.
+    if isinstance(value, pd.DataFrame):
+        categorical = [column for column, dtype in value.dtypes.items() if isinstance(dtype, CategoricalDtype)]
+        return value.astype({column: object for column in categorical}) if categorical else value
+    if isinstance(value, pd.Series) and isinstance(value.dtype, CategoricalDtype):
+        return value.astype(object)
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    return value
+
+
+def chart_key(func, style_version: str, args: tuple, kwargs: dict) -> str:
+    return hash_values(func.__module__, func.__qualname__, style_version, normalize(args), {key: normalize(value) for key, value in kwargs.items()})
+
+
+def cached(style_version: str):
+    # decorator for chart functions returning a PNG BytesIO, ex. @chart_cache.cached(STYLE_VERSION)
+    # key is computed before the call (charts edit their input frames), callers always get a fresh buffer.
+    def decorator(func):
+        hits, misses = metrics.CHART_CACHE.labels(func.__name__, 'hit'), metrics.CHART_CACHE.labels(func.__name__, 'miss')
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = chart_key(func, style_version, args, kwargs)
+            image = get_cache().get(key)
+            if image is not None:
+                hits.inc()
+                return BytesIO(image)
+
+            misses.inc()
+            image = func(*args, **kwargs).getvalue()
+            get_cache().put(key, image)
+            return BytesIO(image)
+        return wrapper
+    return decorator
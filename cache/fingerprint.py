@@ -0,0 +1,72 @@
+# content hashing for cache keys.
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_bytes(data: bytes) -> str:
+    h = new_hash()
+    h.update(data)
+    return h.hexdigest()
+
+
+def update_json(h, value) -> None:
+    # key order independent, numbers / strings kept distinct.
+    h.update(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def update_frame(h, df: pd.DataFrame) -> None:
+    # hash values, index, column names and dtypes, so 1 vs '1' or reordered columns differ.
+    h.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))], ensure_ascii=False).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+
+
+def update_value(h, value) -> None:
+    # hash arbitrary stage input: DataFrame / Series / bytes / containers / json-able scalars.
+    if isinstance(value, pd.DataFrame):
+        h.update(b'frame')
+        update_frame(h, value)
+    elif isinstance(value, (pd.Series, pd.Index)):
+        h.update(b'series')
+        update_json(h, [str(value.name), str(value.dtype)])
+        h.update(pd.util.hash_pandas_object(value, index=isinstance(value, pd.Series)).values.tobytes())
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        h.update(b'bytes')
+        h.update(value)
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value, key=str):
+            update_json(h, str(key))
+            update_value(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b'list')
+        for item in value:
+            update_value(h, item)
+    else:
+        update_json(h, value)
+
+
+def hash_values(*values) -> str:
+    h = new_hash()
+    for value in values:
+        update_value(h, value)
+    return h.hexdigest()
+
+
+_file_hashes: dict[tuple, str] = {}
+
+def hash_file(path: str) -> str:
+    # hash file content, re-read only when size / mtime changed.
+    stat = os.stat(path)
+    stamp = (path, stat.st_size, stat.st_mtime_ns)
+
+    if stamp not in _file_hashes:
+        with open(path, mode='rb') as f:
+            _file_hashes[stamp] = hash_bytes(f.read())
+    return _file_hashes[stamp]
@@ -0,0 +1,54 @@
+# /api/task result cache, keyed by input content.
+# key = hash(decoded table_data, normalized form fields, dimension table versions, template content, report month,
+#            report version: model / report code, see reporting/report.py REPORT_VERSION)
+# value = finished pptx bytes.
+import logging
+import threading
+from datetime import datetime
+
+import sqlalchemy as database
+
+from cache.fingerprint import new_hash, update_json, hash_file
+from cache.store import LRUCache, DiskCache, TieredCache, cache_directory
+from cache.versions import dim_versions
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BYTES = 128 * 1024 * 1024
+DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+# request fields that do not affect the report.
+IGNORED_FIELDS = ('table_data', 'user_email', 'password')
+
+_cache: TieredCache = None
+_lock = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = TieredCache(
+                LRUCache(MEMORY_BYTES, name='result_memory'),
+                DiskCache(cache_directory('result'), DISK_BYTES, name='result_disk'))
+    return _cache
+
+
+def request_key(conn: database.engine, tables_xlsx: bytes, content: dict, template_path: str, report_version: str) -> str:
+    h = new_hash()
+    update_json(h, report_version)
+    h.update(tables_xlsx)
+    update_json(h, {key: value for key, value in content.items() if key not in IGNORED_FIELDS})
+    update_json(h, dim_versions(conn))
+    h.update(hash_file(template_path).encode())
+    update_json(h, datetime.now().strftime('%m-%Y'))      # cover slide shows report month.
+    return h.hexdigest()
+
+
+def get_report(key: str) -> bytes | None:
+    return get_cache().get(key)
+
+
+def put_report(key: str, pptx_bytes: bytes) -> None:
+    get_cache().put(key, pptx_bytes)
+    logger.info(f'result cache: stored {key} ({len(pptx_bytes)} bytes)')
@@ -0,0 +1,191 @@
+# size-bounded key-value stores for bytes.
+#   LRUCache: in-process, bounded by total value bytes.
+#   DiskCache: one file per key under a directory, bounded by total file bytes, least recently used evicted.
+#   TieredCache: memory in front of disk.
+# disk caches live under one directory (log_config.json -> "cache": {"directory": ...}), default next to the logs,
+# not a CACHE/ directory in the working directory: on Windows it is the same directory as the cache/ package.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import monitor.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+_directory: str = os.path.join('LOG', 'cache')
+
+
+def configure(config: dict, log_filename: str = None) -> None:
+    # config: {"directory": "..."}, directory defaults to <log directory>/cache. call before the first cache use.
+    global _directory
+    config = config or {}
+    _directory = config.get('directory') or os.path.join(os.path.dirname(log_filename or '') or 'LOG', 'cache')
+
+
+def cache_directory(name: str) -> str:
+    # directory of one disk cache, ex. cache_directory('result')
+    return os.path.join(_directory, name)
+
+
+class LRUCache:
+
+    def __init__(self, max_bytes: int, name: str = 'memory'):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.current_bytes = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+        metrics.CACHE_REQUESTS.labels(self.name, 'hit' if value is not None else 'miss').inc()
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+
+            self._items[key] = value
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskCache:
+
+    def __init__(self, directory: str, max_bytes: int, name: str = 'disk'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self.current_bytes = 0
+        self._index: OrderedDict[str, int] = OrderedDict()   # key -> size, ordered by last access
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self) -> None:
+        # rebuild LRU order from file access time, survives process restart.
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.current_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> bytes | None:
+        value = None
+        with self._lock:
+            if key in self._index:
+                try:
+                    with open(self._path(key), mode='rb') as f:
+                        value = f.read()
+                    self._index.move_to_end(key)
+                    os.utime(self._path(key))
+                except FileNotFoundError:
+                    self.current_bytes -= self._index.pop(key)
+
+        metrics.CACHE_REQUESTS.labels(self.name, 'hit' if value is not None else 'miss').inc()
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        # write to temp file then rename, readers never see partial file.
+        tmp_path = f'{self._path(key)}.{threading.get_ident()}.tmp'
+        with open(tmp_path, mode='wb') as f:
+            f.write(value)
+
+        with self._lock:
+            os.replace(tmp_path, self._path(key))
+            self.current_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.current_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self.current_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logger.debug(f'{self.name}: evicted {key} ({size} bytes)')
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class TieredCache:
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> bytes | None:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)     # promote
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+
+class TTLValue:
+    # memoize a single slow value (ex. a database version query) for ttl seconds.
+
+    def __init__(self, func, ttl: float):
+        self.func = func
+        self.ttl = ttl
+        self._value = None
+        self._expire = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, *args, **kwargs):
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._expire:
+                self._value = self.func(*args, **kwargs)
+                self._expire = now + self.ttl
+            return self._value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._value = None
+            self._expire = 0.0
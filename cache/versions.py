@@ -0,0 +1,19 @@
+# versions of inputs that live outside the request: dimension tables.
+import sqlalchemy as database
+
+import db.repository_stg as repo
+from cache.store import TTLValue
+
+DIM_VERSION_TTL = 60            # seconds, dimension tables are edited by administrator only.
+
+_dim_versions = TTLValue(repo.get_dim_versions, DIM_VERSION_TTL)
+
+
+def dim_versions(conn: database.engine) -> dict:
+    # {table_name: version}, see repo.get_dim_versions.
+    return _dim_versions.get(conn)
+
+
+def refresh_dim_versions() -> None:
+    # forget the memoized versions, the next dim_versions reads them again (ex. after the tables were reloaded).
+    _dim_versions.clear()
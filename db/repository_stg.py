@@ -1,4 +1,5 @@
-from sqlalchemy import engine, create_engine, MetaData, select, Column, Integer, String, Table
+from sqlalchemy import engine, create_engine, MetaData, select, func, Column, Integer, String, Table
+import hashlib
 import pandas as pd
 from db.model_stg import *
 from sqlalchemy.orm import sessionmaker
@@ -74,6 +75,48 @@ def get_strategy_weight(conn: engine, strategy_id: str) -> dict:
     return pd.read_sql_query(s, conn).to_dict(orient='records')
 
 
+def get_strategy_weights(conn: engine) -> pd.DataFrame:
+    # all strategies: strategy_id, strategy_text, aspect_ux, aspect_mfg, aspect_ppl, aspect_tech
+    s = select(
+        [dim_strategy_weight.c.strategy_id,
+         dim_strategy_weight.c.strategy_text,
+         dim_strategy_weight.c.aspect_ux,
+         dim_strategy_weight.c.aspect_mfg,
+         dim_strategy_weight.c.aspect_ppl,
+         dim_strategy_weight.c.aspect_tech]).order_by(dim_strategy_weight.c.strategy_id)
+    return pd.read_sql_query(s, conn)
+
+
+def get_dim_versions(conn: engine) -> dict:
+    # {table_name: "row_count|max(updated_date)"}, changes whenever administrator edits a dimension table.
+    # tables without updated_date (dim_sq_relation_score, dim_industries_cases): "row_count|digest of the ordered rows",
+    # a count or sum would miss a row re-pointed to another solution / question / case.
+    # used as part of result / stage cache keys.
+    tables = (dim_qualitative_question, dim_quantative_index, dim_solution, dim_company, dim_industry, dim_case,
+              dim_industries_cases, dim_strategy_weight, dim_sq_relation_score, dim_sf_relation_score, dim_financial_trend_index)
+
+    versions: dict = {}
+    with conn.connect() as connection:
+        for table in tables:
+            if 'updated_date' in table.c:
+                s = select([func.count(), func.max(table.c.updated_date)]).select_from(table)
+                versions[table.name] = '|'.join(str(value) for value in connection.execute(s).one())
+            else:
+                versions[table.name] = table_digest(connection, table)
+    return versions
+
+
+def table_digest(connection, table: Table) -> str:
+    # "row_count|hash of every row", rows ordered by all columns (the relation tables have no primary key).
+    h = hashlib.blake2b(digest_size=20)
+    count = 0
+    for row in connection.execute(select(table).order_by(*table.c)):
+        h.update(repr(tuple(row)).encode('utf-8'))
+        h.update(b'\n')
+        count += 1
+    return f'{count}|{h.hexdigest()}'
+
+
 # reporting services-----------------------------
 
     # database
@@ -84,18 +127,27 @@ def get_dim_case(conn: engine) -> pd.DataFrame:
 
 def get_industries_cases(conn: engine, industry_l_id: str) -> pd.DataFrame:
     # many to many, join industries - industries_cases - cases
+    # case metadata only, images are read by case_id (get_case_images), a case shared by several industries
+    # would otherwise carry its image once per industry row.
     s = (
         select(
             [dim_industry.c.industry_id, dim_industry.c.industry_l_text, dim_industry.c.industry_m_text, 
             dim_industry.c.industry_description, dim_industry.c.industry_transformation_keypoint, dim_industry.c.industry_transformation_advice,
-            dim_case.c.case_id, dim_case.c.case_text, dim_case.c.case_description, dim_case.c.case_img_blob, dim_case.c.case_link1,dim_case.c.case_source]
+            dim_case.c.case_id, dim_case.c.case_text, dim_case.c.case_description, dim_case.c.case_link1,dim_case.c.case_source]
          )
         .filter(dim_industry.c.industry_l_id == industry_l_id)
         .join(dim_industries_cases, dim_industry.c.industry_id == dim_industries_cases.c.industry_id)
         .join(dim_case, dim_industries_cases.c.case_id == dim_case.c.case_id)
     )
 
-    return pd.read_sql_query(s, conn) #.drop(columns=['case_img_blob'])
+    return pd.read_sql_query(s, conn)
+
+
+def get_case_images(conn: engine, case_ids: list) -> dict:
+    # {case_id: image bytes (None when not uploaded)}
+    s = select([dim_case.c.case_id, dim_case.c.case_img_blob]).filter(dim_case.c.case_id.in_(list(case_ids)))
+    with conn.connect() as connection:
+        return {case_id: bytes(blob) if blob is not None else None for case_id, blob in connection.execute(s)}
 
 
 def get_company_data(conn: engine, company_id: str) -> dict:
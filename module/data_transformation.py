@@ -108,13 +108,13 @@ def summarized_form_data(df_form_data: pd.DataFrame, df_form_weight: pd.DataFram
     #   form_weight: '問卷', '權重'
     # output: 
     #   question_id, attribute, value(summarized)
-    df_form_data['value'] = df_form_data['value'].apply(pd.to_numeric, errors='coerce')
-    df_form_data['weight_key'] = df_form_data['job_title'] + "_" + df_form_data['interviewee']
+    df_form_data['value'] = pd.to_numeric(df_form_data['value'], errors='coerce')
+    df_form_data['weight_key'] = df_form_data['job_title'].astype(str) + "_" + df_form_data['interviewee'].astype(str)
     
     df = df_form_data.merge(df_form_weight, left_on='weight_key', right_on='問卷', how='left')
     df['value'] = df['value'] * df['權重']
 
-    return df.groupby(['question_id', 'attribute'])['value'].sum().reset_index()
+    return df.groupby(['question_id', 'attribute'], observed=True)['value'].sum().reset_index()
 
 
 def solution_filter(df_solution_filter: pd.DataFrame) -> pd.DataFrame:
@@ -273,54 +273,66 @@ def fin_competitor_plot_data(competitor_data: pd.DataFrame, competitor_name: lis
     #reorder the list
     return sorted(chart_data_list, key=lambda x: FIN_INDICATOR_INDEX[x['df_name_ch']]) 
 
-def top_5_module_by_interviewee(df_qualitative_result_question: pd.DataFrame, df_interviewee: pd.DataFrame, aspect: str) -> pd.DataFrame | dict:
-    # choose top 5 modules
-    top_5_modules = df_qualitative_result_question[df_qualitative_result_question['aspect'] == aspect].reset_index(drop=True)
-    top_5_modules = top_5_modules.groupby(['module']).mean(numeric_only=True).reset_index()
-    top_5_modules = list(top_5_modules.nlargest(5, ['gap', 'ql_score']).astype(str)["module"])
+ATTRIBUTE_MAP: dict = {"[現況]": "actual", "[目標]": "target"}
+
+def interviewee_gap_by_aspect(df_qualitative_result_question: pd.DataFrame, df_interviewee: pd.DataFrame, aspects: list) -> dict:
+    # 受訪者差異分析, all aspects in one grouped pass.
+    # input:
+    #   df_qualitative_result_question: question_id, aspect, module, gap, ql_score, question
+    #   df_interviewee: weight_key, question_id, attribute([現況]/[目標]), value, aspect, module, question
+    # output: {aspect: (pic_rows, text_rows)}
+    #   pic_rows: module, weight_key, gap(受訪者模組平均落差), question(模組前三大落差題目), diff(受訪者間落差最大值 - 最小值)
+    #   text_rows: {idx: {index, question, diff}}, one row per module
+    
+    # top 5 modules of each aspect by mean gap, ql_score
+    top_5_modules = (df_qualitative_result_question[df_qualitative_result_question['aspect'].isin(aspects)]
+        .groupby(['aspect', 'module'])[['gap', 'ql_score']].mean()
+        .sort_values(['gap', 'ql_score'], ascending=False, kind='stable')
+        .groupby(level='aspect').head(5))
     
-    print(top_5_modules)
+    # pair actual / target of each interviewee answer by key (not by row order), gap = target - actual.
+    # aspect / module / question only depend on question_id, joined back from the (small) question table.
+    df = df_interviewee[df_interviewee['aspect'].isin(aspects)]
+    questions = df.drop_duplicates('question_id').set_index('question_id')[['aspect', 'module', 'question']]
+    df_gap = (df.assign(attribute=df['attribute'].map(ATTRIBUTE_MAP), value=pd.to_numeric(df['value'], errors='coerce'))
+        .groupby(['weight_key', 'question_id', 'attribute'], observed=True)['value'].first()
+        .unstack('attribute'))
+    df_gap = (df_gap['target'] - df_gap['actual']).rename('gap').dropna().reset_index()
+    df_gap[['aspect', 'module', 'question']] = questions.reindex(df_gap['question_id']).to_numpy()
     
-    # filter aspect
-    df_interviewee = df_interviewee[df_interviewee['aspect'] == aspect].reset_index(drop=True)
-    df_interviewee.drop('attribute', axis=1, inplace=True)
-    # calculate the gap and choose top t5
-    df_temp = df_interviewee['value']
-    # subtract even rows from odd rows to receive gap and group module
-    df_temp = df_temp[1::2].reset_index(drop=True) - df_temp.iloc[::2].reset_index(drop=True)
-    df_interviewee = df_interviewee.iloc[::2].reset_index(drop=True)
-    df_interviewee['gap'] = df_temp
-    df_interviewee.drop('value', axis=1, inplace=True)
+    # choose the question which is top 3 gap of each module
+    module_questions = (df_gap.sort_values('gap', ascending=False, kind='stable')
+        .groupby(['aspect', 'module']).head(3)
+        .groupby(['aspect', 'module'])['question'].agg(lambda x: '\n'.join(x.unique())))
     
-    # choose the question which is top 3 of each module
-    module_questions = df_interviewee.groupby('module').apply(lambda x: x.nlargest(3, 'gap')).reset_index(drop=True)[['module', 'question']]
-    module_questions = module_questions.groupby('module')['question'].apply(lambda x: '\n'.join(set(x))).reset_index()
-    # module_questions = df_interviewee.groupby('module')['question'].apply(lambda x: '\n'.join(set(x))).reset_index()
-    # calculate the mean group by module and weight_key
-    df_interviewee: pd.DataFrame = df_interviewee.groupby(['module',"weight_key"]).mean(numeric_only=True).reset_index()
-    # apply function to each group and save result in new column "diff"
-    # define aggregation function to calculate max minus min
-    aggs = {
-        'gap': lambda x: x.max() - x.min()
-    }
-    # group by "module", and apply aggregation functions
-    grouped_diff = df_interviewee.groupby(['module']).agg(aggs).reset_index()
-    # rename column to "diff"
-    grouped_diff = grouped_diff.rename(columns={'gap': 'diff'})
-    grouped_diff['diff'] = round( grouped_diff['diff'] , 2)
-    df_interviewee['gap'] = round( df_interviewee['gap'] , 2)
-    # joining question
-    df_interviewee: pd.DataFrame = pd.merge(df_interviewee, module_questions, on=['module'], how='left')
-    df_interviewee: pd.DataFrame = pd.merge(df_interviewee, grouped_diff, on=['module'], how='left')
+    # mean gap by module and interviewee, diff = max - min between interviewees
+    df_module_gap = df_gap.groupby(['aspect', 'module', 'weight_key'])['gap'].mean()
+    grouped = df_module_gap.groupby(level=['aspect', 'module'])
+    grouped_diff = (grouped.max() - grouped.min()).round(2).rename('diff')
     
-    # mapping the top 5 modules
-    df_interviewee = df_interviewee[df_interviewee['module'].isin(top_5_modules)]
+    df_result = (df_module_gap.round(2).reset_index()
+        .join(module_questions, on=['aspect', 'module'])
+        .join(grouped_diff, on=['aspect', 'module']))
     
-    # extract the question and diff for text fill
-    df_text_diff = df_interviewee[["question","diff"]]
-    df_text_diff = df_text_diff.drop_duplicates()
-    df_text_diff = df_text_diff.reset_index().to_dict(orient='index') 
+    results: dict = {}
+    for aspect, df_aspect in df_result.groupby('aspect', sort=False):
+        df_aspect = df_aspect.drop(columns='aspect').reset_index(drop=True)
+        
+        # mapping the top 5 modules
+        modules = top_5_modules.loc[aspect].index if aspect in top_5_modules.index else []
+        df_aspect = df_aspect[df_aspect['module'].isin(modules)]
+        
+        # extract the question and diff for text fill
+        df_text_diff = df_aspect[["question", "diff"]].drop_duplicates().reset_index().to_dict(orient='index')
+        results[aspect] = (df_aspect, df_text_diff)
     
-    print(df_interviewee)
+    # aspect without any answer: empty slide data
+    for aspect in aspects:
+        results.setdefault(aspect, (df_result.drop(columns='aspect').iloc[0:0], {}))
+    
+    logger.debug(df_result)
+    return results
+
 
-    return df_interviewee , df_text_diff 
+def top_5_module_by_interviewee(df_qualitative_result_question: pd.DataFrame, df_interviewee: pd.DataFrame, aspect: str) -> pd.DataFrame | dict:
+    return interviewee_gap_by_aspect(df_qualitative_result_question, df_interviewee, [aspect])[aspect] 
@@ -0,0 +1,98 @@
+# run independent pipeline steps concurrently.
+#   CPU_EXECUTOR: model branches / report preparation (pandas & numpy release the GIL for most heavy work).
+#   IO_EXECUTOR: database reads, only ever called from CPU tasks or request threads and never submits
+#                further work, so nested waits can't deadlock a pool.
+# request context (request id, span parent) is copied into worker threads, so logs and spans stay correlated.
+# TaskGraph runs a dependency graph of tasks from the calling thread; tasks themselves must not wait on the same pool.
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from monitor.trace import span
+import monitor.profiler as profiler
+
+logger = logging.getLogger(__name__)
+
+CPU_WORKERS = 4
+IO_WORKERS = 16
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='model')
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='db')
+
+
+def _run_task(name: str, func, args: tuple):
+    with span(name), profiler.attach():
+        return func(*args)
+
+
+def submit(executor: ThreadPoolExecutor, name: str, func, *args):
+    # submit with a copy of the caller's context (request id, current span).
+    context = contextvars.copy_context()
+    return executor.submit(context.run, _run_task, name, func, args)
+
+
+def run_parallel(tasks: dict, executor: ThreadPoolExecutor = CPU_EXECUTOR) -> dict:
+    # tasks: {span_name: func} or {span_name: (func, arg1, arg2, ...)}
+    # returns {span_name: result}. the first failing task's exception is re-raised, pending tasks are cancelled.
+    futures = {}
+    for name, task in tasks.items():
+        func, *args = task if isinstance(task, tuple) else (task,)
+        futures[name] = submit(executor, name, func, *args)
+
+    done, not_done = wait(futures.values(), return_when=FIRST_EXCEPTION)
+
+    for name, future in futures.items():
+        if future in done and future.exception() is not None:
+            for pending in not_done:
+                pending.cancel()
+            logger.error(f'{name} failed, cancelling {len(not_done)} unfinished task(s).')
+            raise future.exception()
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+class TaskGraph:
+    # small dependency graph runner.
+    #   graph = TaskGraph()
+    #   graph.add('company', lambda: repo.get_company_data(conn, company_id), io=True)
+    #   graph.add('strategy', lambda company: ..., 'company')     # receives results of its dependencies, in order
+    #   results = graph.run()
+    # a task is submitted as soon as all of its dependencies are done. the first failure is re-raised.
+
+    def __init__(self, executor: ThreadPoolExecutor = CPU_EXECUTOR, io_executor: ThreadPoolExecutor = IO_EXECUTOR):
+        self.executor = executor
+        self.io_executor = io_executor
+        self._tasks: dict[str, tuple] = {}
+
+    def add(self, name: str, func, *deps: str, io: bool = False) -> str:
+        for dep in deps:
+            if dep not in self._tasks:
+                raise ValueError(f'task {name}: unknown dependency {dep}, add dependencies first.')
+        self._tasks[name] = (func, deps, self.io_executor if io else self.executor)
+        return name
+
+    def run(self) -> dict:
+        results: dict = {}
+        running: dict = {}      # future -> name
+        waiting: dict = dict(self._tasks)
+
+        def submit_ready():
+            for name, (func, deps, pool) in list(waiting.items()):
+                if all(dep in results for dep in deps):
+                    running[submit(pool, name, func, *(results[dep] for dep in deps))] = name
+                    del waiting[name]
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_EXCEPTION)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    for pending in running:
+                        pending.cancel()
+                    logger.error(f'{name} failed, cancelling {len(running)} unfinished task(s).')
+                    raise future.exception()
+                results[name] = future.result()
+            submit_ready()
+
+        return results
@@ -0,0 +1,138 @@
+# shared key dictionary for the scoring joins.
+# string ids (question_id, solution_id, fin_indicator_id, aspect) are stored as pandas categoricals sharing
+# one CategoricalDtype per key column, so merges / groupbys between dimension tables and calculated frames
+# run on integer codes instead of hashing strings. labels are decoded back to str at the model output.
+#
+# categories only ever grow (new ids appended), so a code keeps its meaning for the life of the process
+# and can be used directly as a row / column index (module/scoring.py relation matrices).
+# only dimension tables read from the database (load) add categories. request frames are encoded against the
+# existing ones, ids a client sends that no dimension table knows become missing (code -1) and are logged.
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+from cache.fingerprint import hash_values
+from cache.versions import dim_versions
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMNS: tuple = ('question_id', 'solution_id', 'fin_indicator_id', 'aspect')
+
+_dtypes: dict[str, CategoricalDtype] = {}
+_tables: dict[str, pd.DataFrame] = {}       # encoded dimension tables, latest version of each
+_row_index: dict[tuple, tuple] = {}         # (table, column) -> (version, row order, code bounds)
+_lock = threading.Lock()
+
+NO_CATEGORIES = CategoricalDtype(pd.Index([], dtype=object))
+
+
+def dtype(column: str) -> CategoricalDtype:
+    # current dtype of a key column, no categories before a dimension table with the column was loaded.
+    current = _dtypes.get(column)
+    return current if current is not None else NO_CATEGORIES
+
+
+def extend(column: str, values) -> CategoricalDtype:
+    # dtype of a key column extended with any unseen (str) values, dimension tables only.
+    new = pd.Index(values, dtype=object)
+    current = _dtypes.get(column)
+    if current is not None and new.isin(current.categories).all():
+        return current
+
+    with _lock:
+        current = _dtypes.get(column)
+        known = current.categories if current is not None else pd.Index([], dtype=object)
+        categories = known.append(new[~new.isin(known)].unique())
+        if current is None or len(categories) != len(known):
+            _dtypes[column] = CategoricalDtype(categories)
+        return _dtypes[column]
+
+
+def log_unknown(column: str, unknown) -> None:
+    if len(unknown):
+        logger.warning(f'{column}: {len(unknown)} id(s) not in the dimension tables, ignored: {list(unknown[:10])}')
+
+
+def encode(df: pd.DataFrame, extend_keys: bool = False) -> pd.DataFrame:
+    # key columns -> shared categorical (in place, returns df for chaining).
+    # already encoded columns are only re-pointed to the latest categories (codes are append only, cheap).
+    # extend_keys: df is a dimension table, its ids become categories. otherwise unknown ids -> missing.
+    for column in KEY_COLUMNS:
+        if column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, CategoricalDtype):
+                categories, current = values.cat.categories, _dtypes.get(column)
+                if current is not None and categories is current.categories:
+                    continue
+                if current is not None and categories.equals(current.categories[:len(categories)]):
+                    target = current    # encoded against an earlier version, codes still valid.
+                else:
+                    target = extend(column, categories.astype(str)) if extend_keys else dtype(column)
+                if target.categories[:len(categories)].equals(categories):
+                    df[column] = pd.Categorical.from_codes(values.cat.codes, dtype=target)
+                else:
+                    log_unknown(column, categories[~categories.isin(target.categories)])
+                    df[column] = values.cat.set_categories(target.categories)
+            else:
+                # factorize once, then translate the (few) unique labels to shared codes.
+                row_codes, uniques = pd.factorize(values)
+                uniques = pd.Index(uniques, dtype=object).astype(str)
+                target = extend(column, uniques) if extend_keys else dtype(column)
+                shared = target.categories.get_indexer(uniques)
+                log_unknown(column, uniques[shared < 0])
+                df[column] = pd.Categorical.from_codes(np.where(row_codes >= 0, shared[row_codes], -1), dtype=target)
+    return df
+
+
+def align(*frames: pd.DataFrame, extend_keys: bool = False) -> None:
+    # encode several frames against the same (latest) categories before joining them.
+    for df in frames:
+        encode(df, extend_keys)
+
+
+def decode(df: pd.DataFrame) -> pd.DataFrame:
+    # key columns -> str labels (object dtype), for reports / output tables.
+    for column in KEY_COLUMNS:
+        if column in df.columns and isinstance(df[column].dtype, CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
+
+
+def codes(df: pd.DataFrame, column: str):
+    # integer codes of an encoded key column (-1 for missing).
+    return df[column].cat.codes.to_numpy()
+
+
+def load(func, conn, *args, copy: bool = True) -> pd.DataFrame:
+    # read a dimension table with its keys encoded, ex. keys.load(repo.get_dim_sq_relation, conn)
+    # read + encode once per dimension table version, callers get their own copy (they add columns in place).
+    # copy=False: shared frame for read only use, df.attrs['version'] identifies the table version.
+    version = hash_values(func.__module__, func.__name__, list(args), dim_versions(conn))
+    df = _tables.get(func.__name__)
+    if df is None or df.attrs.get('version') != version:
+        df = encode(func(conn, *args), extend_keys=True)
+        df.attrs['version'] = version
+        _tables[func.__name__] = df
+    return df.copy() if copy else df
+
+
+def take(func, conn, column: str, key_codes) -> pd.DataFrame:
+    # rows of a dimension table whose <column> is one of key_codes (in key_codes order), ex. the top 10 solutions.
+    # looked up through a per version row index, so the cost depends on the rows taken, not the table size.
+    df = load(func, conn, copy=False)
+    index = _row_index.get((func.__name__, column))
+    if index is None or index[0] != df.attrs.get('version'):
+        row_codes = codes(df, column)
+        order = np.argsort(row_codes, kind='stable')
+        bounds = np.searchsorted(row_codes[order], np.arange(row_codes.max(initial=-1) + 2))
+        index = (df.attrs.get('version'), order, bounds)
+        _row_index[(func.__name__, column)] = index
+
+    _, order, bounds = index
+    key_codes = np.asarray(key_codes)
+    key_codes = key_codes[(key_codes >= 0) & (key_codes < len(bounds) - 1)]
+    positions = [order[bounds[code]:bounds[code + 1]] for code in key_codes]
+    return df.iloc[np.concatenate(positions) if positions else []].copy()
@@ -1,10 +1,16 @@
 # data manipulation
 import sqlalchemy as database
 import pandas as pd
+from functools import partial
 
 # model
 from module.formula_check import formula_check, CheckResult
 import module.data_transformation as transform
+import module.pipeline as pipeline
+import module.executor as executor
+import module.keys as keys
+import module.scoring as scoring
+from cache.versions import dim_versions
 
 # db model
 from db.model_stg import *
@@ -12,6 +18,8 @@ import db.repository_stg as repo
 
 import logging
 logger = logging.getLogger(__name__)
+from monitor.log import Lazy
+from monitor.trace import span
 
 # 常數
 STRATEGY_FUNCTION_MAP = {
@@ -37,6 +45,9 @@ SF_RELATION_IMPACT_ICON_MAP = {
     3: '■'
 }
 
+# ROI = 權重後趨勢落差現金流 * ROI_CASHFLOW_SHARE / 平均成本價格
+ROI_CASHFLOW_SHARE = 0.1
+
 
 STRAT_DICT_KEY = 'STRAT.'
 
@@ -158,10 +169,14 @@ def run_quantitative_analysis(conn: database.engine, df_financial_data: pd.DataF
 
     df_year_data: pd.DataFrame; formulas: dict; sensitivity_performance_select_methods: dict; variables: dict
 
-    # 財務指標主檔, 解決方案對財務指標相依性分數, 財務指標趨勢判定主檔
-    dim_fin_indicator: pd.DataFrame = repo.get_dim_quantative_index(conn)
-    dim_sf_relation_score: pd.DataFrame = repo.get_dim_sf_relation_score(conn)
-    dim_financial_trend_index: pd.DataFrame = repo.get_dim_financial_trend_index(conn)
+    # 財務指標主檔, 財務指標趨勢判定主檔 (parallel read)
+    dims: dict = executor.run_parallel({
+        'db.dim_quantative_index': (keys.load, repo.get_dim_quantative_index, conn),
+        'db.dim_financial_trend_index': (keys.load, repo.get_dim_financial_trend_index, conn),
+    }, executor.IO_EXECUTOR)
+    dim_fin_indicator: pd.DataFrame = dims['db.dim_quantative_index']
+    dim_financial_trend_index: pd.DataFrame = dims['db.dim_financial_trend_index']
+    keys.align(dim_fin_indicator, dim_financial_trend_index)    # same key categories on every table, joins below run on codes.
 
     df_year_data, formulas, sensitivity_performance_select_methods, variables = transform.quantitative_data_cleansing(df_financial_data, dim_fin_indicator)
     
@@ -187,36 +202,34 @@ def run_quantitative_analysis(conn: database.engine, df_financial_data: pd.DataF
     # print('財務指標趨勢落差現金流') print(df_performance_gap_impact_cashflow) print('CAGR calculation') print(df_CAGR)
     #df_trend.to_csv('fin-indicator-CAGR-trend-result.csv', header=True, encoding="utf-8", index=False)
 
-    # 計算量化分數
-    #   解決方案對財務指標相依性分數 left join 財務指標趨勢分析gap
-    #   量化分數 = 量化相依性分數 * 趨勢分數
-    #   計算解決方案得分
+    keys.encode(df_trend)
 
-    df_sf_score = dim_sf_relation_score.merge(df_trend, on='fin_indicator_id', how='left')
-    df_sf_score['sf_score'] = df_sf_score.correlation_score * df_sf_score.trend_score
-    df_sf_score = df_sf_score.groupby(['solution_id'])['sf_score'].sum()
-    
-    return df_sf_score.reset_index(), df_year_data, df_trend
+    # 量化分數 (量化相依性分數 * 趨勢分數) is computed at ranking time for the included solutions only, see scoring.rank.
+    return df_year_data, df_trend
 
 
 def run_qualitative_analysis(conn: database.engine, df_summarized_form_data: pd.DataFrame, df_company_data: pd.DataFrame) -> pd.DataFrame:
     
-    # data read
-    dim_sq_relation: pd.DataFrame = repo.get_dim_sq_relation(conn)
-    dim_question: pd.DataFrame = repo.get_dim_qualitative_question(conn)
-
     # 讀取策略重點: {"strategy_id": "STRAT-1", "aspect_ux": "0.25", ...}
     strategy_id: str = df_company_data.loc[df_company_data['id']=="STRAT" , "value"].iloc[0].split(".")[0]
-    strategy_weight: dict = repo.get_strategy_weight(conn, strategy_id.strip())[0] 
+
+    # data read (parallel)
+    dims: dict = executor.run_parallel({
+        'db.dim_qualitative_question': (keys.load, repo.get_dim_qualitative_question, conn),
+        'db.dim_strategy_weight': (repo.get_strategy_weight, conn, strategy_id.strip()),
+    }, executor.IO_EXECUTOR)
+    dim_question: pd.DataFrame = dims['db.dim_qualitative_question']
+    strategy_weight: dict = dims['db.dim_strategy_weight'][0]
     
     # 讀取題庫 - 質化題目
     #   map english aspect_id with chinese aspect, using dict STRATEGY_FUNCTION_MAP.
     #   map weight with aspect_id, using dict strategy_weight.
-    dim_question['aspect_id'] = dim_question['aspect'].map(STRATEGY_FUNCTION_MAP) 
+    dim_question['aspect_id'] = dim_question['aspect'].map(STRATEGY_FUNCTION_MAP).astype(object) 
     dim_question['weight'] = dim_question['aspect_id'].map(strategy_weight)
     
     # data cleasing
     #   metadata(aspect_weight) left join raw data(value).
+    keys.align(dim_question, df_summarized_form_data)
     df_calculate = dim_question.merge(df_summarized_form_data, on='question_id', how='left')
     df_calculate['attribute'] = df_calculate['attribute'].map({"[現況]": "actual", "[目標]": "target"})
     
@@ -228,37 +241,34 @@ def run_qualitative_analysis(conn: database.engine, df_summarized_form_data: pd.
         # calculate weighted qualitative score, using weight(metadata), target and actual.
     df_calculate.loc[(df_calculate.attribute == 'actual'), 'actual'] = pd.to_numeric(df_calculate.value)
     df_calculate.loc[(df_calculate.attribute == 'target'), 'target'] = pd.to_numeric(df_calculate.value)
-    df_calculate = df_calculate.groupby(["question_id", "aspect", "module", "weight"])[['actual', 'target']].sum().reset_index()
+    df_calculate = df_calculate.groupby(["question_id", "aspect", "module", "weight"], observed=True)[['actual', 'target']].sum().reset_index()
     
     logger.debug(df_calculate)
 
     df_calculate['gap'] = df_calculate.target - df_calculate.actual
     df_calculate['ql_score'] = df_calculate.weight * df_calculate.gap
+    # question_id order (groupby on the codes orders by category): gap rankings (nlargest) break ties by row order.
+    df_calculate = df_calculate.sort_values('question_id', key=lambda ids: ids.astype(str), ignore_index=True)
     
     logger.debug(df_calculate)
     #df_calculate.to_csv('qualitative-question-result.csv', header=True, encoding="utf-8", index=False)
 
-    # 計算質化分數
-        # metadata(correlation_score) left join df_calculate(ql_score)
-        # 質化分數 = 權重分數 * 相依性分數
-        # 計算解決方案得分
-    df_sq_score = dim_sq_relation.merge(df_calculate, on='question_id', how='left')
-    df_sq_score['sq_score'] = df_sq_score.ql_score * df_sq_score.correlation_score
-    logger.debug(df_sq_score)
-    df_sq_score = df_sq_score.groupby(['solution_id'])['sq_score'].sum()
+    keys.encode(df_calculate)
 
-    logger.debug(df_sq_score)
-    
-    return df_sq_score.reset_index(), df_calculate
+    # 質化分數 (權重分數 * 相依性分數) is computed at ranking time for the included solutions only, see scoring.rank.
+    return df_calculate
 
 
 def calculate_solution_roi(conn: database.engine, df_result: pd.DataFrame, df_trend: pd.DataFrame) -> pd.DataFrame:
     # goal
     # 1. 生成"improved_KPI": 在報告中，每一個 solution 會有自己的 solution description 頁面，說明此 solution 能夠提升的財務指標。
     # 2. 計算 solution ROI.
-    df_dim_sf_relation: pd.DataFrame = repo.get_dim_sf_relation_score(conn)
-    df_dim_quantative_index: pd.DataFrame = repo.get_dim_quantative_index(conn)
-    df_dim_solution: pd.DataFrame = repo.get_dim_solution(conn)
+    # only the relation / solution rows of the ranked solutions (top 10) take part in the joins below.
+    solutions = keys.codes(keys.encode(df_result), 'solution_id')
+    df_dim_sf_relation: pd.DataFrame = keys.take(repo.get_dim_sf_relation_score, conn, 'solution_id', solutions)
+    df_dim_quantative_index: pd.DataFrame = keys.load(repo.get_dim_quantative_index, conn)
+    df_dim_solution: pd.DataFrame = keys.take(repo.get_dim_solution, conn, 'solution_id', solutions)
+    keys.align(df_dim_sf_relation, df_dim_quantative_index, df_dim_solution, df_result, df_trend)
     
     # column: solution_id  correlation_score(sf_score) sf_score fin_indicator_text
     # 1. for each solution-fin_indicator，為 sf_score 對應其 impact_icon.
@@ -277,10 +287,10 @@ def calculate_solution_roi(conn: database.engine, df_result: pd.DataFrame, df_tr
     df_impact['display_text'] = df_impact.financial_impact_icon + " " + df_impact.fin_indicator_text_ch
 
     # 3.
-    for solution_id, df in df_impact.groupby('solution_id'):
+    for solution_id, df in df_impact.groupby('solution_id', observed=True):
         df_impact.loc[(df_impact.solution_id == solution_id), 'result_text'] = '\n'.join(list(df['display_text']))
     
-    logger.debug(df_impact.to_string())
+    logger.debug('%s', Lazy(df_impact.to_string))
 
 
     # 1. for each solution-fin_indicator, 為 sf_score 對應其 impact weight, 並 left join df_trend 後計算權重後趨勢落差現金流.
@@ -292,57 +302,75 @@ def calculate_solution_roi(conn: database.engine, df_result: pd.DataFrame, df_tr
     df_impact = df_impact.merge(df_trend[['fin_indicator_id', 'performance_gap_impact_cashflow']], on='fin_indicator_id' , how='left')
     df_impact['weighted_performance_gap_impact_cashflow'] = df_impact.financial_impact_weight * df_impact.performance_gap_impact_cashflow
 
-    log_df("ROI 計算 (1)", df_impact.to_string())
+    log_df("ROI 計算 (1)", Lazy(df_impact.to_string))
 
     # 2
     df_impact = (df_impact.
-                 groupby(['solution_id', 'sq_score', 'sf_score', 'final_score', 'result_text'])[['weighted_performance_gap_impact_cashflow']]
+                 groupby(['solution_id', 'sq_score', 'sf_score', 'final_score', 'result_text'], observed=True)[['weighted_performance_gap_impact_cashflow']]
                  .sum().reset_index())
     
-    log_df("ROI 計算 (2) - 加總", df_impact.to_string())
+    log_df("ROI 計算 (2) - 加總", Lazy(df_impact.to_string))
 
     # 3
     df_solution = df_impact.merge(df_dim_solution, on='solution_id', how='left')
-    df_solution['ROI'] = ( df_solution.weighted_performance_gap_impact_cashflow * 0.1) / df_solution.average_price
+    df_solution['ROI'] = ( df_solution.weighted_performance_gap_impact_cashflow * ROI_CASHFLOW_SHARE) / df_solution.average_price
 
     return df_solution.sort_values('final_score', ascending=False)
 
 
-def apply_model(conn: database.engine, input_tables: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
-    
+def run_analysis(conn: database.engine, input_tables: dict[str, pd.DataFrame]) -> tuple:
+    # preprocess + qualitative / quantitative branches, shared by apply_model and sweep_strategy_weights.
+    # returns df_solution_filter, df_qualitative_result, df_year_data, df_trend
+
     # 資料前處理
-    df_summarized_form_data: pd.DataFrame = transform.summarized_form_data(input_tables['df_form_data'], input_tables['df_form_weight'])
-    df_company_data: pd.DataFrame = input_tables['df_company_data']
-    df_financial_data: pd.DataFrame = input_tables['df_financial_data']
-    df_solution_filter: pd.DataFrame = transform.solution_filter(input_tables['df_solution_filter'])
+    with span('model.preprocess'):
+        df_summarized_form_data: pd.DataFrame = transform.summarized_form_data(input_tables['df_form_data'], input_tables['df_form_weight'])
+        df_company_data: pd.DataFrame = input_tables['df_company_data']
+        df_financial_data: pd.DataFrame = input_tables['df_financial_data']
+        df_solution_filter: pd.DataFrame = transform.solution_filter(input_tables['df_solution_filter'])     # keys encoded at ranking (scoring.included)
 
 
     # 解決方案推薦
-    df_sq_score: pd.DataFrame; df_qualitative_result: pd.DataFrame
-    df_sf_score: pd.DataFrame; df_year_data: pd.DataFrame; df_trend: pd.DataFrame
-    df_sq_score, df_qualitative_result  = run_qualitative_analysis(conn, df_summarized_form_data, df_company_data)
-    df_sf_score, df_year_data, df_trend = run_quantitative_analysis(conn, df_financial_data)
+    #   each branch is memoized on its own inputs + dimension table versions,
+    #   ex. only changing interviewee weights reruns the qualitative branch but not the quantitative one.
+    #   the two branches are independent until merged on solution_id, run them concurrently.
+    versions: dict = dim_versions(conn)
+    df_qualitative_result: pd.DataFrame; df_year_data: pd.DataFrame; df_trend: pd.DataFrame
+    branches: dict = executor.run_parallel({
+        'model.qualitative': partial(pipeline.run_stage, 'model.qualitative', run_qualitative_analysis, conn, df_summarized_form_data, df_company_data, deps=versions),
+        'model.quantitative': partial(pipeline.run_stage, 'model.quantitative', run_quantitative_analysis, conn, df_financial_data, deps=versions),
+    })
+    df_qualitative_result = branches['model.qualitative']
+    df_year_data, df_trend = branches['model.quantitative']
+
+    return df_solution_filter, df_qualitative_result, df_year_data, df_trend
+
+
+def apply_model(conn: database.engine, input_tables: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
 
+    df_solution_filter, df_qualitative_result, df_year_data, df_trend = run_analysis(conn, input_tables)
 
-    # 計算綜合分數
-    # 根據使用者設定，篩選 solution
+    # 根據使用者設定，篩選 solution (納入評估)
+    # 計算綜合分數: 只計算納入評估的 solution
     # 取排名前10
-    df_result = df_sq_score.merge(df_sf_score, on='solution_id', how='outer').fillna(0)
-    df_result['final_score'] = df_result.sq_score + df_result.sf_score
-    df_result = df_solution_filter.merge(df_result, on='solution_id', how='left')
-    df_result = df_result.nlargest(10, 'final_score')
+    with span('model.rank'):
+        df_result = scoring.rank(df_solution_filter, df_qualitative_result, df_trend,
+                                 scoring.sq_matrix(conn), scoring.sf_matrix(conn), k=10)
 
 
     # 計算解決方案 ROI
     log_df('解決方案 前10名', df_result)
-    df_solution = calculate_solution_roi(conn, df_result, df_trend)
+    with span('model.roi'):
+        df_solution = pipeline.run_stage('model.roi', calculate_solution_roi, conn, df_result, df_trend, deps=dim_versions(conn))
     
-    log_df('解決方案 ROI', df_solution[['solution_id', 'final_score', 'weighted_performance_gap_impact_cashflow','average_price' , 'ROI']])
-    log_df('財務指標運算', df_year_data.reset_index().to_string())
+    log_df('解決方案 ROI', Lazy(lambda: df_solution[['solution_id', 'final_score', 'weighted_performance_gap_impact_cashflow','average_price' , 'ROI']]))
+    log_df('財務指標運算', Lazy(lambda: df_year_data.reset_index().to_string()))
     log_df('質化指標', df_qualitative_result)
-    log_df('趨勢現金流分析', df_trend.to_string())
+    log_df('趨勢現金流分析', Lazy(df_trend.to_string))
 
-    # output
+    # output, key codes decoded back to labels for reporting.
+    for df in (df_solution, df_qualitative_result, df_trend):
+        keys.decode(df)
     output_tables: dict = {}
     output_tables['解決方案前十名與ROI'] = df_solution
     output_tables['三年財務指標運算結果'] = df_year_data.reset_index()
@@ -351,6 +379,46 @@ def apply_model(conn: database.engine, input_tables: dict[str, pd.DataFrame]) ->
 
     return output_tables
 
+
+def strategy_weights(conn: database.engine, custom_weights: dict[str, dict] = None) -> pd.DataFrame:
+    # scenarios for the what-if sweep: every STRAT-* row of dim_strategy_weight, plus custom weightings
+    #   custom_weights: {"name": {"aspect_ux": 0.4, "aspect_mfg": 0.2, ...}}, missing aspects weigh 0.
+    # returns one row per scenario (index: strategy_id / custom name), one column per aspect_id.
+    aspect_ids: list = list(STRATEGY_FUNCTION_MAP.values())
+    df_weights = repo.get_strategy_weights(conn).set_index('strategy_id')[aspect_ids].astype(float)
+
+    for name, weights in (custom_weights or {}).items():
+        if not isinstance(weights, dict):
+            raise ValueError(f'strategy weights of {name} must be an object of aspect weights')
+        unknown = set(weights) - set(aspect_ids)
+        if unknown:
+            raise ValueError(f'unknown aspect {sorted(unknown)} in strategy weights of {name}, expected {aspect_ids}')
+        try:
+            df_weights.loc[str(name)] = [float(weights.get(aspect_id, 0)) for aspect_id in aspect_ids]
+        except (TypeError, ValueError):
+            raise ValueError(f'strategy weights of {name} must be numbers')
+
+    return df_weights
+
+
+def sweep_strategy_weights(conn: database.engine, input_tables: dict[str, pd.DataFrame], df_weights: pd.DataFrame, k: int = 10) -> dict[str, pd.DataFrame]:
+    # what-if: top k solutions for each strategy weighting (df_weights, see strategy_weights), from one prepared input.
+    #   no ROI, no slides. ql_score = weight(aspect) * gap, so the weighted gap vector becomes a
+    #   (question × scenario) matrix and all scenarios are ranked with one sparse product, see scoring.rank_scenarios.
+    df_solution_filter, df_qualitative_result, df_year_data, df_trend = run_analysis(conn, input_tables)
+
+    with span('model.sweep'):
+        aspect_ids = df_qualitative_result['aspect'].astype(object).map(STRATEGY_FUNCTION_MAP)
+        question_weights = df_weights.reindex(columns=aspect_ids).to_numpy(dtype=float).T      # (questions × scenarios)
+        gap = pd.to_numeric(df_qualitative_result['gap'], errors='coerce').to_numpy(dtype=float)
+        ql_scores = question_weights * gap[:, None]
+
+        results = scoring.rank_scenarios(df_solution_filter, df_qualitative_result, ql_scores, df_trend,
+                                         scoring.sq_matrix(conn), scoring.sf_matrix(conn), k=k)
+
+    return {name: keys.decode(df_result) for name, df_result in zip(df_weights.index, results)}
+
+
 def log_df(name: str, df) -> None:
-    logger.debug(name)
-    logger.debug(df)
\ No newline at end of file
+    # df is rendered by the log handler only when DEBUG is enabled, wrap expensive renders with Lazy().
+    logger.debug('%s\n%s', name, df)
\ No newline at end of file
@@ -0,0 +1,52 @@
+# memoized pipeline stages.
+# each stage result is stored under hash(stage name, stage version, inputs), so when a consultant
+# only changes e.g. tbl_interviewee_weight, the quantitative branch is served from memory
+# and only the stages downstream of the changed input run again.
+# rendered charts are cached separately as PNG bytes (cache/chart_cache.py).
+#
+# results are stored pickled: callers always get a private copy, so in-place DataFrame edits downstream
+# (a common pattern in this code base) can't corrupt the cached value.
+import logging
+import pickle
+
+from cache.fingerprint import hash_values
+from cache.store import LRUCache
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+_stage_cache = LRUCache(STAGE_CACHE_BYTES, name='stage')
+
+
+def stage_key(name: str, version: str, args: tuple, kwargs: dict, deps) -> str:
+    return hash_values(name, version, list(args), kwargs, deps)
+
+
+def run_stage(name: str, func, *args, deps=None, version: str = '', **kwargs):
+    # run_stage('model.quantitative', run_quantitative_analysis, conn, df_financial_data, deps=dim_versions(conn))
+    #   args / kwargs: hashed as stage inputs, except database connections (pass table versions through deps instead).
+    #   deps: extra key material for inputs the function reads by itself (dimension tables, template ...).
+    #   version: bump when the stage logic changes in a way that must invalidate earlier results.
+    key_args = tuple(arg for arg in args if not _is_connection(arg))
+    key_kwargs = {key: value for key, value in kwargs.items() if not _is_connection(value)}
+    key = stage_key(name, version, key_args, key_kwargs, deps)   # hash before calling: stages may mutate their inputs.
+
+    cached = _stage_cache.get(key)
+    if cached is not None:
+        logger.debug(f'stage cache hit: {name}')
+        return pickle.loads(cached)
+
+    result = func(*args, **kwargs)
+    _stage_cache.put(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    return result
+
+
+def _is_connection(value) -> bool:
+    # sqlalchemy Engine / Connection
+    return hasattr(value, 'dialect') and hasattr(value, 'execute')
+
+
+def clear() -> None:
+    global _stage_cache
+    _stage_cache = LRUCache(STAGE_CACHE_BYTES, name='stage')
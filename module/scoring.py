@@ -0,0 +1,144 @@
+# solution scoring as sparse matrix algebra.
+#   sq_score = SQ (solution × question) @ ql_score (question)         質化分數 = 相依性分數 * 權重分數
+#   sf_score = SF (solution × fin_indicator) @ trend_score (indicator) 量化分數 = 相依性分數 * 趨勢分數
+#   final_score = sq_score + sf_score
+# relation matrices are built once per dimension table version, rows / columns are the shared key codes
+# of module/keys.py. per request only the rows of included solutions take part in the products.
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import sqlalchemy as database
+
+import db.repository_stg as repo
+import module.keys as keys
+
+
+class RelationMatrix:
+    # relation table (solution_id, <column>, correlation_score) as CSR matrix.
+
+    def __init__(self, df: pd.DataFrame, column: str):
+        self.column = column
+        self.version = df.attrs.get('version')
+
+        rows, cols = keys.codes(df, 'solution_id'), keys.codes(df, column)
+        values = pd.to_numeric(df['correlation_score'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        valid = (rows >= 0) & (cols >= 0)
+
+        shape = (len(keys.dtype('solution_id').categories), len(keys.dtype(column).categories))
+        self.matrix = sparse.csr_matrix((values[valid], (rows[valid], cols[valid])), shape=shape)   # duplicates summed
+
+        # solutions with any relation row, others have no score (NaN) like the merge / groupby this replaces.
+        self.solutions = np.zeros(shape[0], dtype=bool)
+        self.solutions[rows[valid]] = True
+
+    def vector(self, df: pd.DataFrame, values) -> np.ndarray:
+        # df (encoded <column>) + values per df row -> dense vector over <column> codes, duplicate keys summed, NaN as 0.
+        #   values: a column name, or an array (df rows × scenarios) giving one vector per scenario (columns).
+        if isinstance(values, str):
+            values = pd.to_numeric(df[values], errors='coerce').to_numpy(dtype=float)
+        vector = np.zeros((self.matrix.shape[1],) + values.shape[1:])
+        codes = keys.codes(df, self.column)
+        valid = (codes >= 0) & (codes < len(vector))    # ids newer than the matrix have no relation.
+        np.add.at(vector, codes[valid], np.nan_to_num(values[valid]))
+        return vector
+
+    def scores(self, df: pd.DataFrame, values, solutions: np.ndarray) -> np.ndarray:
+        # scores of the given solution codes only (rows sliced before the product), NaN for solutions without relation.
+        #   one score per solution, or (solutions × scenarios) when values has one column per scenario.
+        vector = self.vector(df, values)
+        scores = np.full((len(solutions),) + vector.shape[1:], np.nan)
+        inside = (solutions >= 0) & (solutions < self.matrix.shape[0])   # solutions newer than the matrix have no relation.
+        rows = solutions[inside]
+
+        product = self.matrix[rows] @ vector
+        product[~self.solutions[rows]] = np.nan
+        scores[inside] = product
+        return scores
+
+
+_matrices: dict[str, RelationMatrix] = {}
+_lock = threading.Lock()
+
+
+def relation_matrix(conn: database.engine, loader, column: str) -> RelationMatrix:
+    df = keys.load(loader, conn, copy=False)
+    matrix = _matrices.get(loader.__name__)
+    if matrix is None or matrix.version != df.attrs.get('version'):
+        with _lock:
+            matrix = _matrices.get(loader.__name__)
+            if matrix is None or matrix.version != df.attrs.get('version'):
+                matrix = RelationMatrix(df, column)
+                _matrices[loader.__name__] = matrix
+    return matrix
+
+
+def sq_matrix(conn: database.engine) -> RelationMatrix:
+    return relation_matrix(conn, repo.get_dim_sq_relation, 'question_id')
+
+
+def sf_matrix(conn: database.engine) -> RelationMatrix:
+    return relation_matrix(conn, repo.get_dim_sf_relation_score, 'fin_indicator_id')
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # positions of the k largest scores (NaN ignored), descending, ties keep the earlier position (as nlargest).
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if len(candidates) > k:
+        values = scores[candidates]
+        kth = np.partition(values, len(values) - k)[len(values) - k]
+        above = candidates[values > kth]
+        ties = candidates[values == kth][:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def included(df_solution_filter: pd.DataFrame, sq: RelationMatrix, sf: RelationMatrix, *frames: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+    # 納入評估 solutions (one row per solution_id) and their codes, frames are aligned to the same key categories.
+    #   sq / sf: built relation matrices, i.e. their dimension tables (solution_id categories) are loaded before the
+    #   filter is encoded against them. ids no dimension table knows are dropped.
+    df_included = df_solution_filter[df_solution_filter['solution_id'].notna()].drop_duplicates('solution_id')
+    keys.align(df_included, *frames)
+    df_included = df_included[df_included['solution_id'].notna()]
+    return df_included, keys.codes(df_included, 'solution_id')
+
+
+def top(df_included: pd.DataFrame, sq_score: np.ndarray, sf_score: np.ndarray, k: int) -> pd.DataFrame:
+    # a solution scored by only one side gets 0 for the other, solutions without any relation are not ranked.
+    scored = ~np.isnan(sq_score) | ~np.isnan(sf_score)
+    sq_score = np.where(scored, np.nan_to_num(sq_score), np.nan)
+    sf_score = np.where(scored, np.nan_to_num(sf_score), np.nan)
+    final_score = sq_score + sf_score
+
+    positions = top_k(final_score, k)
+    df_result = df_included.iloc[positions].copy()
+    df_result['sq_score'] = sq_score[positions]
+    df_result['sf_score'] = sf_score[positions]
+    df_result['final_score'] = final_score[positions]
+    return df_result
+
+
+def rank(df_solution_filter: pd.DataFrame, df_qualitative_result: pd.DataFrame, df_trend: pd.DataFrame,
+         sq: RelationMatrix, sf: RelationMatrix, k: int = 10) -> pd.DataFrame:
+    # 根據使用者設定篩選 solution, 計算綜合分數, 取排名前 k.
+    #   the inclusion filter is applied first: only included solutions are scored, work grows with the
+    #   number of included solutions, not with the catalogue.
+    #   returns df_solution_filter rows of the top k with sq_score, sf_score, final_score.
+    df_included, solutions = included(df_solution_filter, sq, sf, df_qualitative_result, df_trend)
+    sq_score = sq.scores(df_qualitative_result, 'ql_score', solutions)
+    sf_score = sf.scores(df_trend, 'trend_score', solutions)
+    return top(df_included, sq_score, sf_score, k)
+
+
+def rank_scenarios(df_solution_filter: pd.DataFrame, df_qualitative_result: pd.DataFrame, ql_scores: np.ndarray,
+                   df_trend: pd.DataFrame, sq: RelationMatrix, sf: RelationMatrix, k: int = 10) -> list[pd.DataFrame]:
+    # rank() for several qualitative scenarios at once (ex. strategy weightings).
+    #   ql_scores: (df_qualitative_result rows × scenarios), the question vector becomes a matrix, so every
+    #   scenario is scored by the same sparse product. sf_score does not depend on the scenario.
+    df_included, solutions = included(df_solution_filter, sq, sf, df_qualitative_result, df_trend)
+    sq_scores = sq.scores(df_qualitative_result, ql_scores, solutions)
+    sf_score = sf.scores(df_trend, 'trend_score', solutions)
+    return [top(df_included, sq_scores[:, i], sf_score, k) for i in range(ql_scores.shape[1])]
@@ -0,0 +1,195 @@
+# Monte Carlo uncertainty of the solution ranking and ROI.
+# apply_model gives one point estimate, here it is re-evaluated for thousands of perturbed scenarios:
+#   interviewee weights (權重)          -> weighted gap -> ql_score -> sq_score -> final_score -> rank
+#   financial inputs (performance gap)  -> performance_gap_impact_cashflow -> ROI
+#   sensitivity values                  -> performance_gap_impact_cashflow -> ROI
+# everything is linear in the perturbed inputs, so scenarios are one more array axis instead of a loop:
+#   sq_score (solution × scenario) = [SQ @ diag(question weight) @ C] (solution × interviewee) @ W (interviewee × scenario)
+#   ROI      (solution × scenario) = impact (solution × indicator) @ cashflow (indicator × scenario) * 0.1 / average_price
+# trend scores are thresholds on CAGR (database formulas) and stay at their point estimate, so sf_score is fixed.
+import numpy as np
+import pandas as pd
+
+import sqlalchemy as database
+
+import db.repository_stg as repo
+import module.data_transformation as transform
+import module.keys as keys
+import module.model as model
+import module.scoring as scoring
+from monitor.trace import span
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    'scenarios': 2000,          # number of perturbed scenarios
+    'weight_sd': 0.1,           # relative standard deviation of each interviewee weight
+    'financial_sd': 0.1,        # relative standard deviation of each indicator performance gap
+    'sensitivity_sd': 0.1,      # relative standard deviation of each sensitivity value
+    'seed': 0,                  # same seed + same input -> same result
+}
+MAX_SCENARIOS = 20000
+CHUNK_SCENARIOS = 256           # scenarios per batch, bounds memory to (included solutions × CHUNK_SCENARIOS) floats
+PERCENTILES = (5, 50, 95)
+
+
+def simulation_options(options: dict = None) -> dict:
+    # user options over DEFAULT_OPTIONS, raise ValueError for unknown / out of range values.
+    options = dict(options or {})
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f'unknown simulation option {sorted(unknown)}, expected {list(DEFAULT_OPTIONS)}')
+
+    options = {**DEFAULT_OPTIONS, **options}
+    try:
+        options['scenarios'], options['seed'] = int(options['scenarios']), int(options['seed'])
+        for name in ('weight_sd', 'financial_sd', 'sensitivity_sd'):
+            options[name] = float(options[name])
+    except (TypeError, ValueError):
+        raise ValueError('simulation options must be numbers')
+
+    if not 1 <= options['scenarios'] <= MAX_SCENARIOS:
+        raise ValueError(f'scenarios must be between 1 and {MAX_SCENARIOS}')
+    if any(options[name] < 0 for name in ('weight_sd', 'financial_sd', 'sensitivity_sd')):
+        raise ValueError('standard deviations must not be negative')
+    return options
+
+
+def interviewee_gap_basis(df_form_data: pd.DataFrame, df_form_weight: pd.DataFrame, df_qualitative_result: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    # gap of each df_qualitative_result row as a linear function of the interviewee weights: gap = C @ weights
+    #   C (questions × interviewees): target value - actual value of each interviewee (see summarized_form_data).
+    df = df_form_data[['job_title', 'interviewee', 'question_id', 'attribute', 'value']]
+    weight_keys = df['job_title'].astype(str) + "_" + df['interviewee'].astype(str)
+    interviewee_codes, interviewees = pd.factorize(weight_keys)
+
+    # duplicated 問卷 rows are each merged in summarized_form_data, i.e. their weights add up.
+    weights = pd.to_numeric(df_form_weight['權重'], errors='coerce').groupby(df_form_weight['問卷']).sum()
+    weights = weights.reindex(interviewees).fillna(0).to_numpy(dtype=float)
+
+    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype=float)
+    signs = df['attribute'].astype(object).map(transform.ATTRIBUTE_MAP).map({'target': 1.0, 'actual': -1.0}).fillna(0).to_numpy(dtype=float)
+    rows = pd.Index(df_qualitative_result['question_id'].astype(object)).get_indexer(df['question_id'].astype(object))
+
+    valid = (rows >= 0) & (interviewee_codes >= 0) & ~np.isnan(values)
+    basis = np.zeros((len(df_qualitative_result), len(interviewees)))
+    np.add.at(basis, (rows[valid], interviewee_codes[valid]), signs[valid] * values[valid])
+    return basis, weights
+
+
+def perturb(rng: np.random.Generator, base: np.ndarray, sd: float, scenarios: int, baseline: bool = False) -> np.ndarray:
+    # (len(base) × scenarios) draws of base * (1 + sd * N(0, 1)), factors clipped at 0 (no sign flips).
+    # baseline: the first column is the unperturbed point estimate.
+    factors = np.maximum(1 + sd * rng.standard_normal((len(base), scenarios)), 0)
+    if baseline:
+        factors[:, 0] = 1
+    return base[:, None] * factors
+
+
+def top_k_columns(final_score: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # top k positions of every column (scenario), descending, ties keep the earlier position.
+    # returns positions (k × scenarios) and a mask of the ranked ones (solutions without score are not ranked).
+    k = min(k, final_score.shape[0])
+    if k < final_score.shape[0]:
+        positions = np.argpartition(-final_score, k - 1, axis=0)[:k]
+    else:
+        positions = np.broadcast_to(np.arange(k)[:, None], final_score.shape).copy()
+    values = np.take_along_axis(final_score, positions, axis=0)
+    order = np.lexsort((positions, -values), axis=0)
+    positions = np.take_along_axis(positions, order, axis=0)
+    return positions, np.isfinite(np.take_along_axis(values, order, axis=0))
+
+
+def simulate_ranking(sq_basis: np.ndarray, sf_score: np.ndarray, weights: np.ndarray, options: dict, rng: np.random.Generator, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # top k of every scenario (column 0: point estimate), processed in chunks of CHUNK_SCENARIOS.
+    #   sq_basis (solutions × interviewees): sq_score = sq_basis @ interviewee weights, NaN rows have no sq relation.
+    #   returns positions / ranked mask (k × scenarios + 1), see top_k_columns.
+    scored = ~np.isnan(sq_basis[:, 0]) | ~np.isnan(sf_score) if sq_basis.shape[1] else ~np.isnan(sf_score)
+    sq_basis, sf_score = np.nan_to_num(sq_basis), np.nan_to_num(sf_score)
+
+    total = options['scenarios'] + 1
+    positions, ranked = [], []
+    reference = None
+    for start in range(0, total, CHUNK_SCENARIOS):
+        size = min(CHUNK_SCENARIOS, total - start)
+        final_score = sq_basis @ perturb(rng, weights, options['weight_sd'], size, baseline=start == 0) + sf_score[:, None]
+        final_score[~scored] = -np.inf
+        if reference is None:
+            reference = scoring.top_k(np.where(scored, final_score[:, 0], np.nan), k)     # point estimate top k
+
+        # the k-th best of a scenario is at least the lowest score of the point estimate top k in that scenario,
+        # solutions below it in every scenario of the chunk can't reach any top k (exact, and skips most rows).
+        keep = np.arange(len(final_score))
+        if len(reference) == k:
+            keep = np.flatnonzero((final_score >= final_score[reference].min(axis=0)).any(axis=1))
+
+        chunk_positions, chunk_ranked = top_k_columns(final_score[keep], k)
+        positions.append(keep[chunk_positions])
+        ranked.append(chunk_ranked)
+    return np.concatenate(positions, axis=1), np.concatenate(ranked, axis=1)
+
+
+def simulate_roi(impact: scoring.RelationMatrix, df_trend: pd.DataFrame, solutions: np.ndarray, prices: np.ndarray, options: dict, rng: np.random.Generator) -> np.ndarray:
+    # ROI (solutions × scenarios + 1, column 0: point estimate).
+    #   cashflow of each df_trend row = |performance_gap| * sensitivity_value, summed per fin_indicator_id.
+    gap = pd.to_numeric(df_trend['performance_gap'], errors='coerce').to_numpy(dtype=float)
+    sensitivity = pd.to_numeric(df_trend['sensitivity_value'], errors='coerce').to_numpy(dtype=float)
+
+    total = options['scenarios'] + 1
+    cashflow = (np.abs(perturb(rng, gap, options['financial_sd'], total, baseline=True))
+                * perturb(rng, sensitivity, options['sensitivity_sd'], total, baseline=True))
+    cashflow_impact = impact.scores(df_trend, cashflow, solutions)     # (solutions × scenarios), NaN without relation
+    return np.nan_to_num(cashflow_impact) * model.ROI_CASHFLOW_SHARE / prices[:, None]
+
+
+def run_simulation(conn: database.engine, input_tables: dict[str, pd.DataFrame], options: dict = None, k: int = 10) -> pd.DataFrame:
+    # returns one row per solution that reaches the top k in any scenario (df_solution_filter columns) with
+    #   rank, ROI: point estimate (as apply_model)
+    #   top_k_share: share of scenarios in the top k (rank stability)
+    #   rank_p5 / rank_p50 / rank_p95: rank percentiles, k + 1 means outside the top k
+    #   ROI_p5 / ROI_p50 / ROI_p95: ROI percentiles
+    options = simulation_options(options)
+    rng = np.random.default_rng(options['seed'])
+    df_solution_filter, df_qualitative_result, df_year_data, df_trend = model.run_analysis(conn, input_tables)
+
+    with span('simulation.ranking'):
+        basis, weights = interviewee_gap_basis(input_tables['df_form_data'], input_tables['df_form_weight'], df_qualitative_result)
+        question_weight = pd.to_numeric(df_qualitative_result['weight'], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+        sq, sf = scoring.sq_matrix(conn), scoring.sf_matrix(conn)
+        df_included, solutions = scoring.included(df_solution_filter, sq, sf, df_qualitative_result, df_trend)
+        sq_basis = sq.scores(df_qualitative_result, question_weight[:, None] * basis, solutions)
+        sf_score = sf.scores(df_trend, 'trend_score', solutions)
+        positions, ranked = simulate_ranking(sq_basis, sf_score, weights, options, rng, k)
+
+    with span('simulation.roi'):
+        # ROI only for the solutions that are ranked in some scenario.
+        candidates = np.unique(positions[ranked])
+        candidate_codes = solutions[candidates]
+        df_impact = keys.take(repo.get_dim_sf_relation_score, conn, 'solution_id', candidate_codes)
+        df_impact['correlation_score'] = pd.to_numeric(df_impact['correlation_score'], errors='coerce').map(model.SF_RELATION_IMPACT_WEIGHT_MAP)
+        impact = scoring.RelationMatrix(df_impact, 'fin_indicator_id')
+
+        df_price = keys.take(repo.get_dim_solution, conn, 'solution_id', candidate_codes)
+        prices = (pd.to_numeric(df_price['average_price'], errors='coerce')
+                  .groupby(keys.codes(df_price, 'solution_id')).first()
+                  .reindex(candidate_codes).to_numpy(dtype=float))
+        roi = simulate_roi(impact, df_trend, candidate_codes, prices, options, rng)
+
+    # rank of each candidate in each scenario, k + 1 outside the top k.
+    ranks = np.full((len(candidates), positions.shape[1]), k + 1)
+    rank_numbers = np.broadcast_to(np.arange(1, positions.shape[0] + 1)[:, None], positions.shape)
+    columns = np.broadcast_to(np.arange(positions.shape[1]), positions.shape)
+    ranks[np.searchsorted(candidates, positions[ranked]), columns[ranked]] = rank_numbers[ranked]
+
+    df_result = df_included.iloc[candidates].copy()
+    df_result['rank'] = np.where(ranks[:, 0] <= k, ranks[:, 0], np.nan)
+    df_result['ROI'] = roi[:, 0]
+    df_result['top_k_share'] = (ranks[:, 1:] <= k).mean(axis=1)
+    for percentile, values in zip(PERCENTILES, np.percentile(ranks[:, 1:], PERCENTILES, axis=1, method='nearest')):
+        df_result[f'rank_p{percentile}'] = values
+    for percentile, values in zip(PERCENTILES, np.percentile(roi[:, 1:], PERCENTILES, axis=1)):
+        df_result[f'ROI_p{percentile}'] = values
+
+    logger.debug('%s', df_result)
+    return keys.decode(df_result.sort_values(['top_k_share', 'rank_p50'], ascending=[False, True]))
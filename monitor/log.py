@@ -0,0 +1,123 @@
+# logging setup: request threads only put records on a queue, a background QueueListener
+# does the (slow) file / console I/O.
+# https://docs.python.org/3/howto/logging-cookbook.html#dealing-with-handlers-that-block
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+from monitor.trace import RequestContextFilter
+
+DEFAULT_FORMAT = '%(asctime)s - %(request_id)s - %(name)s - %(levelname)s - %(message)s'
+
+# attributes every LogRecord has, anything else was passed through `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener: logging.handlers.QueueListener = None
+
+
+class Lazy:
+    # defer expensive message rendering (ex. DataFrame.to_string) until a handler actually formats the record.
+    # usage: logger.debug('%s', Lazy(df.to_string)), skipped entirely when DEBUG is disabled.
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args))
+
+
+class JsonFormatter(logging.Formatter):
+    # one json object per line, for bulk ingestion and monitor.timeline.
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text         # formatted on the calling thread (RecordQueueHandler)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare renders the traceback into msg and drops it, the listener's formatter could not tell
+    # message and exception apart. keep the traceback in exc_text instead: text formats append it as before,
+    # JsonFormatter writes it as "exception".
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(config: dict) -> logging.handlers.QueueListener:
+    # config (one environment of log_config.json):
+    #   level, format, json, filename, max_bytes, backup_count, console, loggers: {logger_name: level}
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    formatter = JsonFormatter() if config.get('json', False) else logging.Formatter(config.get('format', DEFAULT_FORMAT))
+    handlers: list[logging.Handler] = []
+
+    # size-based rotation: LOG/log.txt, LOG/log.txt.1, ...
+    filename = config.get('filename')
+    if filename:
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=config.get('max_bytes', 10 * 1024 * 1024), backupCount=config.get('backup_count', 10), encoding='utf-8')
+        handlers.append(file_handler)
+
+    if config.get('console', True):
+        handlers.append(logging.StreamHandler())
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # unbounded queue: never block the request thread on a slow disk.
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    queue_handler = RecordQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(config.get('level', 'INFO'))
+
+    for name, level in config.get('loggers', {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    # flush remaining records, registered with atexit.
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
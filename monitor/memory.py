@@ -0,0 +1,60 @@
+# process memory, for spans (monitor/trace.py) and load tests, without extra packages. bytes, None when unknown.
+#   rss(): current resident set size (linux: /proc/self/statm, windows: working set, elsewhere None).
+#   peak_rss(): high-water mark since process start (getrusage, windows: peak working set).
+#   traced(): (current, peak) Python allocations when tracemalloc runs (python -X tracemalloc=1), else None.
+import os
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError:                 # windows
+    resource = None
+
+STATM = '/proc/self/statm'
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _windows_counters():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+    except AttributeError:
+        return None
+    return counters
+
+
+def rss() -> int:
+    if os.path.exists(STATM):
+        with open(STATM, mode='rb') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    if resource is None:
+        counters = _windows_counters()
+        return counters.WorkingSetSize if counters is not None else None
+    return None
+
+
+def peak_rss() -> int:
+    if resource is None:
+        counters = _windows_counters()
+        return counters.PeakWorkingSetSize if counters is not None else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024        # linux: KiB
+
+
+def traced() -> tuple:
+    return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
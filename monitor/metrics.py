@@ -0,0 +1,256 @@
+# in-process metrics registry, rendered in Prometheus text exposition format.
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+#
+# collection cost is a dict lookup + a lock + a bisect per observation (~1-2 µs),
+# so it is safe to call on every request / query / chart.
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+import sqlalchemy as database
+
+
+# default buckets (seconds), covers a 5ms login up to a 2 minutes report.
+LATENCY_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+DB_BUCKETS: tuple = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+# pptx output size (bytes): 256KB ~ 64MB
+SIZE_BUCKETS: tuple = tuple(2 ** exp for exp in range(18, 27))
+MEMORY_BUCKETS: tuple = tuple(2 ** exp for exp in range(20, 31))     # 1 MiB - 1 GiB
+
+
+class _Metric(ABC):
+    metric_type: str = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues, **labelkwargs):
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self.labelnames)
+
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    @abstractmethod
+    def _render_child(self, labelvalues: tuple, child) -> list[str]:
+        ...
+
+    def _label_text(self, labelvalues: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.labelnames, labelvalues)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for labelvalues, child in list(self._children.items()):
+            lines.extend(self._render_child(labelvalues, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, labelvalues: tuple, child: _CounterChild) -> list[str]:
+        return [f'{self.name}{self._label_text(labelvalues)} {child.value}']
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - tic)
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, labelvalues: tuple, child: _HistogramChild) -> list[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f'{self.name}_bucket{self._label_text(labelvalues, {"le": le})} {cumulative}')
+        lines.append(f'{self.name}_sum{self._label_text(labelvalues)} {total}')
+        lines.append(f'{self.name}_count{self._label_text(labelvalues)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# http
+HTTP_REQUESTS = REGISTRY.counter('http_requests_total', 'HTTP requests by route, method and status.', ('route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP request latency by route.', ('route',))
+HTTP_IN_FLIGHT = REGISTRY.gauge('http_requests_in_flight', 'HTTP requests currently being served.', ('route',))
+HTTP_EXCEPTIONS = REGISTRY.counter('http_request_exceptions_total', 'Unhandled exceptions raised while serving a request.', ('route', 'exception'))
+
+# pipeline: etl -> model -> report
+STAGE_LATENCY = REGISTRY.histogram('pipeline_stage_duration_seconds', 'Duration of each /api/task pipeline stage.', ('stage',))
+STAGE_PEAK_GROWTH = REGISTRY.histogram('pipeline_stage_peak_rss_growth_bytes', 'Growth of the process peak RSS during a pipeline stage (stages that raised it).', ('stage',), buckets=MEMORY_BUCKETS)
+PROCESS_PEAK_RSS = REGISTRY.gauge('process_peak_rss_bytes', 'Peak resident set size of the process.')
+
+# database
+DB_QUERIES = REGISTRY.counter('db_queries_total', 'Database statements executed.', ('operation',))
+DB_LATENCY = REGISTRY.histogram('db_query_duration_seconds', 'Database statement latency.', ('operation',), buckets=DB_BUCKETS)
+
+# reporting
+CHART_RENDERS = REGISTRY.counter('chart_renders_total', 'Charts rendered, by chart function.', ('chart',))
+CHART_LATENCY = REGISTRY.histogram('chart_render_duration_seconds', 'Chart render latency, by chart function.', ('chart',))
+PPTX_SIZE = REGISTRY.histogram('report_pptx_size_bytes', 'Size of the generated pptx file.', buckets=SIZE_BUCKETS)
+
+# caches
+CACHE_REQUESTS = REGISTRY.counter('cache_requests_total', 'Cache lookups by cache name and result (hit / miss).', ('cache', 'result'))
+CHART_CACHE = REGISTRY.counter('chart_cache_requests_total', 'Chart image cache lookups by chart function and result (hit / miss).', ('chart', 'result'))
+
+# profiling (monitor/profiler.py)
+PROFILES = REGISTRY.counter('request_profiles_total', 'Request profiles stored, by trigger (header / slow).', ('trigger',))
+
+
+def track_chart(func):
+    # decorator for plot_utils chart functions.
+    renders, latency = CHART_RENDERS.labels(func.__name__), CHART_LATENCY.labels(func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        tic = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latency.observe(time.perf_counter() - tic)
+            renders.inc()
+
+    return wrapper
+
+
+def instrument_engine(conn: database.engine) -> None:
+    # count and time every statement sent through the engine, using sqlalchemy cursor events.
+    # https://docs.sqlalchemy.org/en/14/core/events.html#sqlalchemy.events.ConnectionEvents
+    #   start time kept on the execution context: a failing statement leaves nothing behind on the pooled connection.
+    @database.event.listens_for(conn, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @database.event.listens_for(conn, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else 'UNKNOWN'
+        DB_QUERIES.labels(operation).inc()
+        DB_LATENCY.labels(operation).observe(elapsed)
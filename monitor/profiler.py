@@ -0,0 +1,190 @@
+# opt-in profiling of /api/task requests, stored next to the logs (log_config.json -> "profile").
+#   on demand: header "X-Profile: 1" from a user listed in "users", sampled from the start of the request.
+#   slow requests: a request still running after "slow_seconds" is sampled from then on (one shared watchdog thread
+#                  checks the deadlines of all running requests).
+# only the threads working for the request are sampled: the request thread, and task graph / executor workers
+# while they run one of its tasks (see attach). profiles are collapsed stacks (monitor/sampling.py), one file per
+# request: <directory>/<time>_<request_id>.collapsed, only the newest "max_profiles" files are kept.
+# disabled, or a fast request without header: no sampler thread, one ContextVar lookup per executor task,
+# and with slow_seconds set, a deadline added to / removed from the watchdog.
+import glob
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import monitor.metrics as metrics
+import monitor.trace as trace
+from monitor.sampling import StackSampler, DEFAULT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SUFFIX = '.collapsed'
+
+_config: dict = {'enabled': False}
+_SESSION: ContextVar['Session'] = ContextVar('profile_session', default=None)
+
+
+def configure(config: dict, log_filename: str = None) -> None:
+    # config: {"enabled": true, "slow_seconds": 60, "max_profiles": 20, "users": ["..."], "interval": 0.005, "directory": "..."}
+    #   directory defaults to LOG/profile, next to log_filename.
+    global _config
+    config = dict(config or {})
+    config.setdefault('enabled', False)
+    config.setdefault('directory', os.path.join(os.path.dirname(log_filename or '') or 'LOG', 'profile'))
+    config.setdefault('slow_seconds', None)
+    config.setdefault('max_profiles', 20)
+    config.setdefault('interval', DEFAULT_INTERVAL)
+    config['users'] = set(config.get('users', ()))
+    _config = config
+
+
+def requested(header: str, user_email: str) -> bool:
+    # X-Profile header honoured for authorized users only.
+    return bool(_config['enabled'] and header and header.strip() not in ('0', 'false') and user_email in _config['users'])
+
+
+class Session:
+
+    def __init__(self, request_id: str, interval: float):
+        self.request_id = request_id
+        self.thread_ids: set = {threading.get_ident()}
+        self.sampler = StackSampler(interval, thread_ids=self.thread_ids)
+        self.trigger: str = None
+        self.started: float = None
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def start(self, trigger: str) -> None:
+        with self._lock:
+            if self._finished or self.trigger is not None:
+                return
+            self.trigger = trigger
+            self.started = time.perf_counter()
+            self.sampler.start()
+        logger.info(f'profiling request {self.request_id} ({trigger})')
+
+    def start_after(self, seconds: float) -> None:
+        _WATCHDOG.add(self, time.monotonic() + seconds)
+
+    def finish(self) -> str:
+        # stop sampling, returns the stored profile path (None when nothing was sampled).
+        _WATCHDOG.discard(self)
+        with self._lock:
+            self._finished = True
+            if self.trigger is None:
+                return None
+            self.sampler.stop()
+        if not self.sampler.stacks:
+            return None
+        return store(self)
+
+
+class Watchdog:
+    # starts the sessions of requests still running after their deadline, one thread for all requests.
+
+    def __init__(self):
+        self._deadlines: dict[Session, float] = {}
+        self._condition = threading.Condition()
+        self._thread: threading.Thread = None
+
+    def add(self, session: Session, deadline: float) -> None:
+        with self._condition:
+            self._deadlines[session] = deadline
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-watchdog', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def discard(self, session: Session) -> None:
+        with self._condition:
+            self._deadlines.pop(session, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                due = [session for session, deadline in self._deadlines.items() if deadline <= now]
+                for session in due:
+                    del self._deadlines[session]
+                if not due:
+                    self._condition.wait(min(self._deadlines.values()) - now if self._deadlines else None)
+                    continue
+            for session in due:
+                session.start('slow')       # no-op when the request finished meanwhile
+
+
+_WATCHDOG = Watchdog()
+
+
+def profile_path(directory: str, request_id: str) -> str:
+    # request ids are validated when the request starts (trace.start_request), checked again: the id is part of a path.
+    if not trace.valid_request_id(request_id):
+        request_id = trace.new_request_id()
+    path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}_{request_id}{PROFILE_SUFFIX}')
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(directory):
+        raise ValueError(f'profile path outside of {directory}: {path}')
+    return path
+
+
+def store(session: Session) -> str:
+    directory = _config['directory']
+    os.makedirs(directory, exist_ok=True)
+    path = profile_path(directory, session.request_id)
+    session.sampler.write(path)
+    metrics.PROFILES.labels(session.trigger).inc()
+    logger.info(
+        f'profile of request {session.request_id} stored: {path} '
+        f'({session.sampler.total()} samples over {time.perf_counter() - session.started:.2f} seconds)',
+        extra={'event': 'profile', 'profile': path, 'trigger': session.trigger})
+
+    # keep the newest max_profiles files.
+    profiles = sorted(glob.glob(os.path.join(directory, f'*{PROFILE_SUFFIX}')), key=os.path.getmtime)
+    for old in profiles[:max(len(profiles) - _config['max_profiles'], 0)]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+@contextmanager
+def profile(request_id: str, forced: bool = False):
+    # with profile(request_id, forced=requested(header, user_email)): ... the whole request pipeline.
+    if not _config['enabled'] or not (forced or _config['slow_seconds']):
+        yield
+        return
+
+    session = Session(request_id, _config['interval'])
+    token = _SESSION.set(session)
+    if forced:
+        session.start('header')
+    else:
+        session.start_after(_config['slow_seconds'])
+    try:
+        yield
+    finally:
+        _SESSION.reset(token)
+        try:
+            session.finish()
+        except (OSError, ValueError) as e:
+            logger.warning(f'profile of request {request_id} not stored: {e}')
+
+
+@contextmanager
+def attach():
+    # executor workers: sampled with the request they run a task for (the context is copied from the request).
+    session = _SESSION.get()
+    if session is None:
+        yield
+        return
+
+    thread_id = threading.get_ident()
+    session.thread_ids.add(thread_id)
+    try:
+        yield
+    finally:
+        session.thread_ids.discard(thread_id)
@@ -0,0 +1,101 @@
+# statistical profiler: a background thread records the Python stack of the sampled threads every interval.
+# unlike cProfile it sees every thread (task graph workers, chart rendering) and costs nothing between samples.
+# output is the collapsed stack format ('root;caller;callee count' per line), read by flamegraph.pl, speedscope, inferno.
+#
+# usage:
+#   with StackSampler() as sampler:
+#       ...
+#   sampler.write('profile.collapsed')
+import os
+import sys
+import threading
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005        # seconds
+
+# innermost Python frame of a thread blocked on a lock / queue / socket: idle, not sampled.
+IDLE_FRAMES = {('threading.py', 'wait'), ('queue.py', 'get'), ('selectors.py', 'select'), ('socket.py', 'accept'),
+               ('socketserver.py', 'serve_forever'), ('_base.py', 'wait'), ('_base.py', 'result'), ('thread.py', '_worker')}
+
+
+def frame_label(code) -> str:
+    # 'function (module/path.py:line)', paths inside the working directory relative, others as 'package/file.py'.
+    path = code.co_filename
+    relative = os.path.relpath(path) if os.path.isabs(path) else path
+    if relative.startswith('..'):
+        relative = '/'.join(path.replace('\\', '/').split('/')[-2:])
+    return f'{code.co_name} ({relative}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class StackSampler:
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, thread_ids: set = None, idle: bool = False):
+        # thread_ids: only these threads (threading.get_ident), None -> every thread but the sampler.
+        # idle: also record threads waiting in IDLE_FRAMES (pool workers without task, callers waiting on futures).
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.idle = idle
+        self.samples = 0
+        self.stacks: Counter[str] = Counter()
+        self._labels: dict = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self) -> 'StackSampler':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'StackSampler':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if not self.idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                self.stacks[self._stack(frame)] += 1
+            self.samples += 1
+
+    def _stack(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def collapsed(self, min_count: int = 1) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()) if count >= min_count)
+
+    def write(self, path: str, min_count: int = 1) -> None:
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(self.collapsed(min_count))
+
+    def total(self) -> int:
+        # thread samples recorded (one per sampled thread per interval).
+        return sum(self.stacks.values())
+
+    def top(self, limit: int = 20) -> list[tuple[str, int]]:
+        # [(frame label, thread samples with the frame innermost)], self time, most sampled first.
+        counts: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            counts[stack.rsplit(';', 1)[-1]] += count
+        return counts.most_common(limit)
+
@@ -0,0 +1,100 @@
+# offline tool: rebuild per-request stage timeline from json logs (log_config.json -> "json": true).
+#
+# usage:
+#   python -m monitor.timeline LOG/log.txt LOG/log.txt.1
+#   python -m monitor.timeline LOG/log.txt --request 3f2a9c0d1e4b5a6f
+#   python -m monitor.timeline LOG/log.txt --slowest 5
+import argparse
+import json
+from collections import defaultdict
+
+
+def read_spans(paths: list[str]) -> dict[str, list[dict]]:
+    # {request_id: [span record, ...]}, non-json and non-span lines are skipped.
+    requests: dict[str, list[dict]] = defaultdict(list)
+
+    for path in paths:
+        with open(path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                if entry.get('event') != 'span':
+                    continue
+                requests[entry.get('request_id', '-')].append(entry)
+
+    return requests
+
+
+def build_timeline(spans: list[dict]) -> list[dict]:
+    # order by start time, depth taken from parent chain.
+    spans = sorted(spans, key=lambda entry: entry['span_start'])
+    origin = spans[0]['span_start']
+    depth: dict[str, int] = {}
+
+    timeline = []
+    for entry in spans:
+        level = depth.get(entry.get('parent'), -1) + 1
+        depth.setdefault(entry['span'], level)
+        timeline.append({
+            'span': entry['span'],
+            'depth': level,
+            'offset': entry['span_start'] - origin,
+            'duration': entry['duration'],
+            'thread': entry.get('thread', ''),
+            'error': entry.get('error'),
+            'rss': entry.get('rss'),
+            'peak_growth': entry.get('peak_growth'),
+        })
+    return timeline
+
+
+def request_duration(timeline: list[dict]) -> float:
+    return max(row['offset'] + row['duration'] for row in timeline)
+
+
+def megabytes(value: int, sign: str = '') -> str:
+    return f'{value / 2 ** 20:{sign}8.1f}M' if value is not None else f'{"-":>9}'
+
+
+def print_timeline(request_id: str, timeline: list[dict], width: int = 40) -> None:
+    total = request_duration(timeline) or 1e-9
+    print(f'request {request_id}  total {total:0.4f}s')
+
+    for row in timeline:
+        start = int(row['offset'] / total * width)
+        length = max(1, int(row['duration'] / total * width))
+        bar = ' ' * start + '#' * length
+        name = '  ' * row['depth'] + row['span']
+        status = f"  !{row['error']}" if row['error'] else ''
+        # rss at the end of the span, growth of the process peak during it (logs before memory tracking: '-').
+        memory = f"{megabytes(row['rss'])} {megabytes(row['peak_growth'], '+')}"
+        print(f"  {name:<32} {row['offset']:>9.4f}s {row['duration']:>9.4f}s {memory}  |{bar:<{width}}| {row['thread']}{status}")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='rebuild per-request stage timeline from json logs.')
+    parser.add_argument('paths', nargs='+', help='json log files')
+    parser.add_argument('--request', help='only show this request id')
+    parser.add_argument('--slowest', type=int, default=0, help='only show the N slowest requests')
+    args = parser.parse_args()
+
+    timelines = {
+        request_id: build_timeline(spans)
+        for request_id, spans in read_spans(args.paths).items()
+        if args.request is None or request_id == args.request
+    }
+
+    request_ids = list(timelines)
+    if args.slowest:
+        request_ids = sorted(request_ids, key=lambda request_id: request_duration(timelines[request_id]), reverse=True)[:args.slowest]
+
+    for request_id in request_ids:
+        print_timeline(request_id, timelines[request_id])
+
+
+if __name__ == '__main__':
+    main()
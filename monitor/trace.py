@@ -0,0 +1,111 @@
+# request context and timing spans.
+#   request_id: set once per request, stamped onto every log record (see RequestContextFilter).
+#   span: times a pipeline stage, logs one structured record and feeds the stage latency histogram.
+#         the record also carries process memory (monitor/memory.py): rss at the end of the stage, its change,
+#         and how much the stage raised the process peak (what limits concurrent requests per worker).
+#         spans of concurrent stages / requests share the process, their memory figures overlap.
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import monitor.memory as memory
+import monitor.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+NO_REQUEST = '-'
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+REQUEST_ID: ContextVar[str] = ContextVar('request_id', default=NO_REQUEST)
+_SPAN_PATH: ContextVar[tuple] = ContextVar('span_path', default=())
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def valid_request_id(request_id: str) -> bool:
+    # ids from proxies / clients end up in log lines and profile file names: plain tokens only.
+    return bool(request_id) and REQUEST_ID_PATTERN.fullmatch(request_id) is not None
+
+
+def start_request(request_id: str = None) -> str:
+    # bind request id to current context (flask request thread). an invalid id is replaced by a new one.
+    request_id = request_id if valid_request_id(request_id) else new_request_id()
+    REQUEST_ID.set(request_id)
+    _SPAN_PATH.set(())
+    return request_id
+
+
+def end_request() -> None:
+    REQUEST_ID.set(NO_REQUEST)
+    _SPAN_PATH.set(())
+
+
+class RequestContextFilter(logging.Filter):
+    # attach request_id / span to record. installed on the QueueHandler, so it runs on the calling thread.
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        if not hasattr(record, 'span'):
+            path = _SPAN_PATH.get()
+            record.span = path[-1] if path else NO_REQUEST
+        return True
+
+
+@contextmanager
+def span(name: str):
+    # with span('model.qualitative'): ...
+    # nested spans are recorded with their parent, the timeline tool rebuilds the tree from it.
+    path = _SPAN_PATH.get()
+    token = _SPAN_PATH.set(path + (name,))
+    rss_start, peak_start = memory.rss(), memory.peak_rss()
+    start_wall, tic = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - tic
+        _SPAN_PATH.reset(token)
+        metrics.STAGE_LATENCY.labels(name).observe(duration)
+        usage = memory_usage(rss_start, peak_start)
+        logger.info(
+            'span %s %s in %.4f seconds%s.', name, 'failed' if error else 'complete', duration, memory_text(usage),
+            extra={
+                'event': 'span', 'span': name, 'parent': path[-1] if path else NO_REQUEST,
+                'span_start': start_wall, 'duration': duration, 'error': error, **usage
+            })
+        if usage.get('peak_growth'):
+            metrics.STAGE_PEAK_GROWTH.labels(name).observe(usage['peak_growth'])
+
+
+def memory_usage(rss_start: int, peak_start: int) -> dict:
+    # {rss, rss_delta, peak_rss, peak_growth[, traced, traced_peak]} in bytes, unknown values left out.
+    usage: dict = {}
+    rss_end, peak_end = memory.rss(), memory.peak_rss()
+    if rss_end is not None:
+        usage['rss'] = rss_end
+        usage['rss_delta'] = rss_end - rss_start
+    if peak_end is not None:
+        usage['peak_rss'] = peak_end
+        usage['peak_growth'] = peak_end - peak_start
+        metrics.PROCESS_PEAK_RSS.set(peak_end)
+    traced = memory.traced()
+    if traced is not None:
+        usage['traced'], usage['traced_peak'] = traced
+    return usage
+
+
+def memory_text(usage: dict) -> str:
+    # ', rss 412.3 MiB (+35.1), peak 530.0 MiB (+12.4)'
+    text = ''
+    if 'rss' in usage:
+        text += f", rss {usage['rss'] / 2 ** 20:.1f} MiB ({usage['rss_delta'] / 2 ** 20:+.1f})"
+    if 'peak_rss' in usage:
+        text += f", peak {usage['peak_rss'] / 2 ** 20:.1f} MiB ({usage['peak_growth'] / 2 ** 20:+.1f})"
+    return text
@@ -0,0 +1,124 @@
+# native PowerPoint charts for the simple bar charts (report.CHART_BACKEND = 'native').
+# instead of a matplotlib PNG in the picture placeholder, the chart data is written into the pptx as a chart
+# part at the placeholder's position: nothing is rasterized, the pptx stays small and consultants can edit
+# values and formatting in PowerPoint. same colors as plot_utils.
+# slide assembly only: python-pptx objects are not thread safe.
+import logging
+logger = logging.getLogger(__name__)
+
+from itertools import cycle, islice
+
+import pandas as pd
+
+import pptx
+from pptx.chart.data import CategoryChartData
+from pptx.dml.color import RGBColor
+from pptx.enum.chart import XL_CHART_TYPE, XL_LABEL_POSITION, XL_LEGEND_POSITION
+from pptx.oxml.ns import qn
+from pptx.util import Pt
+
+from reporting.plot_utils import FIN_SENSITIVITY_CHART_COLORS
+
+
+def place_chart(slide: pptx.slide.Slide, chart_type: XL_CHART_TYPE, chart_data: CategoryChartData) -> pptx.chart.chart.Chart:
+    # replace the next picture placeholder of the slide (as fill_single_image_placeholders) by a chart of the same
+    # position, size and z-order. returns None when the slide has no picture placeholder left.
+    for shape in slide.shapes:
+        if not isinstance(shape, pptx.shapes.placeholder.PicturePlaceholder):
+            continue
+
+        frame = slide.shapes.add_chart(chart_type, shape.left, shape.top, shape.width, shape.height, chart_data)
+        shape._element.addprevious(frame._element)
+        shape._element.getparent().remove(shape._element)
+        return frame.chart
+    return None
+
+
+def fill_color(fill, color: str, alpha: float = None) -> None:
+    # solid fill '#RRGGBB', alpha (0 - 1) as matplotlib's.
+    fill.solid()
+    fill.fore_color.rgb = RGBColor.from_string(color.lstrip('#'))
+    if alpha is not None:
+        srgb = fill._xPr.find(qn('a:solidFill')).find(qn('a:srgbClr'))
+        srgb.append(srgb.makeelement(qn('a:alpha'), {'val': str(int(alpha * 100000))}))
+
+
+def hide_value_axis(chart: pptx.chart.chart.Chart) -> None:
+    chart.value_axis.visible = False
+    chart.value_axis.has_major_gridlines = False
+
+
+def fin_sensitivity_chart(slide: pptx.slide.Slide, df: pd.DataFrame) -> pptx.chart.chart.Chart:
+    # plot_utils.fin_sensitivity: one bar per indicator, value labels on top.
+    labels = df['fin_indicator_text_en'].astype(str).str.replace('_sensitivity', '').str.replace('_', ' ')
+
+    chart_data = CategoryChartData()
+    chart_data.categories = list(labels)
+    chart_data.add_series('value', pd.to_numeric(df['value'], errors='coerce').tolist())
+
+    chart = place_chart(slide, XL_CHART_TYPE.COLUMN_CLUSTERED, chart_data)
+    if chart is None:
+        return None
+
+    chart.has_legend = False
+    chart.value_axis.has_major_gridlines = True
+    plot = chart.plots[0]
+    plot.gap_width = 185                            # bar width 0.35
+    plot.has_data_labels = True
+    plot.data_labels.position = XL_LABEL_POSITION.OUTSIDE_END
+
+    series = plot.series[0]
+    for idx, color in enumerate(islice(cycle(FIN_SENSITIVITY_CHART_COLORS), None, len(df))):
+        fill_color(series.points[idx].format.fill, color)
+    return chart
+
+
+def qualitative_detail_chart(slide: pptx.slide.Slide, df_qualitative_plot: pd.DataFrame, aspect: str, aspect_idx: int) -> pptx.chart.chart.Chart:
+    # plot_utils.qualitative_detail: horizontal bars per module of the aspect, 實際分數 drawn over 期望分數.
+    df = df_qualitative_plot.loc[aspect, ['target', 'actual']]
+    color = FIN_SENSITIVITY_CHART_COLORS[aspect_idx % len(FIN_SENSITIVITY_CHART_COLORS)]
+
+    chart_data = CategoryChartData(number_format='0.00')
+    chart_data.categories = [str(module) for module in df.index]
+    chart_data.add_series('期望分數', df['target'].tolist())
+    chart_data.add_series('實際分數', df['actual'].tolist())
+
+    chart = place_chart(slide, XL_CHART_TYPE.BAR_CLUSTERED, chart_data)
+    if chart is None:
+        return None
+
+    chart.has_title = True
+    chart.chart_title.text_frame.text = str(aspect)
+    chart.has_legend = True
+    chart.legend.position = XL_LEGEND_POSITION.TOP
+    chart.legend.include_in_layout = False
+    plot = chart.plots[0]
+    plot.overlap = 100
+    plot.gap_width = 25                             # bar width 0.8
+    fill_color(plot.series[0].format.fill, color, alpha=0.4)
+    fill_color(plot.series[1].format.fill, color)
+    return chart
+
+
+def interviewee_chart(slide: pptx.slide.Slide, df: pd.DataFrame) -> pptx.chart.chart.Chart:
+    # plot_utils.interviewee_plots: gap per interviewee of one module, module name as title.
+    chart_data = CategoryChartData()
+    chart_data.categories = df['weight_key'].astype(str).tolist()
+    chart_data.add_series('gap', pd.to_numeric(df['gap'], errors='coerce').tolist())
+
+    chart = place_chart(slide, XL_CHART_TYPE.COLUMN_CLUSTERED, chart_data)
+    if chart is None:
+        return None
+
+    chart.has_legend = False
+    chart.has_title = True
+    chart.chart_title.text_frame.text = str(df['module'].iloc[0])
+    hide_value_axis(chart)
+    plot = chart.plots[0]
+    plot.gap_width = 233                            # bar width 0.3
+    plot.has_data_labels = True
+    plot.data_labels.position = XL_LABEL_POSITION.CENTER
+    plot.data_labels.font.size = Pt(12)
+    plot.data_labels.font.color.rgb = RGBColor(0xFF, 0xFF, 0xFF)
+    fill_color(plot.series[0].format.fill, '#808080')           # matplotlib 'grey'
+    return chart
@@ -1,11 +1,15 @@
+import logging
+logger = logging.getLogger(__name__)
+
 import numpy as np
 import pandas as pd
 
 # plotting
 import matplotlib as mpl
-import matplotlib.pyplot as plt
+from matplotlib import font_manager
 from matplotlib.figure import Figure
 from matplotlib.font_manager import FontProperties
+from matplotlib.text import Text
 from matplotlib.lines import Line2D
 
 # AI
@@ -14,14 +18,42 @@ from sklearn.cluster import KMeans
 # memory buffer
 from io import BytesIO
 
+# monitoring
+from monitor.metrics import track_chart
+
+# cache
+import cache.chart_cache as chart_cache
+
+# style
+import os
+from dataclasses import dataclass
+
 # utils
 from itertools import groupby, cycle, islice, repeat
 from textwrap import fill
 
 # 回復預設字型設定
 mpl.rcParams.update(mpl.rcParamsDefault)
+# pandas registers / removes its matplotlib unit converters around every df.plot call by default,
+# a global registry edit: register once instead, charts are rendered from several threads.
+pd.set_option('plotting.matplotlib.register_converters', True)
+
+
+def resolve_font(families: list, size: float = None) -> FontProperties:
+    # first installed font of families as a font file: text drawn with it needs no font lookup.
+    for family in families:
+        try:
+            return FontProperties(fname=font_manager.findfont(FontProperties(family=family), fallback_to_default=False), size=size)
+        except ValueError:
+            continue
+    return FontProperties(fname=font_manager.findfont(FontProperties()), size=size)
+
 
-FONT = FontProperties(fname="reporting\\SimHei.ttf", size=14)
+CJK_FAMILIES = ['SimHei', 'Microsoft JhengHei', 'Noto Sans CJK TC', 'sans-serif']
+SIMHEI_FILE = os.path.join(os.path.dirname(__file__), 'SimHei.ttf')
+
+# 中文標籤字型
+FONT = FontProperties(fname=SIMHEI_FILE, size=14) if os.path.exists(SIMHEI_FILE) else resolve_font(CJK_FAMILIES, size=14)
 
 COLOR = {
     'red-accent3': '#E0301E',
@@ -55,14 +87,68 @@ FIN_SENSITIVITY_CHART_COLORS = [
 ]
 
 
+@dataclass(frozen=True)
+class ChartStyle:
+    # text style of a chart, fonts resolved once at import.
+    # set on the figure's own text artists (apply_style) instead of the global mpl.rcParams, so charts
+    # share no mutable matplotlib state and render in parallel threads (FT2Font objects are per thread).
+    font: FontProperties        # all chart text without an explicit font (ticks, bar labels, axis labels ...)
+
+
+def apply_style(fig: Figure, style: ChartStyle) -> None:
+    # text drawn with its own font file (FONT) is kept, font sizes are kept.
+    # tick labels created while drawing copy the font of the first tick.
+    for text in fig.findobj(Text):
+        if text.get_fontproperties().get_file() is None:
+            font = style.font.copy()
+            font.set_size(text.get_fontsize())
+            text.set_fontproperties(font)
+
+
+DEFAULT_STYLE = ChartStyle(font=resolve_font(['DejaVu Sans']))
+QUALITATIVE_STYLE = ChartStyle(font=resolve_font(['Microsoft JhengHei', *CJK_FAMILIES]))
+
+
+# cached chart images are keyed on STYLE_VERSION: bump it whenever colors, fonts, sizes or dpi change.
+STYLE_VERSION = '4'
+cached_chart = chart_cache.cached(STYLE_VERSION)
+
+
+# render resolution: a chart is rasterized for the placeholder it goes to, not at a fixed 300 dpi.
+#   size: (width, height) of the target placeholder in EMU (pptx_utils.picture_placeholder_size), None -> DEFAULT_DPI.
+EMU_PER_INCH = 914400
+SLIDE_PPI = 200             # pixels per inch of slide, sharp on projectors and A4 prints
+MIN_DPI, MAX_DPI = 72, 300
+DEFAULT_DPI = 300
+
+def render_dpi(fig: Figure, size: tuple = None) -> float:
+    if size is None:
+        return DEFAULT_DPI
+    # insert_picture crops the image to fill the placeholder, the larger scale decides.
+    width, height = fig.get_size_inches()
+    scale = max(size[0] / EMU_PER_INCH / width, size[1] / EMU_PER_INCH / height)
+    return min(max(SLIDE_PPI * scale, MIN_DPI), MAX_DPI)
+
+
+def save_figure(fig: Figure, size: tuple = None, tight: bool = True, pad_inches: float = 0.5, style: ChartStyle = DEFAULT_STYLE) -> BytesIO:
+    # tight: bbox_inches='tight' draws the figure once more to measure it, only for charts with text outside
+    #        the axes. charts with a fixed layout (subplots_adjust) are saved as laid out.
+    apply_style(fig, style)
+    buffer = BytesIO()
+    if tight:
+        fig.savefig(buffer, format='png', dpi=render_dpi(fig, size), bbox_inches='tight', pad_inches=pad_inches, transparent=True)
+    else:
+        fig.savefig(buffer, format='png', dpi=render_dpi(fig, size), transparent=True)
+    buffer.seek(0)
+    return buffer
+
+
 END_INTERVAL = [0.1, 0.5, 1, 5, 10, 100, 200, 1000, 5000, 10000, 100000, 1000000, 10000000, 100000000, 1000000000]
 
-def fin_performance(name: str, df: pd.DataFrame) -> BytesIO:
-    print(name)
-    print(df)
-    # switch font style to default.
-    mpl.rcParams['font.family'] = 'sans-serif'
-    mpl.rcParams['font.sans-serif'] = 'DejaVu Sans'
+@cached_chart
+@track_chart
+def fin_performance(name: str, df: pd.DataFrame, size: tuple = None) -> BytesIO:
+    logger.debug('%s\n%s', name, df)
 
     color = COLOR[FIN_PERFORMANCE_CHART_COLORS[name]]
 
@@ -142,18 +228,13 @@ def fin_performance(name: str, df: pd.DataFrame) -> BytesIO:
     # hide tick label
     #plt.setp(ax.get_xticklabels(), visible=False)                       # hide tick label   
 
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', dpi=300, bbox_inches='tight', pad_inches=0, transparent=True)
-    buffer.seek(0)
-
-    return buffer
+    return save_figure(fig, size, pad_inches=0)
 
 
-def fin_sensitivity(df: pd.DataFrame) -> BytesIO:
+@cached_chart
+@track_chart
+def fin_sensitivity(df: pd.DataFrame, size: tuple = None) -> BytesIO:
 
-    mpl.rcParams['font.family'] = 'sans-serif'
-    mpl.rcParams['font.sans-serif'] = 'DejaVu Sans'
-    
     # x_labels formatting
     df['fin_indicator_text_en'] = df.apply(lambda row: str(row['fin_indicator_text_en']).replace('_sensitivity', '').replace('_', ' '), axis=1)
     df['fin_indicator_labels'] = df.apply(lambda row: fill(row['fin_indicator_text_en'], 12), axis=1)   # text wrapping
@@ -183,14 +264,13 @@ def fin_sensitivity(df: pd.DataFrame) -> BytesIO:
     ax.tick_params(axis='x', which='major', length=10, width=0)
     ax.tick_params(axis='y', which='major', length=7, grid_linestyle='--')
     
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0, transparent=True, dpi=300)
-    buffer.seek(0)
+    # fixed layout (subplots_adjust above), no tight bbox pass.
+    return save_figure(fig, size, tight=False)
 
-    return buffer
 
-
-def solution_priority_matrix(df_solution: pd.DataFrame) -> BytesIO:
+@cached_chart
+@track_chart
+def solution_priority_matrix(df_solution: pd.DataFrame, size: tuple = None) -> BytesIO:
     """"
     mpl.rcParams['font.family'] = 'monospace'
     mpl.rcParams['font.monospace'] = 'Microsoft JhengHei'
@@ -199,7 +279,7 @@ def solution_priority_matrix(df_solution: pd.DataFrame) -> BytesIO:
     
     data = df_solution.copy(deep=True)
     data = data.reset_index(drop=True)
-    print(data)
+    logger.debug(data)
     # Build cluster model
     #model = KMeans(n_clusters=2, n_init='auto')
     #cluster = model.fit_predict(data.iloc[:, 1:4])
@@ -217,14 +297,16 @@ def solution_priority_matrix(df_solution: pd.DataFrame) -> BytesIO:
     sizes = 5000+(15000*(data['final_score']))
 
     # figure init
-    fig = Figure(figsize=(16, 14),dpi = 300)
+    #   fixed layout: the plot area of the former 16 x 14 inch figure, margins as its tight bbox (ticks + 0.5 inch pad).
+    fig = Figure(figsize=(13.8, 12.1))
+    fig.subplots_adjust(left=0.85 / 13.8, right=1 - 0.55 / 13.8, bottom=0.75 / 12.1, top=1 - 0.55 / 12.1)
     ax = fig.add_subplot(111)
 
     # scatter plot
     
     # Create a gradient color map using the initial colors
-    cmap = plt.cm.get_cmap("OrRd")
-    norm = plt.Normalize(min(colors), max(colors))
+    cmap = mpl.colormaps["OrRd"]
+    norm = mpl.colors.Normalize(min(colors), max(colors))
     color_map = cmap(norm(colors))
 
 
@@ -276,11 +358,7 @@ def solution_priority_matrix(df_solution: pd.DataFrame) -> BytesIO:
     """
 
     # 輸出
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.5, transparent=True, dpi=300)
-    buffer.seek(0)
-
-    return buffer
+    return save_figure(fig, size, tight=False)
 
 def normalize_data(data):
     return (data - np.min(data)) / (np.max(data) - np.min(data))
@@ -375,14 +453,12 @@ def label_group_bar_table(ax, df):
 
 """
    
-def qualitative_detail(df_qualitative_result: pd.DataFrame, aspect: str, aspect_idx: int) -> BytesIO:
+@cached_chart
+@track_chart
+def qualitative_detail(df_qualitative_result: pd.DataFrame, aspect: str, aspect_idx: int, size: tuple = None) -> BytesIO:
     # aspect: (大分類)質化題目所在的問題面相 -> 數位營運、數位人才、新科技、顧客體驗...
     # module: (中分類)質化題目所代表的議題、模組 -> 物聯網、資訊安全、雲端運算...
 
-    mpl.rcParams['font.family'] = 'monospace'
-    mpl.rcParams['font.monospace'] = 'Microsoft JhengHei'
-    mpl.rcParams.update({'font.size': 10})
-    
     df = df_qualitative_result
     df = df.iloc[:,[1,2]]
     df = df.loc[aspect]
@@ -440,11 +516,8 @@ def qualitative_detail(df_qualitative_result: pd.DataFrame, aspect: str, aspect_
     #fig.savefig(save)
     
     fig.subplots_adjust(bottom=.1 * df.index.nlevels)
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.5, transparent=True, dpi=300)
-    buffer.seek(0)
-
-    return buffer
+    # group labels are drawn left of the axes: tight bbox.
+    return save_figure(fig, size, style=QUALITATIVE_STYLE)
 
 
 def label_len(my_index, level):
@@ -465,9 +538,13 @@ def label_group_bar_table(ax, df):
         #add_line(ax, xpos, pos * scale+0.005 )
         xpos -= .08
 
-def interviewee_plots(df): 
+@cached_chart
+@track_chart
+def interviewee_plots(df, size: tuple = None): 
     # Create the bar chart
-    fig, ax = plt.subplots(figsize=(8, 5))
+    # Figure instead of plt.subplots: not registered with pyplot, freed with the buffer (no plt.close needed).
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
     
     # Set the width of the bars
     bar_width = 0.3
@@ -495,8 +572,5 @@ def interviewee_plots(df):
     # display plot
     #plt.show()
     
-    buffer = BytesIO()
-    fig.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0.5, transparent=True, dpi=300)
-    buffer.seek(0)
-
-    return buffer
\ No newline at end of file
+    # title below the axes: tight bbox. weight_key labels and module title are Chinese: CJK font.
+    return save_figure(fig, size, style=QUALITATIVE_STYLE)
\ No newline at end of file
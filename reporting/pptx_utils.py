@@ -5,8 +5,14 @@ import datetime
 # presentation manipulation
 import pptx
 import copy
+import itertools
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import Part, XmlPart
+from pptx.opc.packuri import PackURI
+from lxml import etree
 
 import reporting.plot_utils as plot
+import reporting.native_charts as native_charts
 import module.data_transformation as transform
 # text manipulation
 import re
@@ -20,6 +26,9 @@ import pandas as pd
 from pptx.chart.data import CategoryChartData	# Classes providing reference data types
 
 
+R_NAMESPACE = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_R_ATTRIBUTE_NODES = etree.XPath(f"descendant-or-self::*[@*[namespace-uri()='{R_NAMESPACE[1:-1]}']]")
+
 PLACEHOLDER_PATTERNS: dict = {
     "default": "\[ph_([a-zA-Z0-9_]+)\]"
 }
@@ -30,11 +39,9 @@ def solution_description_slide(slide: pptx.slide.Slide, rows: dict) -> None:
         fill_text_placeholders(slide, row_data, placeholder_pattern)
 
 def qualitative_plots_slide(presentation: pptx.Presentation, template_slide: pptx.slide.Slide, num_page_add: int, img: dict) -> None:
-    #slides: list[pptx.slide.Slide] = []
-    for idx in range(num_page_add):
-        slide: pptx.slide.Slide = create_empty_slides(presentation, template_slide, pages_to_add=1)[0]
-        #slides.append(slide)
-        fill_single_image_placeholders(slide,list(img.items())[idx][1] )
+    slides: list[pptx.slide.Slide] = create_empty_slides(presentation, template_slide, pages_to_add=num_page_add)
+    for slide, image_buffer in zip(slides, img.values()):
+        fill_single_image_placeholders(slide, image_buffer)
     
  
 
@@ -50,22 +57,34 @@ def competitor_slide(template_slide: pptx.slide.Slide,competitor_data: pd.DataFr
     chart_data_list: list = transform.fin_competitor_plot_data(competitor_data, competitor_name)
     pptx_charts(template_slide, chart_data_list)
     
-def interviewee_gap_slide(slide: pptx.slide.Slide, pic_rows: pd.DataFrame, text_rows: dict)-> None:
+def interviewee_gap_slide(slide: pptx.slide.Slide, pic_rows: pd.DataFrame, text_rows: dict, img_buffers: dict = None, native: bool = False)-> None:
+    # img_buffers: pre-rendered charts from interviewee_images, rendered here when not given.
+    # native: native PowerPoint charts instead of images (native_charts.interviewee_chart).
     
     for idx, row_data in text_rows.items():
         placeholder_pattern = f'\[row{idx}_([a-zA-Z0-9_]+)\]'
         fill_text_placeholders(slide, row_data, placeholder_pattern)
     
+    if native:
+        for value in pic_rows['module'].unique():
+            native_charts.interviewee_chart(slide, pic_rows[pic_rows['module'] == value])
+        return
+
+    if img_buffers is None:
+        img_buffers = interviewee_images(pic_rows)
     
+    for key in  img_buffers:
+        fill_single_image_placeholders(slide,img_buffers[key] )
+
+def interviewee_images(pic_rows: pd.DataFrame, size: tuple = None) -> dict:
+    # size: target placeholder size in EMU, charts are rendered for it (plot_utils.render_dpi).
     img_buffers: dict = {} 
     # loop over unique values in column "modules"
     for value in pic_rows['module'].unique():
-        # create new DataFrame for this value of "A"
-        df = pic_rows[pic_rows['module'] == value].reset_index()
-        img_buffers[value] = plot.interviewee_plots(df) 
-    
-    for key in  img_buffers:
-        fill_single_image_placeholders(slide,img_buffers[key] )
+        # create new DataFrame for this value of "A", only the drawn columns: same gaps -> same cached image.
+        df = pic_rows.loc[pic_rows['module'] == value, ['module', 'weight_key', 'gap']].reset_index(drop=True)
+        img_buffers[value] = plot.interviewee_plots(df, size=size)
+    return img_buffers
 
 # define function to sum values in dictionary column
 def sum_dict_values(dicts):
@@ -131,7 +150,12 @@ def strategy_slide(slide: pptx.slide.Slide, strategy: dict) -> None:
 
 
 def industry_slides( presentation: pptx.Presentation, template_slide: pptx.slide.Slide, 
-                                cases_per_slide: int, industries: dict, cases: pd.DataFrame.groupby)  -> None:
+                                cases_per_slide: int, industries: dict, cases: pd.DataFrame.groupby, case_images)  -> None:
+    # case_images: case_ids -> {case_id: image bytes}, ex. partial(cache.case_images.get_images, conn)
+    #   called once with the cases placed, and only when the template slide has a picture placeholder.
+    images: dict = {}
+    if any(isinstance(shape, pptx.shapes.placeholder.PicturePlaceholder) for shape in template_slide.placeholders):
+        images = case_images([case_id for industry_id in industries for case_id in cases.get_group(industry_id)['case_id']])
 
     for industry_id, industry_data in industries.items():
         # calculate how many pages need to be add.
@@ -160,7 +184,8 @@ def industry_slides( presentation: pptx.Presentation, template_slide: pptx.slide
             while slot_id < cases_per_slide and not is_all_cases_filled:
                 logger.debug(f'now doing slot: {slot_id}')
                 case_data = industry_cases.pop(0)
-                fill_case(empty_slide, case_data, placeholder_pattern=f'\[case{slot_id}_ph_([a-zA-Z0-9_]+)\]')
+                fill_case(empty_slide, case_data, placeholder_pattern=f'\[case{slot_id}_ph_([a-zA-Z0-9_]+)\]', 
+                          case_image=images.get(case_data['case_id']))
 
                 if len(industry_cases) == 0:
                     is_all_cases_filled = True
@@ -174,13 +199,11 @@ def industry_slides( presentation: pptx.Presentation, template_slide: pptx.slide
 
 def create_empty_slides(presentation: pptx.Presentation, source_slide: pptx.slide.Slide, pages_to_add: int) -> list[pptx.slide.Slide]:
     # add 客戶產業數位轉型重點與建議 slides to presentation, and return list of slide objects.
-    slides = []
-    for i in range(pages_to_add):
-        slides.append(duplicate_slide(presentation, source_slide))
-    return slides
+    return duplicate_slides(presentation, source_slide, pages_to_add)
 
 
-def fill_case(industry_slide: pptx.slide.Slide, case_data: dict, placeholder_pattern: str) -> None:
+def fill_case(industry_slide: pptx.slide.Slide, case_data: dict, placeholder_pattern: str, case_image: bytes = None) -> None:
+    # case_image: image bytes of the case, picture placeholder is left as is when None.
 
     case_image_inserted = False
 
@@ -193,10 +216,10 @@ def fill_case(industry_slide: pptx.slide.Slide, case_data: dict, placeholder_pat
         # case image: picture placeholder 操作
         if isinstance(shape, pptx.shapes.placeholder.PicturePlaceholder):
             
-            if case_image_inserted:                                         # only insert case pitcure once.
+            if case_image_inserted or case_image is None:                   # only insert case pitcure once.
                 continue
 
-            image_buffer = BytesIO(case_data['case_img_blob'])              # read bytes into file like object: BytesIO.
+            image_buffer = BytesIO(case_image)                              # read bytes into file like object: BytesIO.
             shape.insert_picture(image_buffer)                              # after this, picture placeholder would become invalid, and shape object will become pptx.shapes.placeholder.PlaceholderPicture
             case_image_inserted = True
             continue
@@ -231,6 +254,14 @@ def fill_single_image_placeholders(slide: pptx.slide.Slide, image_buffer: BytesI
 
 
 
+def picture_placeholder_size(slide: pptx.slide.Slide) -> tuple:
+    # (width, height) in EMU of the picture placeholder fill_single_image_placeholders fills next, None without one.
+    for shape in slide.shapes:
+        if isinstance(shape, pptx.shapes.placeholder.PicturePlaceholder):
+            return (shape.width, shape.height)
+    return None
+
+
 def fill_text_placeholders(slide: pptx.slide.Slide, data: dict, placeholder_pattern: str) -> None:
     # https://magenta-fern-2ff.notion.site/Placeholder-b2b98d29d2554c89a357593ec0e9e153
     for shape in slide.shapes:
@@ -270,24 +301,68 @@ def replace_paragraph_text(paragraph, new_text) -> None:
 
 
 def duplicate_slide(presentation: pptx.Presentation, source: pptx.slide.Slide) -> pptx.slide.Slide:
-    # https://github.com/scanny/python-pptx/issues/132
-    destination = presentation.slides.add_slide(source.slide_layout)
+    return duplicate_slides(presentation, source, 1)[0]
 
-    for shape in destination.shapes:
-        shape.element.getparent().remove(shape.element)
-    
-    for shape in source.shapes:
-        new_shape = copy.deepcopy(shape.element)
-        destination.shapes._spTree.insert_element_before(new_shape, 'p:extLst')
-    
-    for relationship in source.part.rels:
-        target = relationship._target
 
-        if "noteSlide" in relationship.reltype: continue
+def duplicate_slides(presentation: pptx.Presentation, source: pptx.slide.Slide, count: int) -> list[pptx.slide.Slide]:
+    # append <count> copies of source, https://github.com/scanny/python-pptx/issues/132
+    #   slide content (cSld: background + spTree) is copied as one tree, relationship ids are remapped.
+    #   charts (and their embedded workbooks) are cloned per slide, so editing one copy doesn't change the others,
+    #   media (pictures, ...), hyperlinks and other parts are shared. notes and comments are not copied.
+    slides = []
+    partnames: set = {str(part.partname) for part in presentation.part.package.iter_parts()}    # package walked once per batch
+    for _ in range(count):
+        rId, destination = presentation.part.add_slide(source.slide_layout)   # blank slide, no layout placeholders
+        presentation.slides._sldIdLst.add_sldId(rId)
+
+        rIds: dict = {}
+        for source_rId, relationship in source.part.rels.items():
+            if relationship.reltype in (RT.SLIDE_LAYOUT, RT.NOTES_SLIDE, RT.COMMENTS):
+                continue
+            if relationship.is_external:
+                rIds[source_rId] = destination.part.relate_to(relationship.target_ref, relationship.reltype, is_external=True)
+            elif relationship.reltype == RT.CHART:
+                rIds[source_rId] = destination.part.relate_to(_clone_part(relationship.target_part, partnames), relationship.reltype)
+            else:
+                rIds[source_rId] = destination.part.relate_to(relationship.target_part, relationship.reltype)
+
+        cSld = copy.deepcopy(source._element.cSld)
+        _remap_rIds(cSld, rIds)
+        destination._element.replace(destination._element.cSld, cSld)
+        slides.append(destination)
+    return slides
 
-        destination.part.rels.get_or_add(relationship.reltype, relationship._target)
 
-    return destination
+def _clone_part(part: Part, partnames: set) -> Part:
+    # copy of a part and everything below it (ex. chart -> embedded xlsx), under the next free part name.
+    # partnames: part names in use, updated with the new ones.
+    package = part.package
+    template = re.sub(r'\d*(\.\w+)$', r'%d\1', str(part.partname))
+    partname = next(template % idx for idx in itertools.count(1) if template % idx not in partnames)
+    partnames.add(partname)
+    partname = PackURI(partname)
+    if isinstance(part, XmlPart):
+        clone = type(part)(partname, part.content_type, package, copy.deepcopy(part._element))
+    else:
+        clone = type(part)(partname, part.content_type, package, part.blob)
+
+    rIds: dict = {}
+    for rId, relationship in part.rels.items():
+        if relationship.is_external:
+            rIds[rId] = clone.relate_to(relationship.target_ref, relationship.reltype, is_external=True)
+        else:
+            rIds[rId] = clone.relate_to(_clone_part(relationship.target_part, partnames), relationship.reltype)
+    if isinstance(clone, XmlPart):
+        _remap_rIds(clone._element, rIds)
+    return clone
+
+
+def _remap_rIds(element, rIds: dict) -> None:
+    # rewrite r:id / r:embed / r:link ... attributes from source to destination relationship ids.
+    for node in _R_ATTRIBUTE_NODES(element):
+        for name, value in node.attrib.items():
+            if name.startswith(R_NAMESPACE) and value in rIds:
+                node.set(name, rIds[value])
 
 def  cover_slide(slide: pptx.slide.Slide, company: dict) -> None:
     # 獲取當下月份年份
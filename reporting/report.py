@@ -1,4 +1,7 @@
+import logging
+logger = logging.getLogger(__name__)
 
+import os
 import sqlalchemy as database
 import pandas as pd
 import json
@@ -7,22 +10,31 @@ import json
 import pptx
 import reporting.pptx_utils as report
 import reporting.plot_utils as plot
+import reporting.native_charts as native_charts
 
 # database model
 from db.model_stg import *
 import db.repository_stg as repo
 import module.data_transformation as transform
+import module.executor as executor
+import cache.case_images as case_images
 
 from io import BytesIO
+from functools import partial
 
 from PIL import Image
 
+from monitor.trace import span
+
 
 TEST_DATA: dict = {
     "company_industry_l_id": "F"
 }
 
-TEST_PRESENTATION_TEMPLATE_NAME: str = "reporting\\數位轉型服務_Final Report_Template_0303_v1.1.pptx"
+# input tables generate_report reads, the others can be released once the model has run.
+REPORT_INPUT_TABLES: tuple = ('df_company_data', 'df_form_data', 'df_competitor')
+
+TEST_PRESENTATION_TEMPLATE_NAME: str = os.path.join("reporting", "數位轉型服務_Final Report_Template_0303_v1.1.pptx")
 
 TEMPLATE_SLIDE_MAP: dict = {
     "數位轉型專案封面": 0,
@@ -47,6 +59,24 @@ TEMPLATE_SLIDE_MAP: dict = {
     "受訪者差異分析: 數位科技": 30,
 }
 
+# 受訪者差異分析: aspect -> slide
+INTERVIEWEE_ASPECTS: dict = {
+    "數位人才": "受訪者差異分析: 數位人才",
+    "顧客體驗": "受訪者差異分析: 顧客體驗",
+    "數位營運": "受訪者差異分析: 數位營運",
+    "新科技": "受訪者差異分析: 數位科技",
+}
+
+# bar charts (財務敏感度, 質化明細, 受訪者差異): 'native' PowerPoint charts (reporting/native_charts.py) or matplotlib 'image'
+CHART_BACKEND: str = 'native'
+
+# /api/task result cache key (cache/result_cache.py): bump REPORT_VERSION whenever model / scoring / report code
+# changes the pptx, otherwise cached reports of the previous release are served. see report_version().
+REPORT_VERSION: str = '1'
+
+# slides with rendered charts (picture placeholders)
+CHART_SLIDES: list = ["PwC潛在建議方案", *INTERVIEWEE_ASPECTS.values()]
+
 CASES_PER_SLIDE = 2
 INDICATOR_PER_SLIDE = 4
 
@@ -63,6 +93,11 @@ INDICATOR_PER_SLIDE = 4
 # 9. 解決方案規劃建議時程
 # 11. plot: 質化明細
 # 12. 受訪者差異分析
+def report_version() -> str:
+    # report logic, chart backend and chart style (plot_utils.STYLE_VERSION) all change the output.
+    return f'{REPORT_VERSION}-{CHART_BACKEND}-{plot.STYLE_VERSION}'
+
+
 def generate_report(conn: database.engine, input_tables: dict[str, pd.DataFrame], calculated_tables: dict[str, pd.DataFrame]) -> BytesIO:
 
     # df_solution: 用於 7, 8, 9, 10，綜合分數前八名解決方案，包含 ROI
@@ -84,112 +119,162 @@ def generate_report(conn: database.engine, input_tables: dict[str, pd.DataFrame]
     
     # ------------------------------------------------------------------------------------------------------------------
     
-    # 1. 公司基本資料
-    target_company: dict = repo.get_company_data(conn, company_id)[0]
-    
-    # 2. 客戶主要的三大發展策略
-    target_strategy: dict = repo.get_strategy_weight(conn, strategy_id)[0]
+    # report data as a task graph: database reads overlap, independent slide data and charts are prepared
+    # in parallel, only slide assembly below touches the presentation (python-pptx objects are not thread safe).
+    # tasks sharing a DataFrame get their own copy when the callee edits it in place.
+    graph = executor.TaskGraph()
+
+    # 1. 公司基本資料, 2. 客戶主要的三大發展策略, 4. 質化問卷, 6. 財務指標
+    graph.add('report.db.company', lambda: repo.get_company_data(conn, company_id)[0], io=True)
+    graph.add('report.db.strategy', lambda: repo.get_strategy_weight(conn, strategy_id)[0], io=True)
+    graph.add('report.db.qualitative_question', lambda: repo.get_dim_qualitative_question(conn)[["question_id","question"]], io=True)
+    graph.add('report.db.quantative_index', lambda: repo.get_dim_quantative_index(conn), io=True)
+    graph.add('report.template', lambda: pptx.Presentation(TEST_PRESENTATION_TEMPLATE_NAME), io=True)
+    #pptx_template= repo.get_dim_report_template(conn)
+    #presentation = pptx.Presentation(BytesIO(pptx_template.iloc[0,1]))
 
-    # 補上company name in dict
-    target_strategy["company_text"] = target_company["company_text"]
-    
     # 3. 客戶產業數位轉型重點與建議
+    #   case metadata only, images are read by case_id when placed (cache.case_images).
     #industries_cases: pd.DataFrame = repo.get_industries_cases(conn, TEST_DATA['company_industry_l_id'])
     #industries: dict = transform.industry_with_case_count(industries_cases)
     #cases = industries_cases.groupby('industry_id')
-    
+
     # 4. 質化問卷分數落差分析
-    # merge question into df_qualitative_result
-    qualitative_question: pd.DataFrame = repo.get_dim_qualitative_question(conn)[["question_id","question"]]
-    df_qualitative_result_question =  pd.merge(df_qualitative_result, qualitative_question, on='question_id', how='left')
-    qualitative_top10_gap: dict = transform.qualitative_top10_gap(df_qualitative_result_question)
+    # merge question into df_qualitative_result, gap rounded once up front (all gap rankings use the rounded gap)
+    graph.add('report.qualitative_question_result', 
+              lambda question: pd.merge(df_qualitative_result, question, on='question_id', how='left').round({'gap': 2}),
+              'report.db.qualitative_question')
+    graph.add('report.qualitative_top10_gap', 
+              lambda df: transform.qualitative_top10_gap(df.copy()), 
+              'report.qualitative_question_result')
 
     # 5. PwC針對四大面向提供相應的建議
-    qualitative_top3_gap_aspect1 : dict = transform.qualitative_top3_gap(df_qualitative_result_question, "數位人才", "顧客體驗")
-    qualitative_top3_gap_aspect2 : dict = transform.qualitative_top3_gap(df_qualitative_result_question, "數位營運", "新科技")
-    
+    graph.add('report.qualitative_top3_gap_aspect1', 
+              lambda df: transform.qualitative_top3_gap(df.copy(), "數位人才", "顧客體驗"), 
+              'report.qualitative_question_result')
+    graph.add('report.qualitative_top3_gap_aspect2', 
+              lambda df: transform.qualitative_top3_gap(df.copy(), "數位營運", "新科技"), 
+              'report.qualitative_question_result')
+
     # 6. 財務指標表現, plot
     #   作圖呈現三年財務指標數據變化，使用 df_fin_performance 作為作圖數據。
-    df_dim_quantative_index = repo.get_dim_quantative_index(conn)
-    df_fin_performance, df_fin_sensitivity = transform.fin_indicator_calculation_result(df_year_data, df_dim_quantative_index)
+    graph.add('report.fin_indicator', 
+              lambda index: transform.fin_indicator_calculation_result(df_year_data, index), 
+              'report.db.quantative_index')
     #img_buffers = { 
         #indicator_name: plot.fin_performance(indicator_name, df) 
         #for indicator_name, df in df_fin_performance.groupby('fin_indicator_text_en')}
     #df_trend['png_buffer'] = df_trend['fin_indicator_text_en'].map(img_buffers)
     #fin_indicator_data: list[dict] = transform.fin_indicator_data(df_trend)
-    
-    # 競爭對手財務指標
-    competitor_data = transform.competitor_data(df_competitor, df_year_data, target_company["company_text"])
 
+    # 競爭對手財務指標
+    graph.add('report.competitor', 
+              lambda company: transform.competitor_data(df_competitor, df_year_data, company["company_text"]), 
+              'report.db.company')
 
     # 6. 財務敏感度影響分析
-    fin_sensitivity_plot_png: BytesIO = plot.fin_sensitivity(df_fin_sensitivity)
-    
+    #   slide disabled (see the commented slide calls below), no chart rendered for it.
+    #graph.add('report.chart.fin_sensitivity', lambda fin_indicator: plot.fin_sensitivity(fin_indicator[1].copy()), 'report.fin_indicator')
+
     # 7. 解決方案優先順序矩陣圖
-    solution_priority_matrix_png: BytesIO = plot.solution_priority_matrix(df_solution)
+    #   charts placed in the template are rendered for their placeholder size (resolution, see plot_utils.render_dpi).
+    graph.add('report.chart_sizes', 
+              lambda presentation: {name: report.picture_placeholder_size(presentation.slides[TEMPLATE_SLIDE_MAP[name]]) for name in CHART_SLIDES}, 
+              'report.template')
+    graph.add('report.chart.solution_priority_matrix', 
+              lambda sizes: plot.solution_priority_matrix(df_solution.copy(), size=sizes['PwC潛在建議方案']), 
+              'report.chart_sizes')
 
     # 8. Solution Roi, 9. Solution Roadmap, 10. Solution Description
-    solution_ranking: dict = transform.solution_ranking(df_solution)
+    graph.add('report.solution_ranking', lambda: transform.solution_ranking(df_solution.copy()))
 
     # 11. plot: 質化明細
+    #   slide disabled (see the commented slide calls below), no chart rendered for it.
     # qualitative_plot_png: BytesIO = plot.qualitative_detail(df_qualitative_result)
-    df_qualitative_plot: pd.DataFrame = df_qualitative_result.groupby(['aspect', 'module']).mean(numeric_only=True)
-    aspect_count: int = df_qualitative_plot.index.get_level_values(0).nunique()
-    aspects: list = df_qualitative_plot.index.get_level_values(0).unique()
-    img2_buffers:dict = { 
-        aspect: plot.qualitative_detail(df_qualitative_plot, aspect, aspect_idx) 
-        for aspect,aspect_idx in zip(aspects, range(aspect_count) )}
-    
+    #df_qualitative_plot: pd.DataFrame = df_qualitative_result.groupby(['aspect', 'module']).mean(numeric_only=True)
+    #aspects: list = df_qualitative_plot.index.get_level_values(0).unique()
+    #for aspect_idx, aspect in enumerate(aspects if CHART_BACKEND == 'image' else []):
+    #    graph.add(f'report.chart.qualitative_detail.{aspect_idx}', 
+    #              lambda aspect=aspect, aspect_idx=aspect_idx: plot.qualitative_detail(df_qualitative_plot, aspect, aspect_idx))
+
     # 12. 受訪者差異分析
-    print(df_qualitative_result)
-    df_interviewee: pd.DataFrame = pd.merge(df_form_data,  df_qualitative_result[[ "question_id", "aspect",  "module" ]], on='question_id', how='left' )
-    df_interviewee: pd.DataFrame =  pd.merge(df_interviewee, qualitative_question, on='question_id', how='left')
-    aspect1_qualitative_top5_gap, aspect1_df_text_diff =  transform.top_5_module_by_interviewee(df_qualitative_result_question, df_interviewee, "數位人才")
-    aspect2_qualitative_top5_gap, aspect2_df_text_diff =  transform.top_5_module_by_interviewee(df_qualitative_result_question, df_interviewee, "顧客體驗")
-    aspect3_qualitative_top5_gap, aspect3_df_text_diff =  transform.top_5_module_by_interviewee(df_qualitative_result_question, df_interviewee, "數位營運")
-    aspect4_qualitative_top5_gap, aspect4_df_text_diff =  transform.top_5_module_by_interviewee(df_qualitative_result_question, df_interviewee, "新科技")
+    logger.debug(df_qualitative_result)
+    graph.add('report.interviewee', 
+              lambda question: pd.merge(
+                  pd.merge(df_form_data,  df_qualitative_result[[ "question_id", "aspect",  "module" ]], on='question_id', how='left' ), 
+                  question, on='question_id', how='left'), 
+              'report.db.qualitative_question')
+    graph.add('report.interviewee_gap', 
+              lambda df, df_interviewee: transform.interviewee_gap_by_aspect(df, df_interviewee, list(INTERVIEWEE_ASPECTS)), 
+              'report.qualitative_question_result', 'report.interviewee')
+    for aspect_idx, aspect in enumerate(INTERVIEWEE_ASPECTS if CHART_BACKEND == 'image' else [], start=1):
+        graph.add(f'report.chart.interviewee.{aspect_idx}', 
+                  lambda interviewee_gap, sizes, aspect=aspect: report.interviewee_images(interviewee_gap[aspect][0], size=sizes[INTERVIEWEE_ASPECTS[aspect]]), 
+                  'report.interviewee_gap', 'report.chart_sizes')
+
+    with span('report.prepare'):
+        results: dict = graph.run()
+
+    target_company: dict = results['report.db.company']
+    target_strategy: dict = results['report.db.strategy']
+    # 補上company name in dict
+    target_strategy["company_text"] = target_company["company_text"]
+    df_fin_performance, df_fin_sensitivity = results['report.fin_indicator']
+    solution_ranking: dict = results['report.solution_ranking']
+    #fin_sensitivity_plot_png: BytesIO = results.get('report.chart.fin_sensitivity')
+    solution_priority_matrix_png: BytesIO = results['report.chart.solution_priority_matrix']
+    #img2_buffers: dict = {aspect: results.get(f'report.chart.qualitative_detail.{aspect_idx}') for aspect_idx, aspect in enumerate(aspects)}
     
     # ------------------------------------------------------------------------------------------------------------------
     # slide generation
-    presentation = pptx.Presentation(TEST_PRESENTATION_TEMPLATE_NAME)
-    #pptx_template= repo.get_dim_report_template(conn)
-    #presentation = pptx.Presentation(BytesIO(pptx_template.iloc[0,1]))
+    with span('report.slides'):
+        presentation = results['report.template']
     
-    # generate map: slide_name - slide_object
-    template_slides: dict[str, pptx.slide.Slide] = {}
-    for slide_name, slide_id in TEMPLATE_SLIDE_MAP.items():
-        template_slides[slide_name] = presentation.slides[slide_id]
+        # generate map: slide_name - slide_object
+        template_slides: dict[str, pptx.slide.Slide] = {}
+        for slide_name, slide_id in TEMPLATE_SLIDE_MAP.items():
+            template_slides[slide_name] = presentation.slides[slide_id]
      
         
-    report.cover_slide(template_slides['數位轉型專案封面'], company=target_company)
-    report.company_slide(template_slides['公司基本資料'], company=target_company)
-    report.strategy_slide(template_slides['客戶主要的三大發展策略'], strategy=target_strategy)
-    report.fin_indicator_slide(template_slides['客戶八大財務角度分析'], df_fin_performance)
-    report.competitor_slide(template_slides['與其他競爭者相比的八大財務分析'], competitor_data, df_fin_performance)
-    report.qualitative_gap_slide(template_slides['質化問卷分數落差分析'], rows=qualitative_top10_gap)
-    report.qualitative_gap_slide(template_slides['PwC針對四大面向提供相應的建議-1'], rows=qualitative_top3_gap_aspect1)
-    report.qualitative_gap_slide(template_slides['PwC針對四大面向提供相應的建議-2'], rows=qualitative_top3_gap_aspect2)
-    report.solution_description_slide(template_slides['PwC潛在建議方案'], rows=solution_ranking)
-    report.solution_priority_matrix_slide(template_slides['PwC潛在建議方案'], solution_priority_matrix_png)
-    report.solution_description_slide(template_slides['請客戶就潛在方案進行排序'], rows=solution_ranking)
-    report.solution_roi_slide(template_slides['解決方案 ROI 排名'], rows=solution_ranking)
-    report.solution_roadmap_slide(template_slides['解決方案規劃建議時程'], rows=solution_ranking)
-    report.interviewee_gap_slide(template_slides['受訪者差異分析: 數位人才'], pic_rows=aspect1_qualitative_top5_gap, text_rows = aspect1_df_text_diff)
-    report.interviewee_gap_slide(template_slides['受訪者差異分析: 顧客體驗'], pic_rows=aspect2_qualitative_top5_gap, text_rows = aspect2_df_text_diff)
-    report.interviewee_gap_slide(template_slides['受訪者差異分析: 數位營運'], pic_rows=aspect3_qualitative_top5_gap, text_rows = aspect3_df_text_diff)
-    report.interviewee_gap_slide(template_slides['受訪者差異分析: 數位科技'], pic_rows=aspect4_qualitative_top5_gap, text_rows = aspect4_df_text_diff)
+        report.cover_slide(template_slides['數位轉型專案封面'], company=target_company)
+        report.company_slide(template_slides['公司基本資料'], company=target_company)
+        report.strategy_slide(template_slides['客戶主要的三大發展策略'], strategy=target_strategy)
+        report.fin_indicator_slide(template_slides['客戶八大財務角度分析'], df_fin_performance)
+        report.competitor_slide(template_slides['與其他競爭者相比的八大財務分析'], results['report.competitor'], df_fin_performance)
+        report.qualitative_gap_slide(template_slides['質化問卷分數落差分析'], rows=results['report.qualitative_top10_gap'])
+        report.qualitative_gap_slide(template_slides['PwC針對四大面向提供相應的建議-1'], rows=results['report.qualitative_top3_gap_aspect1'])
+        report.qualitative_gap_slide(template_slides['PwC針對四大面向提供相應的建議-2'], rows=results['report.qualitative_top3_gap_aspect2'])
+        report.solution_description_slide(template_slides['PwC潛在建議方案'], rows=solution_ranking)
+        report.solution_priority_matrix_slide(template_slides['PwC潛在建議方案'], solution_priority_matrix_png)
+        report.solution_description_slide(template_slides['請客戶就潛在方案進行排序'], rows=solution_ranking)
+        report.solution_roi_slide(template_slides['解決方案 ROI 排名'], rows=solution_ranking)
+        report.solution_roadmap_slide(template_slides['解決方案規劃建議時程'], rows=solution_ranking)
+        for aspect_idx, (aspect, slide_name) in enumerate(INTERVIEWEE_ASPECTS.items(), start=1):
+            pic_rows, text_rows = results['report.interviewee_gap'][aspect]
+            report.interviewee_gap_slide(template_slides[slide_name], pic_rows=pic_rows, text_rows=text_rows, 
+                                         img_buffers=results.get(f'report.chart.interviewee.{aspect_idx}'), native=CHART_BACKEND == 'native')
     
     """
-    report.industry_slides(presentation, template_slides['客戶產業數位轉型重點與建議'], CASES_PER_SLIDE, industries, cases)    report.fin_indicator_slide(presentation, template_slides['財務指標表現'], INDICATOR_PER_SLIDE, rows=fin_indicator_data)
+    report.industry_slides(presentation, template_slides['客戶產業數位轉型重點與建議'], CASES_PER_SLIDE, industries, cases, partial(case_images.get_images, conn))    report.fin_indicator_slide(presentation, template_slides['財務指標表現'], INDICATOR_PER_SLIDE, rows=fin_indicator_data)
     report.fin_indicator_sensitivity_slide(template_slides['財務敏感度影響分析'], fin_sensitivity_plot_png)
+    native_charts.fin_sensitivity_chart(template_slides['財務敏感度影響分析'], df_fin_sensitivity)       # CHART_BACKEND == 'native'
     report.solution_priority_matrix_slide(template_slides['解決方案優先順序矩陣圖'], solution_priority_matrix_png)
     report.qualitative_questions_detail_slide(template_slides['質化題目填寫明細'], qualitative_plot_png)
     report.qualitative_plots_slide(presentation, template_slides['qualitative plots slide'], aspect_count, img2_buffers)
+    for aspect_idx, (aspect, slide) in enumerate(zip(aspects, report.create_empty_slides(presentation, template_slides['qualitative plots slide'], len(aspects)))):
+        native_charts.qualitative_detail_chart(slide, df_qualitative_plot, aspect, aspect_idx)   # CHART_BACKEND == 'native'
     """
     
-    ppt_buffer = BytesIO()
-    presentation.save(ppt_buffer)
-    ppt_buffer.seek(0)
+    # slides hold their own copy of every picture / chart value: release the task results (chart PNG buffers,
+    # merged frames) before presentation.save, which builds the whole package in memory once more.
+    results.clear()
+    del graph, template_slides, solution_ranking, solution_priority_matrix_png
+    del df_fin_performance, df_fin_sensitivity
+
+    with span('report.save'):
+        ppt_buffer = BytesIO()
+        presentation.save(ppt_buffer)
+        ppt_buffer.seek(0)
     
     #presentation.save('unused\\result.pptx')
     